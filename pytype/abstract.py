@@ -19,6 +19,8 @@ import logging
 
 from pytype import exceptions
 from pytype import function
+from pytype import load_pytd
+from pytype import metrics
 from pytype import utils
 from pytype.pyc import loadmarshal
 from pytype.pytd import cfg as typegraph
@@ -38,6 +40,10 @@ ARGS = "_ARGS"
 RET = "_RET"
 
 
+_summary_hits = metrics.Counter("function_summary_hits")
+_summary_widenings = metrics.Counter("function_summary_widenings")
+
+
 class ConversionError(ValueError):
   pass
 
@@ -102,19 +108,56 @@ def get_views(variables, node, filter_strict=False):
   Yields:
     A variable->binding dictionary.
   """
+  if filter_strict:
+    views = _get_strict_views(variables, node)
+  else:
+    # CanHaveCombination only depends on the individual bindings, so impossible
+    # combinations are never generated, and views are generated lazily.
+    views = _get_default_views(variables, node, node.BindingFilter())
+  for view in views:
+    yield view
+
+
+def _get_default_views(variables, node, keep):
+  """Generate the views of the product of variables, unless it's too complex."""
+  try:
+    for combination in utils.iter_deep_variable_product(variables, keep=keep):
+      yield {value.variable: value for value in combination}
+  except utils.TooComplexError:
+    # The views that weren't generated are covered by a view that maps all
+    # variables to the default data.
+    yield _get_default_data_view(variables, node)
+
+
+def _get_default_data_view(variables, node):
+  return {var: var.AddBinding(node.program.default_data, [], node)
+          for var in variables}
+
+
+def _get_strict_views(variables, node):
+  """Get the views for which node.HasCombination is satisfied."""
+  possible_bindings = {}  # binding -> whether node.HasCombination([binding])
+
+  def keep(value):
+    if value not in possible_bindings:
+      possible_bindings[value] = node.HasCombination([value])
+    return possible_bindings[value]
+
   try:
-    combinations = utils.deep_variable_product(variables)
+    views = [{value.variable: value for value in combination}
+             for combination in utils.iter_deep_variable_product(
+                 variables, keep=keep)]
   except utils.TooComplexError:
-    combinations = ((var.AddBinding(node.program.default_data, [], node)
-                     for var in variables),)
-  for combination in combinations:
-    view = {value.variable: value for value in combination}
-    combination = view.values()
-    check = node.HasCombination if filter_strict else node.CanHaveCombination
-    if not check(combination):
+    views = [_get_default_data_view(variables, node)]
+  # Check all views up front, so that they can share the work. The caller
+  # might change the CFG while we yield views, which would reset the solver.
+  combinations = [view.values() for view in views]
+  results = node.HasCombinations(combinations, possible_bindings)
+  for view, combination, possible in zip(views, combinations, results):
+    if possible:
+      yield view
+    else:
       log.info("Skipping combination %r", combination)
-      continue
-    yield view
 
 
 def get_signatures(func):
@@ -2397,8 +2440,6 @@ class InterpreterFunction(Function):
     vm: TypegraphVirtualMachine instance.
   """
 
-  _function_cache = {}
-
   @staticmethod
   def make_function(name, code, f_locals, f_globals, defaults, kw_defaults,
                     closure, annotations, late_annotations, vm):
@@ -2435,11 +2476,12 @@ class InterpreterFunction(Function):
                  for key, value in annotations.items()}, None),
                (dict(enumerate(defaults)), None),
                (dict(enumerate(closure or ())), None)))
-    if key not in InterpreterFunction._function_cache:
-      InterpreterFunction._function_cache[key] = InterpreterFunction(
+    function_cache = vm.caches.get("interpreter_functions")
+    if key not in function_cache:
+      function_cache[key] = InterpreterFunction(
           name, code, f_locals, f_globals, defaults, kw_defaults,
           closure, annotations, late_annotations, vm)
-    return InterpreterFunction._function_cache[key]
+    return function_cache[key]
 
   @staticmethod
   def get_arg_count(code):
@@ -2464,6 +2506,10 @@ class InterpreterFunction(Function):
     self.kw_defaults = kw_defaults
     self.closure = closure
     self._call_cache = {}
+    # With --function-summaries: map from argument types to the data of the
+    # return value and the remaining depth of the call that computed it.
+    self._summaries = collections.OrderedDict()
+    self._has_side_effects = False
     self._call_records = []
     self.nonstararg_count = self.code.co_argcount
     if self.code.co_kwonlyargcount >= 0:  # This is usually -1 or 0 (fast call)
@@ -2477,8 +2523,10 @@ class InterpreterFunction(Function):
     """Turn on recording of function calls. Used by infer.py."""
     old = self._store_call_records
     self._store_call_records = True
-    yield
-    self._store_call_records = old
+    try:
+      yield
+    finally:
+      self._store_call_records = old
 
   def _build_signature(self, annotations, late_annotations):
     """Build a function.Signature object representing this function."""
@@ -2673,37 +2721,55 @@ class InterpreterFunction(Function):
                                new_locals=new_locals)
     if self.signature.has_return_annotation:
       frame.allowed_returns = annotations["return"]
+    use_summaries = (self.vm.options.function_summaries and
+                     self.vm.options.skip_repeat_calls and
+                     new_locals is None and not self._has_side_effects)
     if self.vm.options.skip_repeat_calls:
-      callkey = self._hash_all(
-          (callargs, None),
-          (frame.f_globals.members, set(self.code.co_names)),
-          (frame.f_locals.members,
-           set(frame.f_locals.members) - set(self.code.co_varnames)))
+      env = ((frame.f_globals.members, set(self.code.co_names)),
+             (frame.f_locals.members,
+              set(frame.f_locals.members) - set(self.code.co_varnames)))
+      callkey = self._hash_all((callargs, None), *env)
+      if use_summaries:
+        summary_key = (self._get_summary_key(callargs), self._hash_all(*env))
     else:
       # Make the callkey the number of times this function has been called so
       # that no call has the same key as a previous one.
       callkey = len(self._call_cache)
     if callkey in self._call_cache:
       _, old_ret, old_remaining_depth = self._call_cache[callkey]
+      cached = old_ret.data, old_remaining_depth
+    elif use_summaries:
+      cached = self._get_summary(summary_key)
+    else:
+      cached = None
+    if self.vm.cost_report:
+      self.vm.cost_report.record_call(self.code, cache_hit=cached is not None)
+    if cached is not None:
+      old_data, old_remaining_depth = cached
       # Optimization: This function has already been called, with the same
-      # environment and arguments, so recycle the old return value and don't
-      # record this call. We pretend that this return value originated at the
-      # current node to make sure we don't miss any possible types.
+      # environment and arguments (or, with --function-summaries, arguments of
+      # the same types), so recycle the old return value and don't record this
+      # call. We pretend that this return value originated at the current node
+      # to make sure we don't miss any possible types.
       # We would want to skip this optimization and reanalyze the call
       # if the all the possible types of the return value was unsolvable
       # and we can transverse the function deeper.
-      if (all(x == self.vm.convert.unsolvable for x in old_ret.data) and
+      if (all(x == self.vm.convert.unsolvable for x in old_data) and
           self.vm.remaining_depth() > old_remaining_depth):
         log.info("Reanalyzing %r because all of its call record's bindings are "
                  "Unsolvable; remaining_depth = %d,"
                  "record remaining_depth = %d",
                  self.name, self.vm.remaining_depth(), old_remaining_depth)
       else:
-        ret = self.vm.program.NewVariable(old_ret.data, [], node)
+        ret = self.vm.program.NewVariable(old_data, [], node)
         if self._store_call_records:
           # Even if the call is cached, we might not have been recording it.
           self._call_records.append((callargs, ret, node))
         return node, ret
+    if use_summaries:
+      # Hashing can load lazy items, which changes the hashes, so the hash to
+      # detect side effects with is taken after callkey and summary_key.
+      old_hash = self._hash_all((callargs, None), *env)
     if self.code.co_flags & loadmarshal.CodeType.CO_GENERATOR:
       generator = Generator(frame, self.vm)
       # Run the generator right now, even though the program didn't call it,
@@ -2713,11 +2779,66 @@ class InterpreterFunction(Function):
     else:
       node_after_call, ret = self.vm.run_frame(frame, node)
     self._call_cache[callkey] = (callargs, ret, self.vm.remaining_depth())
+    if use_summaries:
+      # A summary only stands in for the return value, so it's only valid if
+      # the call didn't modify its arguments or the globals it uses.
+      if self._hash_all((callargs, None), *env) == old_hash:
+        self._summaries[summary_key] = (ret.data, self.vm.remaining_depth())
+      else:
+        log.info("Not summarizing %r, since it has side effects", self.name)
+        self._has_side_effects = True
+        self._summaries.clear()
     if self._store_call_records or self.vm.store_all_calls:
       self._call_records.append((callargs, ret, node_after_call))
     self.last_frame = frame
     return node_after_call, ret
 
+  def _get_summary_key(self, callargs):
+    """Build a key from the types of the arguments of a call.
+
+    Instances are keyed on their classes and type parameters. Everything else,
+    e.g. constants, classes and functions, is keyed on identity, since the
+    result of a call often depends on which one was passed.
+
+    Args:
+      callargs: A dictionary, mapping parameter names to typegraph.Variable.
+
+    Returns:
+      A hashable object.
+    """
+    key = []
+    for name, var in sorted(callargs.items()):
+      arg_key = frozenset(
+          b.data.get_type_key()
+          if isinstance(b.data, Instance) and
+          not isinstance(b.data, PythonConstant) else b.data
+          for b in var.bindings)
+      key.append((name, arg_key))
+    return tuple(key)
+
+  def _get_summary(self, summary_key):
+    """Look up the summary for a call.
+
+    Args:
+      summary_key: The argument types and the environment of the call.
+
+    Returns:
+      A tuple of the data of the return value and the remaining depth of the
+      call that computed it, or None if the call has to be analyzed. Once
+      there are --function-summaries summaries, calls with new argument types
+      get the union of all of them.
+    """
+    if summary_key in self._summaries:
+      _summary_hits.inc()
+      return self._summaries[summary_key]
+    if len(self._summaries) < self.vm.options.function_summaries:
+      return None
+    _summary_widenings.inc()
+    data = []
+    for summary_data, _ in self._summaries.values():
+      data.extend(d for d in summary_data if d not in data)
+    return data, max(depth for _, depth in self._summaries.values())
+
   def get_call_combinations(self, node):
     """Get this function's call records."""
     all_combinations = []
@@ -2943,6 +3064,16 @@ class Module(Instance):
     self._member_map = member_map
     self.ast = ast
 
+  def load_lazy_attribute(self, name):
+    try:
+      super(Module, self).load_lazy_attribute(name)
+    except load_pytd.BadDependencyError as e:
+      # With --lazy-imports, the dependencies of a member are only loaded when
+      # the member is used.
+      self.vm.errorlog.pyi_error(self.vm.frames, self.name + "." + name, e)
+      self.members[name] = self.vm.convert.unsolvable.to_variable(
+          self.vm.root_cfg_node)
+
   def _convert_member(self, name, ty):
     """Called to convert the items in _member_map to cfg.Variable."""
     var = self.vm.convert.constant_to_var(ty)
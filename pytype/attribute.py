@@ -1,4 +1,5 @@
 """Abstract attribute handling."""
+import itertools
 import logging
 
 
@@ -11,11 +12,26 @@ from pytype.pytd import cfg as typegraph
 log = logging.getLogger(__name__)
 
 
+# MRO entries that _lookup_from_mro can skip when they don't have an attribute
+# in their members: For these types, get_special_attribute only handles the
+# names in _SPECIAL_CLASS_ATTRIBUTES. Subclasses are deliberately excluded.
+_PLAIN_CLASS_TYPES = (abstract.InterpreterClass, abstract.PyTDClass)
+_SPECIAL_CLASS_ATTRIBUTES = ("__class__", "__getitem__")
+
+
+def _is_plain_class(value):
+  return type(value) in _PLAIN_CLASS_TYPES  # pylint: disable=unidiomatic-typecheck
+
+
 class AbstractAttributeHandler(object):
   """Handler for abstract attributes."""
 
   def __init__(self, vm):
     self.vm = vm
+    # Map from (class, attribute name) to (n, changestamps): The first n
+    # entries of the class's MRO don't have the attribute, as long as the
+    # changestamps of their members are unchanged.
+    self._mro_lookup_cache = vm.caches.get("mro_lookup")
 
   def get_attribute_generic(self, node, obj, name, val):
     if isinstance(obj, abstract.ParameterizedClass):
@@ -318,7 +334,11 @@ class AbstractAttributeHandler(object):
       variablecls = valcls.AssignToNewVariable(node)
       add_origins.append(valcls)
 
-    for base in obj.mro:
+    use_cache = skip is None and name not in _SPECIAL_CLASS_ATTRIBUTES
+    start = self._get_cached_mro_start(obj, name) if use_cache else 0
+    num_skippable = start
+    counting = True
+    for base in itertools.islice(obj.mro, start, None):
       # Potentially skip start of MRO, for super()
       if base is skip:
         continue
@@ -328,6 +348,10 @@ class AbstractAttributeHandler(object):
       var = base.get_special_attribute(node, name, valself)
       if var is None:
         node, var = self._get_attribute_flat(node, base, name)
+      counting = (counting and _is_plain_class(base) and
+                  name not in base.members)
+      if counting:
+        num_skippable += 1
       if var is None or not var.bindings:
         continue
       for varval in var.bindings:
@@ -341,8 +365,22 @@ class AbstractAttributeHandler(object):
             value = value.property_get(variableself, variablecls)
         ret.AddBinding(value, [varval] + add_origins, node)
       break  # we found a class which has this attribute
+    if use_cache and num_skippable > start:
+      self._mro_lookup_cache[(obj, name)] = (num_skippable, tuple(
+          base.members.changestamp for base in obj.mro[:num_skippable]))
     return ret
 
+  def _get_cached_mro_start(self, obj, name):
+    """Get the number of MRO entries of obj that don't have the attribute."""
+    entry = self._mro_lookup_cache.get((obj, name))
+    if entry is None:
+      return 0
+    start, changestamps = entry
+    for base, changestamp in zip(obj.mro, changestamps):
+      if base.members.changestamp != changestamp:
+        return 0
+    return start
+
   def _get_attribute_flat(self, node, obj, name):
     if isinstance(obj, abstract.ParameterizedClass):
       return self._get_attribute_flat(node, obj.base_cls, name)
@@ -0,0 +1,536 @@
+"""Support for analyzing many modules in one pytype run.
+
+The modules of a batch are ordered by their imports, so that when a module is
+analyzed, the .pyi files of the modules it imports have already been written.
+A batch can be processed sequentially, or by a pool of worker processes, and
+each module can be analyzed in a process forked from a common starting state.
+"""
+
+import collections
+import heapq
+import logging
+import multiprocessing
+import multiprocessing.queues
+import os
+import Queue
+import StringIO
+import sys
+import tokenize
+import traceback
+
+
+from pytype import infer
+from pytype import load_pytd
+from pytype.pyc import pyc
+
+log = logging.getLogger(__name__)
+
+
+# A single import statement. "level" is the number of leading dots of a
+# relative import, and "from_names" the names after "from x import", or None
+# for a plain "import x".
+ImportStatement = collections.namedtuple(
+    "ImportStatement", ["name", "level", "from_names"])
+
+
+class Task(object):
+  """A module of a batch, with its dependencies on other modules of the batch.
+
+  Attributes:
+    item: The config.BatchItem to process.
+    module_name: The name of the module, e.g. "foo.bar". Packages are named
+      after the package, not after the __init__ module.
+    index: The position of the item in the batch, used for stable ordering.
+    incoming: The tasks this task imports.
+    outgoing: The tasks that import this task.
+    external_imports: The names of the modules this task imports that aren't
+      part of the batch.
+  """
+
+  def __init__(self, item, module_name, index):
+    self.item = item
+    self.module_name = module_name
+    self.index = index
+    self.incoming = set()
+    self.outgoing = set()
+    self.external_imports = set()
+
+  def __repr__(self):
+    return "Task(%r)" % self.module_name
+
+
+def _split_statements(tokens):
+  """Group a token stream into the token strings of the logical lines."""
+  statement = []
+  for token_type, token, _, _, _ in tokens:
+    if token_type in (tokenize.NEWLINE, tokenize.ENDMARKER) or token == ";":
+      if statement:
+        yield statement
+      statement = []
+    elif token_type in (tokenize.NAME, tokenize.OP):
+      statement.append(token)
+    elif token_type not in (tokenize.NL, tokenize.COMMENT, tokenize.INDENT,
+                            tokenize.DEDENT):
+      # Strings, numbers etc. We don't need them, but we have to make sure
+      # that "x = 'import foo'" isn't mistaken for an import.
+      statement.append(None)
+  if statement:
+    yield statement
+
+
+def _parse_names(tokens):
+  """Parse a list of "a.b.c [as d]" clauses, separated by commas."""
+  names = []
+  current = []
+  skip = False
+  for token in tokens:
+    if token in ("(", ")"):
+      continue
+    elif token == ",":
+      if current:
+        names.append("".join(current))
+      current = []
+      skip = False
+    elif token == "as":
+      skip = True
+    elif not skip:
+      current.append(token)
+  if current:
+    names.append("".join(current))
+  return names
+
+
+def get_imports(src):
+  """Find the import statements in Python source code.
+
+  This only looks at the tokens of the source, so that it works for both
+  Python 2 and Python 3 code, regardless of the version of the host.
+
+  Args:
+    src: Python source code.
+  Returns:
+    A list of ImportStatement.
+  """
+  imports = []
+  tokens = tokenize.generate_tokens(StringIO.StringIO(src).readline)
+  try:
+    for statement in _split_statements(tokens):
+      if None in statement:
+        continue
+      if statement[0] == "import":
+        for name in _parse_names(statement[1:]):
+          imports.append(ImportStatement(name, 0, None))
+      elif statement[0] == "from" and "import" in statement:
+        i = statement.index("import")
+        module = statement[1:i]
+        level = 0
+        while level < len(module) and module[level] == ".":
+          level += 1
+        imports.append(ImportStatement("".join(module[level:]), level,
+                                       _parse_names(statement[i + 1:])))
+  except (tokenize.TokenError, IndentationError) as e:
+    # We'll report this error when we compile the module.
+    log.info("Couldn't tokenize source: %s", e)
+  return imports
+
+
+def _package_name(module_name):
+  """Strip a trailing ".__init__" from a module name."""
+  if module_name and module_name.endswith(".__init__"):
+    return module_name[:-len(".__init__")]
+  return module_name
+
+
+def get_imported_modules(module_name, imp):
+  """Return all module names an import statement could refer to.
+
+  Args:
+    module_name: The name of the importing module (or None).
+    imp: An ImportStatement.
+  Returns:
+    A list of module names. This overapproximates, since e.g. for
+    "from a import b", "b" might be a module or a member of "a".
+  """
+  if module_name:
+    path = module_name.split(".")[:-1]
+  else:
+    path = []
+  if imp.level:
+    if imp.level > len(path) + 1:
+      return []
+    prefix = path[:len(path) - imp.level + 1]
+    bases = [".".join(prefix + [imp.name] if imp.name else prefix)]
+  else:
+    # Implicit relative imports are possible in Python 2.
+    bases = [imp.name]
+    if path:
+      bases.append(".".join(path + [imp.name]))
+  candidates = []
+  for base in bases:
+    if not base:
+      continue
+    parts = base.split(".")
+    candidates.extend(".".join(parts[:i]) for i in range(1, len(parts) + 1))
+    for name in imp.from_names or ():
+      if name != "*":
+        candidates.append(base + "." + name)
+  return candidates
+
+
+def build_dependency_graph(items, options):
+  """Create the tasks for a batch and connect them according to imports.
+
+  Args:
+    items: A list of config.BatchItem.
+    options: config.Options object.
+  Returns:
+    A list of Task, in the same order as items.
+  """
+  tasks = []
+  module_names = []
+  by_name = {}
+  for index, item in enumerate(items):
+    module_name = item.module_name or infer.get_module_name(
+        item.input, options)
+    task = Task(item, _package_name(module_name), index)
+    tasks.append(task)
+    module_names.append(module_name)
+    if task.module_name:
+      if task.module_name in by_name:
+        log.warning("Module %r is in the batch more than once",
+                    task.module_name)
+      by_name.setdefault(task.module_name, task)
+  packages = {name.split(".")[0] for name in by_name}
+  for task, module_name in zip(tasks, module_names):
+    with open(task.item.input, "r") as fi:
+      src = fi.read()
+    for imp in get_imports(src):
+      for name in get_imported_modules(module_name, imp):
+        dependency = by_name.get(name)
+        if dependency is not None and dependency is not task:
+          task.incoming.add(dependency)
+          dependency.outgoing.add(task)
+      if not imp.level and imp.name.split(".")[0] not in packages:
+        task.external_imports.add(imp.name)
+  return tasks
+
+
+def _strongly_connected_components(tasks):
+  """Compute the import cycles of a batch, using Tarjan's algorithm.
+
+  Args:
+    tasks: A list of Task.
+  Returns:
+    A list of lists of tasks. Every task is in exactly one component.
+  """
+  # Iterative, since a batch can have tens of thousands of modules.
+  index = {}
+  lowlink = {}
+  stack = []
+  on_stack = set()
+  components = []
+  for root in tasks:
+    if root in index:
+      continue
+    work = [(root, iter(sorted(root.incoming, key=lambda t: t.index)))]
+    index[root] = lowlink[root] = len(index)
+    stack.append(root)
+    on_stack.add(root)
+    while work:
+      task, children = work[-1]
+      for child in children:
+        if child not in index:
+          index[child] = lowlink[child] = len(index)
+          stack.append(child)
+          on_stack.add(child)
+          work.append(
+              (child, iter(sorted(child.incoming, key=lambda t: t.index))))
+          break
+        elif child in on_stack:
+          lowlink[task] = min(lowlink[task], index[child])
+      else:
+        work.pop()
+        if work:
+          parent = work[-1][0]
+          lowlink[parent] = min(lowlink[parent], lowlink[task])
+        if lowlink[task] == index[task]:
+          component = []
+          while True:
+            member = stack.pop()
+            on_stack.remove(member)
+            component.append(member)
+            if member is task:
+              break
+          components.append(component)
+  return components
+
+
+def _order_components(tasks):
+  """Order the import cycles of a batch so that dependencies come first.
+
+  Args:
+    tasks: A list of Task.
+  Returns:
+    A tuple of a list of components (lists of tasks, sorted by their position
+    in the batch) in processing order, and a dictionary mapping every task to
+    its component.
+  """
+  components = _strongly_connected_components(tasks)
+  component_of = {}
+  for component in components:
+    component.sort(key=lambda t: t.index)
+    for task in component:
+      component_of[task] = component
+  # Tarjan's algorithm emits a component only after all components it depends
+  # on, so this is already a valid order. Sort it by input position, though,
+  # to make it independent of the order the graph was traversed in.
+  waiting_for = {id(c): len(_component_dependencies(c, component_of))
+                 for c in components}
+  ready = [(c[0].index, c) for c in components if not waiting_for[id(c)]]
+  heapq.heapify(ready)
+  order = []
+  while ready:
+    _, component = heapq.heappop(ready)
+    order.append(component)
+    for successor in _component_dependents(component, component_of):
+      waiting_for[id(successor)] -= 1
+      if not waiting_for[id(successor)]:
+        heapq.heappush(ready, (successor[0].index, successor))
+  assert len(order) == len(components)
+  return order, component_of
+
+
+def _component_dependencies(component, component_of):
+  deps = {id(component_of[dep]): component_of[dep]
+          for task in component for dep in task.incoming}
+  deps.pop(id(component), None)
+  return deps.values()
+
+
+def _component_dependents(component, component_of):
+  deps = {id(component_of[out]): component_of[out]
+          for task in component for out in task.outgoing}
+  deps.pop(id(component), None)
+  return deps.values()
+
+
+def order_tasks(tasks):
+  """Order tasks so that, where possible, dependencies come first.
+
+  Unlike utils.topological_sort, this tolerates import cycles: The modules of
+  a cycle are processed together, in the order they were given in, after all
+  the modules the cycle depends on.
+
+  Args:
+    tasks: A list of Task.
+  Returns:
+    A list of the same tasks.
+  """
+  components, _ = _order_components(tasks)
+  return [task for component in components for task in component]
+
+
+def preload_imports(tasks, loader):
+  """Load the modules imported from outside of the batch into a loader.
+
+  This is done before the worker processes of run_in_parallel are forked, so
+  that they share the parsed pyi files (e.g. from typeshed) instead of each
+  worker parsing them again.
+
+  Args:
+    tasks: A list of Task.
+    loader: A load_pytd.Loader.
+  """
+  for name in sorted(set().union(*(t.external_imports for t in tasks))):
+    try:
+      loader.import_name(name)
+    except load_pytd.BadDependencyError as e:
+      # We'll report this when analyzing the module that imports it.
+      log.info("Couldn't preload %r: %s", name, e)
+
+
+class WorkerError(Exception):
+  """An exception raised by a worker process or a forked process."""
+
+
+# How often run_in_parallel checks for worker processes that died, in seconds.
+_POLL_SECONDS = 1
+
+# In a worker process of run_in_parallel: A queue on which _run_worker
+# announces which component this process is working on.
+_started = None
+
+
+def _init_worker(started):
+  global _started
+  _started = started
+
+
+def _run_worker(process_items, items, key=None):
+  if _started is not None:
+    # A SimpleQueue writes synchronously, so the announcement isn't lost if the
+    # process dies right afterwards.
+    _started.put((os.getpid(), key))
+  try:
+    return process_items(items), None
+  except Exception:  # pylint: disable=broad-except
+    return 1, traceback.format_exc()
+
+
+def _critical_path_priorities(components, component_of):
+  """Compute the cost of the longest chain of dependents of each component.
+
+  Args:
+    components: A list of components, in processing order.
+    component_of: A dictionary mapping every task to its component.
+  Returns:
+    A dictionary mapping id(component) to a cost. The size of the source files
+    is used as an estimate of how long it takes to analyze a module.
+  """
+  priorities = {}
+  for component in reversed(components):
+    cost = sum(os.path.getsize(task.item.input) + 1 for task in component)
+    priorities[id(component)] = cost + max(
+        [priorities[id(c)]
+         for c in _component_dependents(component, component_of)] or [0])
+  return priorities
+
+
+def run_in_parallel(tasks, process_items, jobs):
+  """Process a batch on a pool of worker processes.
+
+  Each import cycle (usually just a single module) is processed by one worker,
+  once all the modules it imports are done. Of the modules that are ready, the
+  ones on the costliest remaining chain of imports are started first.
+  The workers are forked from the current process, so anything that's loaded
+  already (e.g. the builtins) doesn't need to be loaded again.
+
+  Args:
+    tasks: A list of Task.
+    process_items: A module-level function that processes a list of
+      config.BatchItem, in order, and returns an exit status. Called in the
+      worker processes.
+    jobs: The number of worker processes.
+  Returns:
+    An exit status (0 means no error in any of the modules).
+  Raises:
+    WorkerError: If processing a module raised an exception, or a worker
+      process died while processing it.
+  """
+  components, component_of = _order_components(tasks)
+  priorities = _critical_path_priorities(components, component_of)
+  waiting_for = {id(c): len(_component_dependencies(c, component_of))
+                 for c in components}
+  ready = [(-priorities[id(c)], c[0].index, c)
+           for c in components if not waiting_for[id(c)]]
+  heapq.heapify(ready)
+  done = Queue.Queue()
+  running = {}  # index of the first task -> component
+  worker_pids = {}  # index of the first task -> pid of the worker process
+  exit_status = 0
+  started = multiprocessing.queues.SimpleQueue()
+  pool = multiprocessing.Pool(jobs, _init_worker, (started,))
+  try:
+    while ready or running:
+      while ready and len(running) < jobs:
+        _, key, component = heapq.heappop(ready)
+        log.info("Scheduling %s", ", ".join(t.module_name or t.item.input
+                                             for t in component))
+        pool.apply_async(
+            _run_worker, (process_items, [t.item for t in component], key),
+            callback=lambda result, c=component: done.put((c, result)))
+        running[key] = component
+      # Wait with a timeout, so that KeyboardInterrupt is delivered, and so
+      # that we notice when a worker dies without returning a result.
+      try:
+        component, (status, error) = done.get(timeout=_POLL_SECONDS)
+      except Queue.Empty:
+        _check_workers(pool, started, running, worker_pids)
+        continue
+      del running[component[0].index]
+      worker_pids.pop(component[0].index, None)
+      if error:
+        raise WorkerError("Error while processing %s:\n%s" % (
+            ", ".join(t.item.input for t in component), error))
+      exit_status = exit_status or status
+      for successor in _component_dependents(component, component_of):
+        waiting_for[id(successor)] -= 1
+        if not waiting_for[id(successor)]:
+          heapq.heappush(ready, (-priorities[id(successor)],
+                                 successor[0].index, successor))
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+  return exit_status
+
+
+def _check_workers(pool, started, running, worker_pids):
+  """Raise WorkerError if a worker process died while processing a component.
+
+  Args:
+    pool: The multiprocessing.Pool.
+    started: The queue on which _run_worker announces (pid, key) pairs.
+    running: A dictionary mapping the keys of the running components to the
+      components.
+    worker_pids: A dictionary mapping keys to the pids of the workers that
+      announced them. Updated from started.
+  Raises:
+    WorkerError: If a worker that announced a running component is gone.
+  """
+  while not started.empty():
+    pid, key = started.get()
+    if key in running:
+      worker_pids[key] = pid
+  # The pool replaces workers that died, so a running component whose worker
+  # isn't among the live workers will never get a result.
+  alive = {p.pid for p in pool._pool if p.is_alive()}  # pylint: disable=protected-access
+  for key, pid in sorted(worker_pids.items()):
+    if pid not in alive:
+      raise WorkerError("Worker process %d died while processing %s" % (
+          pid, ", ".join(t.item.input for t in running[key])))
+
+
+# The exit status of a forked process whose function raised an exception.
+_FORKED_PROCESS_FAILED = 255
+
+
+def run_in_forked_process(f, *args):
+  """Call a function in a child process, and return its exit status.
+
+  The child is a copy of the current process, so it starts out with everything
+  that's loaded already (e.g. a tracer that has run the builtins). Nothing it
+  changes is visible to the current process afterwards, so the same state can
+  be used for the next call.
+
+  Args:
+    f: A function returning an exit status between 0 and 254.
+    *args: The arguments for f.
+  Returns:
+    The exit status returned by f.
+  Raises:
+    WorkerError: If f raised an exception, or the child process died.
+  """
+  sys.stdout.flush()
+  sys.stderr.flush()
+  with pyc.lend_compile_servers():
+    pid = os.fork()
+    if not pid:
+      exit_status = _FORKED_PROCESS_FAILED
+      try:
+        exit_status = f(*args) or 0
+      except:  # pylint: disable=bare-except
+        traceback.print_exc()
+      finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_status)  # pylint: disable=protected-access
+    _, status = os.waitpid(pid, 0)
+  if os.WIFEXITED(status) and os.WEXITSTATUS(status) != _FORKED_PROCESS_FAILED:
+    return os.WEXITSTATUS(status)
+  # The child might have left a compile server in the middle of a request.
+  pyc.stop_compile_servers()
+  if os.WIFSIGNALED(status):
+    raise WorkerError("Process %d was killed by signal %d" % (
+        pid, os.WTERMSIG(status)))
+  raise WorkerError("Process %d failed, see the traceback above" % pid)
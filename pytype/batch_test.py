@@ -0,0 +1,276 @@
+"""Tests for batch.py."""
+
+import os
+import signal
+import textwrap
+
+
+from pytype import batch
+from pytype import config
+from pytype import utils
+
+import unittest
+
+
+def _WriteOutputs(items):
+  """Write the output of each item, after checking its dependencies are done."""
+  exit_status = 0
+  for item in items:
+    with open(item.input, "r") as fi:
+      for imp in batch.get_imports(fi.read()):
+        dependency = os.path.join(os.path.dirname(item.input),
+                                  imp.name + ".pyi")
+        if not os.path.exists(dependency):
+          exit_status = 1
+    with open(item.output, "w") as fi:
+      fi.write("")
+  return exit_status
+
+
+def _Fail(unused_items):
+  raise ValueError("Failed!")
+
+
+def _Exit(unused_items):
+  os._exit(3)  # pylint: disable=protected-access
+
+
+def _AppendAndReturn(lst, value):
+  lst.append(value)
+  return len(lst)
+
+
+class GetImportsTest(unittest.TestCase):
+  """Tests for batch.get_imports."""
+
+  def testImport(self):
+    src = textwrap.dedent("""
+      import a
+      import b.c as d, e
+    """)
+    self.assertEqual([("a", 0, None), ("b.c", 0, None), ("e", 0, None)],
+                     batch.get_imports(src))
+
+  def testFromImport(self):
+    src = textwrap.dedent("""
+      from a.b import c
+      from d import (e as f,
+                     g)
+      from h import *
+    """)
+    self.assertEqual([("a.b", 0, ["c"]), ("d", 0, ["e", "g"]),
+                      ("h", 0, ["*"])],
+                     batch.get_imports(src))
+
+  def testRelativeImport(self):
+    src = textwrap.dedent("""
+      from . import a
+      from ..b import c
+    """)
+    self.assertEqual([("", 1, ["a"]), ("b", 2, ["c"])],
+                     batch.get_imports(src))
+
+  def testNested(self):
+    src = textwrap.dedent("""
+      def f():
+        import a; import b
+    """)
+    self.assertEqual([("a", 0, None), ("b", 0, None)], batch.get_imports(src))
+
+  def testIgnoreStringsAndComments(self):
+    src = textwrap.dedent("""
+      # import a
+      x = "import b"
+      '''
+      import c
+      '''
+    """)
+    self.assertEqual([], batch.get_imports(src))
+
+  def testPython3(self):
+    src = textwrap.dedent("""
+      import a
+      def f(x: int) -> str:
+        import b
+    """)
+    self.assertEqual([("a", 0, None), ("b", 0, None)], batch.get_imports(src))
+
+  def testTokenError(self):
+    src = textwrap.dedent("""
+      import a
+      x = (
+    """)
+    self.assertEqual([("a", 0, None)], batch.get_imports(src))
+
+
+class GetImportedModulesTest(unittest.TestCase):
+  """Tests for batch.get_imported_modules."""
+
+  def testImport(self):
+    imp = batch.ImportStatement("a.b", 0, None)
+    self.assertItemsEqual(["a", "a.b"],
+                          batch.get_imported_modules(None, imp))
+
+  def testImplicitRelativeImport(self):
+    imp = batch.ImportStatement("c", 0, None)
+    self.assertItemsEqual(["c", "a", "a.b", "a.b.c"],
+                          batch.get_imported_modules("a.b.d", imp))
+
+  def testFromImport(self):
+    imp = batch.ImportStatement("a", 0, ["b", "*"])
+    self.assertItemsEqual(["a", "a.b"],
+                          batch.get_imported_modules(None, imp))
+
+  def testRelativeImport(self):
+    imp = batch.ImportStatement("", 1, ["c"])
+    self.assertItemsEqual(["a", "a.b", "a.b.c"],
+                          batch.get_imported_modules("a.b.d", imp))
+    imp = batch.ImportStatement("e", 2, ["f"])
+    self.assertItemsEqual(["a", "a.e", "a.e.f"],
+                          batch.get_imported_modules("a.b.d", imp))
+
+  def testRelativeImportFromInit(self):
+    imp = batch.ImportStatement("", 1, ["c"])
+    self.assertItemsEqual(["a", "a.c"],
+                          batch.get_imported_modules("a.__init__", imp))
+
+  def testRelativeImportTooDeep(self):
+    imp = batch.ImportStatement("", 3, ["c"])
+    self.assertEqual([], batch.get_imported_modules("a.b", imp))
+
+
+class DependencyGraphTest(unittest.TestCase):
+  """Tests for batch.build_dependency_graph and batch.order_tasks."""
+
+  def setUp(self):
+    self.options = config.Options.create()
+
+  def _Order(self, d, *filenames):
+    self.options.tweak(pythonpath=[d.path])
+    items = [config.BatchItem(d[f], None, None, None) for f in filenames]
+    tasks = batch.build_dependency_graph(items, self.options)
+    return [task.module_name for task in batch.order_tasks(tasks)]
+
+  def testOrder(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "import b")
+      d.create_file("b.py", "from foo import c")
+      d.create_file("foo/__init__.py", "")
+      d.create_file("foo/c.py", "import os")
+      self.assertEqual(
+          ["foo", "foo.c", "b", "a"],
+          self._Order(d, "a.py", "b.py", "foo/__init__.py", "foo/c.py"))
+
+  def testKeepOrderOfIndependentModules(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "")
+      d.create_file("b.py", "")
+      d.create_file("c.py", "")
+      self.assertEqual(["c", "a", "b"],
+                       self._Order(d, "c.py", "a.py", "b.py"))
+
+  def testCycle(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "import b")
+      d.create_file("b.py", "import c")
+      d.create_file("c.py", "import b")
+      d.create_file("d.py", "import a")
+      self.assertEqual(["b", "c", "a", "d"],
+                       self._Order(d, "d.py", "a.py", "b.py", "c.py"))
+
+  def testExplicitModuleName(self):
+    with utils.Tempdir() as d:
+      d.create_file("x.py", "from . import y")
+      d.create_file("y.py", "")
+      items = [config.BatchItem(d["x.py"], None, "pkg.x", None),
+               config.BatchItem(d["y.py"], None, "pkg.y", None)]
+      tasks = batch.build_dependency_graph(items, self.options)
+      self.assertEqual(["pkg.y", "pkg.x"],
+                       [t.module_name for t in batch.order_tasks(tasks)])
+
+
+class RunInParallelTest(unittest.TestCase):
+  """Tests for batch.run_in_parallel."""
+
+  def setUp(self):
+    self.options = config.Options.create()
+
+  def _CreateTasks(self, d, *filenames):
+    self.options.tweak(pythonpath=[d.path])
+    items = [config.BatchItem(d[f], d[f + "i"], None, None) for f in filenames]
+    return batch.build_dependency_graph(items, self.options)
+
+  def testDependencies(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "")
+      d.create_file("b.py", "import a")
+      d.create_file("c.py", "import a")
+      d.create_file("d.py", "import b\nimport c")
+      tasks = self._CreateTasks(d, "d.py", "c.py", "b.py", "a.py")
+      self.assertEqual(0, batch.run_in_parallel(tasks, _WriteOutputs, 3))
+      for f in ("a.pyi", "b.pyi", "c.pyi", "d.pyi"):
+        self.assertTrue(os.path.exists(d[f]))
+
+  def testCycle(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "import b")
+      d.create_file("b.py", "import a")
+      tasks = self._CreateTasks(d, "a.py", "b.py")
+      # The cycle is processed by a single worker, in order, so "a" doesn't
+      # find the output of "b", but "b" finds the output of "a".
+      self.assertEqual(1, batch.run_in_parallel(tasks, _WriteOutputs, 2))
+      self.assertTrue(os.path.exists(d["a.pyi"]))
+      self.assertTrue(os.path.exists(d["b.pyi"]))
+
+  def testError(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "")
+      tasks = self._CreateTasks(d, "a.py")
+      self.assertRaises(batch.WorkerError,
+                        batch.run_in_parallel, tasks, _Fail, 2)
+
+  def testWorkerDied(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "")
+      tasks = self._CreateTasks(d, "a.py")
+      self.assertRaisesRegexp(batch.WorkerError, r"died.*a\.py",
+                              batch.run_in_parallel, tasks, _Exit, 2)
+
+  def testCriticalPath(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "")
+      d.create_file("b.py", "import a")
+      d.create_file("c.py", "import b")
+      d.create_file("d.py", "")
+      tasks = self._CreateTasks(d, "d.py", "a.py", "b.py", "c.py")
+      components, component_of = batch._order_components(tasks)
+      priorities = batch._critical_path_priorities(components, component_of)
+      d_task, a_task, _, _ = tasks
+      self.assertGreater(priorities[id(component_of[a_task])],
+                         priorities[id(component_of[d_task])])
+
+
+class RunInForkedProcessTest(unittest.TestCase):
+  """Tests for batch.run_in_forked_process."""
+
+  def testExitStatus(self):
+    lst = []
+    self.assertEqual(1, batch.run_in_forked_process(_AppendAndReturn, lst, 3))
+    # The child's changes aren't visible in the parent.
+    self.assertEqual([], lst)
+    self.assertEqual(1, batch.run_in_forked_process(_AppendAndReturn, lst, 4))
+
+  def testNoExitStatus(self):
+    self.assertEqual(0, batch.run_in_forked_process(lambda: None))
+
+  def testError(self):
+    self.assertRaises(batch.WorkerError,
+                      batch.run_in_forked_process, _Fail, [])
+
+  def testKilled(self):
+    self.assertRaises(batch.WorkerError, batch.run_in_forked_process,
+                      lambda: os.kill(os.getpid(), signal.SIGKILL))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -165,6 +165,20 @@ def _split_bytecode(bytecode):
   return blocks
 
 
+def _connect_blocks(blocks):
+  """Add the edges between the basic blocks of a piece of bytecode."""
+  first_op_to_block = {block.code[0]: block for block in blocks}
+  for i, block in enumerate(blocks):
+    next_block = blocks[i + 1] if i < len(blocks) - 1 else None
+    last_op = block.code[-1]
+    if next_block and not last_op.no_next():
+      block.connect_outgoing(next_block)
+    if last_op.target:
+      block.connect_outgoing(first_op_to_block[last_op.target])
+    if last_op.block_target:
+      block.connect_outgoing(first_op_to_block[last_op.block_target])
+
+
 def compute_order(bytecode):
   """Split bytecode into blocks and order the blocks.
 
@@ -178,20 +192,34 @@ def compute_order(bytecode):
     A list of Block instances.
   """
   blocks = _split_bytecode(bytecode)
-  first_op_to_block = {block.code[0]: block for block in blocks}
-  for i, block in enumerate(blocks):
-    next_block = blocks[i + 1] if i < len(blocks) - 1 else None
-    last_op = block.code[-1]
-    if next_block and not last_op.no_next():
-      block.connect_outgoing(next_block)
-    if last_op.target:
-      block.connect_outgoing(first_op_to_block[last_op.target])
-    if last_op.block_target:
-      block.connect_outgoing(first_op_to_block[last_op.block_target])
+  _connect_blocks(blocks)
   return utils.order_nodes(blocks)
 
 
-def order_code(code):
+def restore_order(bytecode, block_ids):
+  """Split bytecode into blocks, and order them like a previous compute_order.
+
+  Args:
+    bytecode: A list of instances of opcodes.Opcode.
+    block_ids: The ids of the blocks returned by compute_order() for the same
+      bytecode.
+
+  Returns:
+    A list of Block instances.
+
+  Raises:
+    ValueError: If block_ids doesn't match the bytecode.
+  """
+  blocks = _split_bytecode(bytecode)
+  _connect_blocks(blocks)
+  id_to_block = {block.id: block for block in blocks}
+  try:
+    return [id_to_block[block_id] for block_id in block_ids]
+  except KeyError as e:
+    raise ValueError("Block %s doesn't exist" % e)
+
+
+def order_code(code, block_ids=None):
   """Split a CodeType object into ordered blocks.
 
   This takes a CodeType object (i.e., a piece of compiled Python code) and
@@ -199,22 +227,74 @@ def order_code(code):
 
   Args:
     code: A loadmarshal.CodeType object.
+    block_ids: Optionally, the ids of the ordered blocks from an earlier
+      order_code() call for the same code. Saves computing the order again.
 
   Returns:
     A CodeBlocks instance.
   """
   bytecodes = opcodes.dis_code(code)
   add_pop_block_targets(bytecodes)  # TODO(kramm): move into pyc/opcodes.py?
-  return OrderedCode(code, bytecodes, compute_order(bytecodes),
-                     code.python_version)
+  if block_ids is None:
+    order = compute_order(bytecodes)
+  else:
+    order = restore_order(bytecodes, block_ids)
+  return OrderedCode(code, bytecodes, order, code.python_version)
 
 
 class OrderCodeVisitor(object):
   """Visitor for recursively changing all CodeType to OrderedCode."""
 
+  def __init__(self, block_orders=None):
+    self._block_orders = None if block_orders is None else iter(block_orders)
+
   def visit_code(self, code):
-    return order_code(code)
+    if self._block_orders is None:
+      return order_code(code)
+    try:
+      block_ids = next(self._block_orders)
+    except StopIteration:
+      raise ValueError("Not enough block orders")
+    return order_code(code, block_ids)
+
+
+class _CollectBlockOrders(object):
+  """Visitor for collecting the block ids of OrderedCode objects."""
+
+  def __init__(self):
+    self.block_orders = []
+
+  def visit_code(self, code):
+    self.block_orders.append([block.id for block in code.order])
+    return code
+
 
+def process_code(code, block_orders=None):
+  """Recursively order all code objects.
 
-def process_code(code):
-  return pyc.visit(code, OrderCodeVisitor())
+  Args:
+    code: A loadmarshal.CodeType object.
+    block_orders: Optionally, the result of get_block_orders() for an earlier
+      process_code() of the same code.
+
+  Returns:
+    An OrderedCode instance.
+
+  Raises:
+    ValueError: If block_orders doesn't match the code.
+  """
+  return pyc.visit(code, OrderCodeVisitor(block_orders))
+
+
+def get_block_orders(ordered_code):
+  """Get the order of the blocks of a process_code() result, as block ids.
+
+  Args:
+    ordered_code: An OrderedCode instance.
+
+  Returns:
+    A list of lists of block ids, one for each (nested) code object.
+  """
+  collector = _CollectBlockOrders()
+  pyc.visit(ordered_code, collector)
+  return collector.block_orders
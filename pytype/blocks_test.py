@@ -258,6 +258,49 @@ class OrderingTest(test_inference.InferenceTest):
     self.assertEquals(1, len(b3.code))
     self.assertEquals(2, len(b4.code))
 
+  def test_restore_order(self):
+    # Disassembled from:
+    # | x = y
+    # | if y > 1:
+    # |   x -= 2
+    # | return x
+    co = self.make_code([
+        0x7c, 0, 0,  # 0 LOAD_FAST, arg=0,
+        0x7d, 1, 0,  # 3 STORE_FAST, arg=1,
+        0x7c, 0, 0,  # 6 LOAD_FAST, arg=0,
+        0x64, 1, 0,  # 9 LOAD_CONST, arg=1 (1),
+        0x6b, 4, 0,  # 12 COMPARE_OP, arg=4,
+        0x72, 31, 0,  # 15 POP_JUMP_IF_FALSE, dest=31,
+        0x7c, 1, 0,  # 18 LOAD_FAST, arg=1,
+        0x64, 2, 0,  # 21 LOAD_CONST, arg=2,
+        0x38,  # 24 INPLACE_SUBTRACT,
+        0x7d, 1, 0,  # 25 STORE_FAST, arg=1,
+        0x6e, 0, 0,  # 28 JUMP_FORWARD, dest=31,
+        0x7c, 1, 0,  # 31 LOAD_FAST, arg=1,
+        0x53,  # 34 RETURN_VALUE
+    ], name="triangle")
+    ordered_code = blocks.order_code(co)
+    block_ids = [b.id for b in ordered_code.order]
+    restored_code = blocks.order_code(co, block_ids)
+    self.assertEquals(block_ids, [b.id for b in restored_code.order])
+    for b1, b2 in zip(ordered_code.order, restored_code.order):
+      self.assertEquals([op.name for op in b1], [op.name for op in b2])
+      self.assertItemsEqual([b.id for b in b1.outgoing],
+                            [b.id for b in b2.outgoing])
+    self.assertRaises(ValueError, blocks.order_code, co, [0, 42])
+
+  def test_block_orders(self):
+    co = self.make_code([
+        0x64, 1, 0,  # 0 LOAD_CONST, arg=0 (None)
+        0x53,  # 3 RETURN_VALUE
+    ], name="trivial")
+    ordered_code = blocks.process_code(co)
+    block_orders = blocks.get_block_orders(ordered_code)
+    self.assertEquals([[0]], block_orders)
+    restored_code = blocks.process_code(co, block_orders)
+    self.assertEquals([[0]], blocks.get_block_orders(restored_code))
+    self.assertRaises(ValueError, blocks.process_code, co, [])
+
 
 class BlockStackTest(test_inference.InferenceTest):
   """Test the add_pop_block_targets function."""
@@ -0,0 +1,114 @@
+"""A content-addressed on-disk cache of compiled and ordered bytecode.
+
+Compiling source code needs an external Python interpreter, and ordering the
+blocks of the bytecode (see blocks.py) is expensive for big modules. Neither
+depends on anything but the source code and the compile parameters, so we store
+the pyc data and the block order of every code object under a hash of those.
+"""
+
+import cPickle
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+
+from pytype import blocks
+from pytype import metrics
+from pytype.pyc import pyc
+
+log = logging.getLogger(__name__)
+
+
+# Change this whenever the format of the cached data changes.
+_FORMAT_VERSION = 1
+
+
+_hits = metrics.Counter("bytecode_cache_hits")
+_misses = metrics.Counter("bytecode_cache_misses")
+
+
+class BytecodeCache(object):
+  """A directory with cached bytecode.
+
+  The cache can be shared between concurrent pytype processes: Every entry is
+  written to a temporary file first and then renamed, so readers never see a
+  partial entry.
+  """
+
+  def __init__(self, directory):
+    self._directory = directory
+
+  def _get_path(self, src, python_version, python_exe, filename, mode):
+    """Compute the location of the cache entry for the given parameters."""
+    h = hashlib.sha1()
+    exe = python_exe
+    if python_exe == "HOST":
+      # Include the version of the host, since the bytecode depends on it.
+      exe += " " + sys.version
+    for part in (str(_FORMAT_VERSION), src, repr(python_version), repr(exe),
+                 repr(filename), mode):
+      h.update(part)
+      h.update("\0")
+    digest = h.hexdigest()
+    return os.path.join(self._directory, digest[:2], digest[2:])
+
+  def _load(self, path):
+    try:
+      with open(path, "rb") as fi:
+        return cPickle.load(fi)
+    except (IOError, EOFError, cPickle.UnpicklingError, ValueError) as e:
+      if os.path.exists(path):
+        log.warning("Ignoring bad bytecode cache entry %s: %s", path, e)
+      return None
+
+  def _store(self, path, data):
+    directory = os.path.dirname(path)
+    try:
+      if not os.path.isdir(directory):
+        os.makedirs(directory)
+    except OSError:
+      # Another process might have created it in the meantime.
+      if not os.path.isdir(directory):
+        raise
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as fi:
+      cPickle.dump(data, fi, protocol=cPickle.HIGHEST_PROTOCOL)
+    os.rename(fi.name, path)
+
+  def compile_src(self, src, python_version, python_exe, filename=None,
+                  mode="exec"):
+    """Compile and order source code, or retrieve it from the cache.
+
+    Args:
+      src: Python source code.
+      python_version: Python version, (major, minor).
+      python_exe: Path to Python interpreter, or None. See pyc.compile_src.
+      filename: The filename the sourcecode is from.
+      mode: "exec", "eval" or "single".
+
+    Returns:
+      An instance of blocks.OrderedCode.
+
+    Raises:
+      pyc.CompileError: If the source code has syntax errors. Such errors are
+        not cached.
+    """
+    path = self._get_path(src, python_version, python_exe, filename, mode)
+    entry = self._load(path)
+    if entry is not None:
+      pyc_data, block_orders = entry
+      code = pyc.load_pyc_string(pyc_data, python_version, filename)
+      try:
+        ordered_code = blocks.process_code(code, block_orders)
+      except ValueError as e:
+        log.warning("Ignoring bad bytecode cache entry %s: %s", path, e)
+      else:
+        _hits.inc()
+        return ordered_code
+    _misses.inc()
+    pyc_data = pyc.compile_src_string_to_pyc_string(
+        src, filename, python_version, python_exe, mode)
+    code = pyc.load_pyc_string(pyc_data, python_version, filename)
+    ordered_code = blocks.process_code(code)
+    self._store(path, (pyc_data, blocks.get_block_orders(ordered_code)))
+    return ordered_code
@@ -0,0 +1,88 @@
+"""Tests for bytecode_cache.py."""
+
+import os
+
+
+from pytype import blocks
+from pytype import bytecode_cache
+from pytype import utils
+from pytype.pyc import pyc
+
+import unittest
+
+
+class BytecodeCacheTest(unittest.TestCase):
+  """Tests for BytecodeCache."""
+
+  PYTHON_VERSION = (2, 7)
+
+  SRC = "x = 1\ndef f():\n  return x\n"
+
+  def setUp(self):
+    self._compile_src_string_to_pyc_string = (
+        pyc.compile_src_string_to_pyc_string)
+    self.compiled = []
+
+  def tearDown(self):
+    pyc.compile_src_string_to_pyc_string = (
+        self._compile_src_string_to_pyc_string)
+
+  def _CountingCompile(self, src, *args, **kwargs):
+    self.compiled.append(src)
+    return self._compile_src_string_to_pyc_string(src, *args, **kwargs)
+
+  def _Compile(self, cache, src, filename="foo.py"):
+    pyc.compile_src_string_to_pyc_string = self._CountingCompile
+    return cache.compile_src(src, self.PYTHON_VERSION, None,
+                             filename=filename)
+
+  def testHit(self):
+    with utils.Tempdir() as d:
+      cache = bytecode_cache.BytecodeCache(d.path)
+      code1 = self._Compile(cache, self.SRC)
+      code2 = self._Compile(cache, self.SRC)
+      self.assertEquals([self.SRC], self.compiled)
+      self.assertEquals(blocks.get_block_orders(code1),
+                        blocks.get_block_orders(code2))
+      self.assertEquals("foo.py", code2.co_filename)
+      self.assertEquals(["x", "f"], [name for name in code2.co_names
+                                     if name in ("x", "f")])
+
+  def testSharedDirectory(self):
+    with utils.Tempdir() as d:
+      self._Compile(bytecode_cache.BytecodeCache(d.path), self.SRC)
+      self._Compile(bytecode_cache.BytecodeCache(d.path), self.SRC)
+      self.assertEquals([self.SRC], self.compiled)
+
+  def testMiss(self):
+    with utils.Tempdir() as d:
+      cache = bytecode_cache.BytecodeCache(d.path)
+      self._Compile(cache, self.SRC)
+      self._Compile(cache, self.SRC + "y = 2\n")
+      self._Compile(cache, self.SRC, filename="bar.py")
+      self.assertEquals(3, len(self.compiled))
+
+  def testCompileError(self):
+    with utils.Tempdir() as d:
+      cache = bytecode_cache.BytecodeCache(d.path)
+      self.assertRaises(pyc.CompileError, self._Compile, cache, "x ==== 1")
+      self.assertRaises(pyc.CompileError, self._Compile, cache, "x ==== 1")
+      self.assertEquals(2, len(self.compiled))
+
+  def testBadEntry(self):
+    with utils.Tempdir() as d:
+      cache = bytecode_cache.BytecodeCache(d.path)
+      self._Compile(cache, self.SRC)
+      for subdir, _, files in os.walk(d.path):
+        for f in files:
+          with open(os.path.join(subdir, f), "w") as fi:
+            fi.write("garbage")
+      code = self._Compile(cache, self.SRC)
+      self.assertIn("x", code.co_names)
+      self.assertEquals(2, len(self.compiled))
+      self._Compile(cache, self.SRC)
+      self.assertEquals(2, len(self.compiled))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -4,9 +4,11 @@ Various parts of pytype use the command-line options. This module packages the
 options into an Options class.
 """
 
+import collections
 import logging
 import optparse
 import os
+import shlex
 import subprocess
 
 
@@ -24,6 +26,13 @@ OptParseError = optparse.OptParseError  # used by main.py
 uses = utils.AnnotatingDecorator()  # model relationship between options
 
 
+# One module of a --batch run. "output", "module_name" and "output_pickled" can
+# be None, in which case they're treated like the respective command-line flags
+# not being set.
+BatchItem = collections.namedtuple(
+    "BatchItem", ["input", "output", "module_name", "output_pickled"])
+
+
 class Options(object):
   """Encapsulation of the command-line options."""
 
@@ -40,13 +49,19 @@ class Options(object):
     """
     o = self._options()
     self._options, arguments = o.parse_args(argv)
-    self._options.input, output = _parse_arguments(arguments[1:])
-    if output:
-      if self._options.output:
-        raise optparse.OptionValueError("x:y notation not allowed with -o")
-      self._options.output = output
+    if self._options.batch or self._options.manifest:
+      self._options.input = None
+      self._options.batch_items = arguments[1:]
+    else:
+      self._options.input, output = _parse_arguments(arguments[1:])
+      self._options.batch_items = None
+      if output:
+        if self._options.output:
+          raise optparse.OptionValueError("x:y notation not allowed with -o")
+        self._options.output = output
     names = {opt.dest for opt in o.option_list if opt.dest}
     names.add("input")
+    names.add("batch_items")
     self._postprocess_options(names)
 
   @classmethod
@@ -67,6 +82,13 @@ class Options(object):
         usage=("Usage: %prog [options] "
                "file1.py[:file1.pyi] [file2.py:file2.pyi [...]]"),
         description="Infer/check types in a Python module")
+    o.add_option(
+        "--batch", action="store_true",
+        dest="batch", default=False,
+        help=("Process all the input:output pairs given on the command line "
+              "in a single process. The inputs are analyzed in the order of "
+              "their imports, so that the output of a module is available "
+              "to the modules that import it."))
     o.add_option(
         "-B", "--builtins", type="string", action="store",
         dest="pybuiltins_filename", default=None,
@@ -77,6 +99,13 @@ class Options(object):
               "The default resolves to pytd/builtins/__builtin__.py. "
               "Note that this does not affect the PyTD for builtins, which "
               "is always in pytd/builtins/__builtin__.pytd."))
+    o.add_option(
+        "--bytecode-cache", type="string", action="store",
+        dest="bytecode_cache", default=None,
+        help=("Directory for caching compiled bytecode. Modules whose "
+              "source hasn't changed (including the builtins) are then "
+              "loaded from the cache instead of being compiled again. The "
+              "directory can be shared by concurrent pytype processes."))
     o.add_option(
         "-C", "--check", action="store_true",
         dest="check",
@@ -85,29 +114,124 @@ class Options(object):
         "--check_preconditions", action="store_true",
         dest="check_preconditions", default=False,
         help=("Enable checking of preconditions."))
+    o.add_option(
+        "--cost-report", type="string", action="store",
+        dest="cost_report", default=None,
+        help=("Write the cost of analyzing each function (opcodes run, "
+              "frames entered, call cache hits and misses, CFG nodes and "
+              "bindings created, and wall time) to the given file, as JSON. "
+              "The wall time per call stack is written to the same file "
+              "name plus \".folded\", in the collapsed stack format of "
+              "flame graph tools. With --batch and --manifest, every module "
+              "gets its own file, with the module name appended."))
     o.add_option(
         "-d", "--disable", action="store",
         dest="disable", default=None,
         help=("Comma separated list of error names to ignore."))
+    o.add_option(
+        "--fork-per-module", action="store_true",
+        dest="fork_per_module", default=False,
+        help=("With --batch or --manifest, run the builtins only once, and "
+              "analyze every module in a process forked from that state."))
+    o.add_option(
+        "--function-budget-nodes", type="int", action="store",
+        dest="function_budget_nodes", default=None,
+        help=("Abandon the analysis of a function after it created this "
+              "many CFG nodes."))
+    o.add_option(
+        "--function-budget-opcodes", type="int", action="store",
+        dest="function_budget_opcodes", default=None,
+        help=("Abandon the analysis of a function after it ran this many "
+              "opcodes."))
+    o.add_option(
+        "--function-budget-seconds", type="float", action="store",
+        dest="function_budget_seconds", default=None,
+        help=("Abandon the analysis of a function after this many seconds. "
+              "Abandoned functions are reported with an "
+              "analysis-budget-exceeded warning, and return Any."))
+    o.add_option(
+        "--function-summaries", type="int", action="store",
+        dest="function_summaries", default=None,
+        help=("Reuse the return type of an earlier call of a function whose "
+              "arguments had the same types, instead of only of calls with "
+              "the exact same arguments. After this many distinct argument "
+              "types, calls with new ones return the union of all return "
+              "types so far. Functions that modify their arguments or "
+              "globals are always analyzed. Faster, but less precise."))
     o.add_option(
         "--generate-builtins", action="store",
         dest="generate_builtins", default=None,
         help="Precompile builtins pytd and write to the given file.")
+    o.add_option(
+        "--generate-stdlib-cache", type="string", action="store",
+        dest="generate_stdlib_cache", default=None,
+        help=("Load all the typeshed and pytd stubs for --python_version, "
+              "and store them in the given cache directory, for "
+              "--stdlib-cache."))
     o.add_option(
         "--output-pickled", action="store",
         dest="output_pickled",
         help=("Saves the ast representation of the inferred pyi as a pickled "
               "file. The value of this parameter is the destination filename "
               "for the pickled data."))
+    o.add_option(
+        "--incremental", action="store_true",
+        dest="incremental", default=False,
+        help=("Store a fingerprint of the inputs next to the output (or, "
+              "with --check, the --touch file), and skip the analysis if "
+              "it matches the fingerprint of the previous run. The "
+              "fingerprint contains the interfaces of the imported "
+              "modules, not their source code."))
     o.add_option(
         "--imports_info", type="string", action="store",
         dest="imports_map", default=None,
         help=("Information for mapping import .pytd to files. "
               "This options is incompatible with --pythonpath."))
+    o.add_option(
+        "--intern-pytd", action="store_true",
+        dest="intern_pytd", default=False,
+        help=("Share a single instance of equal type annotations, e.g. of "
+              "all the str types, between the imported .pyi files. Uses less "
+              "memory for many or large .pyi files."))
     o.add_option(
         "-m", "--main", action="store_true",
         dest="main_only", default=False,
         help=("Only analyze the main method and everything called from it"))
+    o.add_option(
+        "-j", "--jobs", type="int", action="store",
+        dest="jobs", default=1,
+        help=("Number of worker processes for --batch and --manifest. "
+              "A module is analyzed once all the modules it imports are "
+              "done."))
+    o.add_option(
+        "--lazy-imports", action="store_true",
+        dest="lazy_imports", default=False,
+        help=("Only load the modules an imported .pyi depends on, and "
+              "resolve its references to them, when a member that uses "
+              "them is looked up."))
+    o.add_option(
+        "--module-budget-nodes", type="int", action="store",
+        dest="module_budget_nodes", default=None,
+        help=("Stop analyzing the functions and classes of a module after "
+              "it created this many CFG nodes."))
+    o.add_option(
+        "--module-budget-opcodes", type="int", action="store",
+        dest="module_budget_opcodes", default=None,
+        help=("Stop analyzing the functions and classes of a module after "
+              "it ran this many opcodes."))
+    o.add_option(
+        "--module-budget-seconds", type="float", action="store",
+        dest="module_budget_seconds", default=None,
+        help=("Stop analyzing the functions and classes of a module after "
+              "this many seconds."))
+    o.add_option(
+        "--manifest", type="string", action="store",
+        dest="manifest", default=None,
+        help=("Read the modules to process from the given file and run "
+              "them like --batch. Each line contains an input file, and "
+              "optionally an output file, a module name and a pickled "
+              "output file, separated by whitespace. Use '-' to skip a "
+              "field."))
     o.add_option(
         "-M", "--module-name", action="store",
         dest="module_name", default=None,
@@ -183,6 +307,25 @@ class Options(object):
               "source(s) to byte code. Can be \"HOST\" to use the same Python "
               "that is running pytype. If not specified, --python_version is "
               "used to create the name of an interpreter."))
+    o.add_option(
+        "--solver-cache-size", type="int", action="store",
+        dest="solver_cache_size", default=None,
+        help=("Maximum number of entries in each of the caches of the CFG "
+              "solver. The least recently used entries are evicted when a "
+              "cache is full. Unbounded by default."))
+    o.add_option(
+        "--stdlib-cache", type="string", action="store",
+        dest="stdlib_cache", default=None,
+        help=("Load the standard library and third party stubs from a cache "
+              "directory created with --generate-stdlib-cache. The cache "
+              "is only used if it matches the current stubs."))
+    o.add_option(
+        "--typegraph-gc-interval", type="int", action="store",
+        dest="typegraph_gc_interval", default=None,
+        help=("Free the bindings and variables that are no longer reachable "
+              "whenever the memory use grew by this many megabytes, checked "
+              "after the analysis of each function. Incompatible with the "
+              "options that output the typegraph."))
     o.add_option(
         "--use-pickled-files", action="store_true", default=False,
         dest="use_pickled_files",
@@ -271,26 +414,60 @@ class Options(object):
       else:
         setattr(self, node.name, value)
 
-  @uses(["output"])
+  @uses(["output", "batch_items"])
   def _store_check(self, check):
+    has_output = self.output or any(
+        item.output for item in self.batch_items or ())
     if check is None:
-      self.check = not self.output
-    elif self.output:
+      self.check = not has_output
+    elif has_output:
       raise optparse.OptionConflictError("Not allowed with an output file",
                                          "check")
     else:
       self.check = check
 
-  @uses(["input"])
+  @uses(["input", "batch_items", "generate_stdlib_cache"])
   def _store_generate_builtins(self, generate_builtins):
     if generate_builtins:
-      if self.input:
+      if self.input or self.batch_items:
         raise optparse.OptionConflictError("Not allowed with an input file",
                                            "generate-builtins")
-    elif not self.input:
+    elif (not self.input and not self.batch_items and
+          not self.generate_stdlib_cache):
       raise optparse.OptParseError("Need a filename.")
     self.generate_builtins = generate_builtins
 
+  @uses(["input", "batch_items"])
+  def _store_generate_stdlib_cache(self, generate_stdlib_cache):
+    if generate_stdlib_cache and (self.input or self.batch_items):
+      raise optparse.OptionConflictError("Not allowed with an input file",
+                                         "generate-stdlib-cache")
+    self.generate_stdlib_cache = generate_stdlib_cache
+
+  @uses(["batch", "manifest", "output", "module_name", "output_pickled",
+         "imports_map", "output_errors_csv", "output_cfg", "output_debug",
+         "output_typegraph"])
+  def _store_batch_items(self, batch_items):
+    """Postprocess the input files of --batch and --manifest."""
+    if batch_items is None:
+      self.batch_items = None
+      return
+    for value, name in [(self.output, "output"),
+                        (self.module_name, "module-name"),
+                        (self.output_pickled, "output-pickled"),
+                        (self.imports_map, "imports_info"),
+                        # Every module would overwrite these.
+                        (self.output_errors_csv, "output-errors-csv"),
+                        (self.output_cfg, "output-cfg"),
+                        (self.output_debug, "output-debug"),
+                        (self.output_typegraph, "output-typegraph")]:
+      if value:
+        raise optparse.OptionConflictError("Not allowed with --batch", name)
+    items = [_parse_batch_argument(arg) for arg in batch_items]
+    if self.manifest:
+      items.extend(_read_manifest(self.manifest))
+    self.batch_items = items
+
   @uses(["module_name"])
   def _store_read_pyi_save_pickle(self, read_pyi_save_pickle):
     if read_pyi_save_pickle and not self.module_name:
@@ -333,6 +510,43 @@ class Options(object):
       raise optparse.OptParseError(
           "Python versions > 3.6 are not yet supported.")
 
+  def _store_jobs(self, jobs):
+    if jobs < 1:
+      raise optparse.OptionValueError("--jobs must be at least 1: %d" % jobs)
+    self.jobs = jobs
+
+  @uses(["skip_repeat_calls"])
+  def _store_function_summaries(self, function_summaries):
+    if function_summaries is not None:
+      if function_summaries < 1:
+        raise optparse.OptionValueError(
+            "--function-summaries must be at least 1: %d" % function_summaries)
+      if not self.skip_repeat_calls:
+        raise optparse.OptionConflictError(
+            "Not allowed with --function-summaries", "no-skip-calls")
+    self.function_summaries = function_summaries
+
+  def _store_solver_cache_size(self, solver_cache_size):
+    if solver_cache_size is not None and solver_cache_size < 1:
+      raise optparse.OptionValueError(
+          "--solver-cache-size must be at least 1: %d" % solver_cache_size)
+    self.solver_cache_size = solver_cache_size
+
+  @uses(["output_cfg", "output_debug", "output_typegraph"])
+  def _store_typegraph_gc_interval(self, typegraph_gc_interval):
+    if typegraph_gc_interval is not None:
+      if typegraph_gc_interval < 1:
+        raise optparse.OptionValueError(
+            "--typegraph-gc-interval must be at least 1: %d" %
+            typegraph_gc_interval)
+      for value, name in [(self.output_cfg, "output-cfg"),
+                          (self.output_debug, "output-debug"),
+                          (self.output_typegraph, "output-typegraph")]:
+        if value:
+          raise optparse.OptionConflictError(
+              "Not allowed with --typegraph-gc-interval", name)
+    self.typegraph_gc_interval = typegraph_gc_interval
+
   def _store_disable(self, disable):
     if disable:
       self.disable = disable.split(",")
@@ -374,6 +588,37 @@ class Options(object):
     self.output_errors_csv = output_errors_csv
 
 
+def _parse_batch_argument(argument):
+  split = argument.split(os.pathsep)
+  if len(split) > 2 or not all(split):
+    raise optparse.OptionValueError("Argument %r is not a pair of non-"
+                                    "empty file names separated by %r" %
+                                    (argument, os.pathsep))
+  input_filename, output_filename = (split + [None])[:2]
+  return BatchItem(input_filename, output_filename, None, None)
+
+
+def _read_manifest(filename):
+  """Read the BatchItems listed in a --manifest file."""
+  items = []
+  with open(filename) as fi:
+    for lineno, line in enumerate(fi, 1):
+      fields = shlex.split(line, comments=True)
+      if not fields:
+        continue
+      if len(fields) > len(BatchItem._fields):
+        raise optparse.OptionValueError(
+            "%s:%d: Expected at most %d fields, got %d" % (
+                filename, lineno, len(BatchItem._fields), len(fields)))
+      fields = [None if f == "-" else f for f in fields]
+      fields += [None] * (len(BatchItem._fields) - len(fields))
+      if fields[0] is None:
+        raise optparse.OptionValueError(
+            "%s:%d: Missing input file" % (filename, lineno))
+      items.append(BatchItem(*fields))
+  return items
+
+
 def _parse_arguments(arguments):
   if len(arguments) > 1:
     raise optparse.OptionValueError("Can only process one file at a time.")
@@ -12,6 +12,7 @@ from pytype import utils
 from pytype.pyc import loadmarshal
 from pytype.pytd import cfg
 from pytype.pytd import pytd
+from pytype.pytd import serialize_ast
 from pytype.pytd import utils as pytd_utils
 
 
@@ -36,7 +37,7 @@ class Converter(object):
     self.vm.convert = self  # to make constant_to_var calls below work
     self.pytd_convert = output.Converter()
 
-    self._convert_cache = {}
+    self._convert_cache = vm.caches.get("convert")
 
     # Initialize primitive_classes to empty to allow constant_to_var to run.
     self.primitive_classes = ()
@@ -458,6 +459,9 @@ class Converter(object):
       except (KeyError, AttributeError):
         log.debug("Failed to find pytd", exc_info=True)
         raise
+    elif isinstance(pyval, serialize_ast.LazyUnit):
+      # Only the members the program uses are loaded.
+      return abstract.Module(self.vm, pyval.name, pyval.GetMemberMap(), pyval)
     elif isinstance(pyval, pytd.TypeDeclUnit):
       data = (pyval.constants + pyval.type_params + pyval.classes +
               pyval.functions + pyval.aliases)
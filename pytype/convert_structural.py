@@ -3,6 +3,7 @@
 import logging
 
 from pytype.pytd import booleq
+from pytype.pytd import class_hierarchy
 from pytype.pytd import optimize
 from pytype.pytd import pytd
 from pytype.pytd import transforms
@@ -114,8 +115,9 @@ class TypeSolver(object):
     Raises:
       AssertionError: If we detect an internal error.
     """
-    hierarchy = type_match.get_all_subclasses([self.ast, self.builtins])
-    factory = type_match.TypeMatch(hierarchy)
+    hierarchy = class_hierarchy.ClassHierarchy.FromAsts(
+        [self.ast, self.builtins])
+    factory = type_match.TypeMatch(hierarchy=hierarchy)
     solver = factory.solver
 
     unknown_classes = set()
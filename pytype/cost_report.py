@@ -0,0 +1,111 @@
+"""Attribute the cost of an analysis to the functions being analyzed.
+
+With --cost-report, the VirtualMachine tells a CostReport whenever it enters or
+leaves a frame. The work done in between (opcodes run, CFG nodes and bindings
+created, wall time) is attributed to the code object of the innermost frame,
+and to the stack of code objects leading to it. The report is written as JSON,
+with one entry per code object, and in the collapsed stack format used by
+flame graph tools.
+"""
+
+import collections
+import json
+import time
+
+
+# The costs that are measured between frame transitions, in the order
+# _snapshot() returns them.
+_MEASURED_COSTS = ("opcodes", "cfg_nodes", "bindings", "seconds")
+
+# All costs in the JSON report.
+COSTS = ("opcodes", "frames", "call_cache_hits", "call_cache_misses",
+         "cfg_nodes", "bindings", "seconds")
+
+
+def _get_key(code):
+  return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _get_label(key):
+  filename, line, name = key
+  return "%s (%s:%d)" % (name, filename, line)
+
+
+class CostReport(object):
+  """Costs per code object, and per stack of code objects."""
+
+  def __init__(self, vm):
+    self._vm = vm
+    # Map from code key to costs.
+    self._functions = collections.defaultdict(collections.Counter)
+    # Map from tuple of code keys, outermost first, to costs.
+    self._stacks = collections.defaultdict(collections.Counter)
+    self._last_snapshot = self._snapshot()
+
+  def _snapshot(self):
+    return (self._vm.opcode_count, len(self._vm.program.cfg_nodes),
+            self._vm.program.num_bindings, time.time())
+
+  def flush(self):
+    """Attribute the work since the last call to the current frame stack.
+
+    Has to be called before every change to the frame stack.
+    """
+    snapshot = self._snapshot()
+    stack = tuple(_get_key(f.f_code) for f in self._vm.frames if f.f_code)
+    if stack:
+      costs = {name: new - old for name, new, old in zip(
+          _MEASURED_COSTS, snapshot, self._last_snapshot)}
+      self._functions[stack[-1]].update(costs)
+      self._stacks[stack].update(costs)
+    self._last_snapshot = snapshot
+
+  def enter_frame(self, frame):
+    self.flush()
+    if frame.f_code:
+      self._functions[_get_key(frame.f_code)]["frames"] += 1
+
+  def record_call(self, code, cache_hit):
+    key = "call_cache_hits" if cache_hit else "call_cache_misses"
+    self._functions[_get_key(code)][key] += 1
+
+  def get_functions(self):
+    """Get the costs of all code objects, most expensive first.
+
+    Returns:
+      A list of dictionaries, with the keys "name", "filename", "line", and
+      the ones in COSTS.
+    """
+    self.flush()
+    functions = []
+    for (filename, line, name), costs in self._functions.items():
+      function = {"name": name, "filename": filename, "line": line}
+      for cost in COSTS:
+        function[cost] = costs[cost]
+      functions.append(function)
+    return sorted(functions, key=lambda f: (-f["seconds"], f["filename"],
+                                            f["line"], f["name"]))
+
+  def get_collapsed_stacks(self):
+    """Get the wall time per stack, in the collapsed stack format.
+
+    Returns:
+      A list of lines "outermost;...;innermost microseconds".
+    """
+    self.flush()
+    lines = []
+    for stack, costs in sorted(self._stacks.items()):
+      microseconds = int(costs["seconds"] * 1e6)
+      if microseconds > 0:
+        lines.append("%s %d" % (";".join(_get_label(key) for key in stack),
+                                microseconds))
+    return lines
+
+  def write(self, filename):
+    """Write the report to filename, and the collapsed stacks next to it."""
+    with open(filename, "w") as fi:
+      json.dump({"functions": self.get_functions()}, fi, indent=2,
+                sort_keys=True)
+    with open(filename + ".folded", "w") as fi:
+      for line in self.get_collapsed_stacks():
+        fi.write(line + "\n")
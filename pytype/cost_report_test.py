@@ -0,0 +1,93 @@
+"""Tests for cost_report.py."""
+
+import json
+import textwrap
+
+
+from pytype import config
+from pytype import cost_report
+from pytype import errors
+from pytype import infer
+from pytype import load_pytd
+from pytype import utils
+
+import unittest
+
+
+class CostReportTest(unittest.TestCase):
+  """Tests for CostReport."""
+
+  PYTHON_VERSION = (2, 7)
+
+  def _Infer(self, src, report_filename):
+    options = config.Options.create(python_version=self.PYTHON_VERSION,
+                                    cost_report=report_filename)
+    loader = load_pytd.Loader(None, options)
+    infer.infer_types(textwrap.dedent(src), errors.ErrorLog(), options, loader,
+                      filename="foo.py", deep=True)
+
+  def _GetFunctions(self, report_filename):
+    with open(report_filename) as fi:
+      functions = json.load(fi)["functions"]
+    return {(f["filename"], f["name"]): f for f in functions}
+
+  def testFunctions(self):
+    with utils.Tempdir() as d:
+      filename = d["report.json"]
+      self._Infer("""\
+        def f(x):
+          return [x, x, x] if x else None
+        def g():
+          return f(1) + f(1)
+      """, filename)
+      functions = self._GetFunctions(filename)
+      f = functions["foo.py", "f"]
+      g = functions["foo.py", "g"]
+      module = functions["foo.py", "<module>"]
+      for function in f, g, module:
+        self.assertItemsEqual(["name", "filename", "line"] +
+                              list(cost_report.COSTS), function)
+      self.assertEquals(1, f["line"])
+      self.assertEquals(3, g["line"])
+      # f is analyzed by itself, and called from g once. The second call from g
+      # is a call cache hit.
+      self.assertEquals(2, f["frames"])
+      self.assertEquals(2, f["call_cache_misses"])
+      self.assertEquals(1, f["call_cache_hits"])
+      self.assertEquals(1, g["frames"])
+      self.assertEquals(1, module["frames"])
+      for function in f, g:
+        self.assertGreater(function["opcodes"], 0)
+        self.assertGreater(function["bindings"], 0)
+        self.assertGreaterEqual(function["seconds"], 0)
+      # Only f has a branch.
+      self.assertGreater(f["cfg_nodes"], 0)
+
+  def testCollapsedStacks(self):
+    with utils.Tempdir() as d:
+      filename = d["report.json"]
+      self._Infer("""\
+        def f():
+          return 42
+        def g():
+          return f()
+        g()
+      """, filename)
+      with open(filename + ".folded") as fi:
+        lines = fi.read().splitlines()
+      stacks = set()
+      for line in lines:
+        stack, microseconds = line.rsplit(" ", 1)
+        self.assertGreater(int(microseconds), 0)
+        stacks.add(stack)
+      self.assertIn("<module> (foo.py:1);g (foo.py:3);f (foo.py:1)", stacks)
+
+  def testDisabled(self):
+    options = config.Options.create(python_version=self.PYTHON_VERSION)
+    loader = load_pytd.Loader(None, options)
+    tracer = infer.create_preloaded_tracer(options, loader, check=False)
+    self.assertIsNone(tracer.cost_report)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -645,6 +645,10 @@ class ErrorLog(ErrorLogBase):
   def recursion_error(self, stack, name):
     self.error(stack, "Detected recursion in %s" % name)
 
+  @_error_name("analysis-budget-exceeded")
+  def analysis_budget_exceeded(self, stack, name, reason):
+    self.warn(stack, "Analysis of %s abandoned after %s", name, reason)
+
   @_error_name("redundant-function-type-comment")
   def redundant_function_type_comment(self, filename, lineno):
     self._add(Error(
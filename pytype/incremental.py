@@ -0,0 +1,190 @@
+"""Skip the analysis of modules whose inputs haven't changed.
+
+The outputs of a module only depend on its source code, the options, and the
+interfaces of the modules it loads. After a successful run, we store a
+fingerprint of all of those next to the output. If a later run computes the
+same fingerprint, the outputs of the previous run are still valid, and the
+module isn't analyzed again.
+
+The fingerprint of a dependency is taken from its canonical pyi, not from its
+source. So changing the implementation of a module without changing its
+interface doesn't cause the modules that import it to be analyzed again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from pytype import load_pytd
+from pytype import metrics
+from pytype.pyi import parser
+from pytype.pytd import pytd
+from pytype.pytd import utils as pytd_utils
+
+log = logging.getLogger(__name__)
+
+
+# Change this whenever the format of the fingerprint, or the meaning of any of
+# its parts, changes.
+_FORMAT_VERSION = 1
+
+
+# The options that influence the outputs of a module.
+_OPTIONS = ("check", "python_version", "python_exe", "pybuiltins_filename",
+            "module_name", "main_only", "quick", "run_builtins",
+            "cache_unknowns", "skip_repeat_calls", "function_summaries",
+            "function_budget_nodes", "function_budget_opcodes",
+            "function_budget_seconds", "module_budget_nodes",
+            "module_budget_opcodes", "module_budget_seconds",
+            "typeshed", "disable", "nofail", "report_errors")
+
+
+_up_to_date = metrics.Counter("incremental_up_to_date")
+_out_of_date = metrics.Counter("incremental_out_of_date")
+
+
+# The fingerprints of the modules we've seen, by module name. We keep the AST
+# around, so that we only reuse a fingerprint if the module is unchanged.
+_module_fingerprints = {}
+
+
+def get_fingerprint_file(options):
+  """Return where to store the fingerprint of a module, or None.
+
+  Args:
+    options: config.Options object.
+  Returns:
+    The output file (or, with --check, the --touch file) with ".fingerprint"
+    appended. None if --incremental isn't set, or if there's no such file.
+  """
+  if not options.incremental:
+    return None
+  output = options.touch if options.check else options.output
+  if not output or output == "-":
+    return None
+  return output + ".fingerprint"
+
+
+def _hash(*parts):
+  h = hashlib.sha1()
+  for part in parts:
+    h.update(part)
+    h.update("\0")
+  return h.hexdigest()
+
+
+def _fingerprint_options(options):
+  return _hash(*(repr(getattr(options, name)) for name in _OPTIONS))
+
+
+def _fingerprint_module(module_name, ast):
+  cached = _module_fingerprints.get(module_name)
+  if cached and cached[0] is ast:
+    return cached[1]
+  fingerprint = _hash(pytd.Print(pytd_utils.CanonicalOrdering(ast)))
+  _module_fingerprints[module_name] = (ast, fingerprint)
+  return fingerprint
+
+
+def compute_fingerprint(src, options, loader):
+  """Compute the fingerprint of a module that was just analyzed.
+
+  Args:
+    src: The source code of the module.
+    options: config.Options object.
+    loader: The load_pytd.Loader used to analyze the module.
+  Returns:
+    A dictionary.
+  """
+  # The module itself might have been loaded from a previous output, e.g. if
+  # it's part of an import cycle.
+  own_names = {options.module_name}
+  if options.module_name and options.module_name.endswith(".__init__"):
+    own_names.add(options.module_name[:-len(".__init__")])
+  modules = {}
+  for module in loader.get_dependencies():
+    if module.module_name not in own_names:
+      modules[module.module_name] = _fingerprint_module(module.module_name,
+                                                        module.ast)
+  return {"version": _FORMAT_VERSION,
+          "source": _hash(src),
+          "options": _fingerprint_options(options),
+          "modules": modules}
+
+
+def store_fingerprint(filename, fingerprint):
+  directory = os.path.dirname(filename) or "."
+  with tempfile.NamedTemporaryFile(dir=directory, delete=False) as fi:
+    json.dump(fingerprint, fi, indent=2, sort_keys=True)
+  os.rename(fi.name, filename)
+
+
+def remove_fingerprint(filename):
+  """Remove a fingerprint, since the outputs are about to be replaced."""
+  try:
+    os.remove(filename)
+  except OSError:
+    if os.path.exists(filename):
+      raise
+
+
+def _load_fingerprint(filename):
+  try:
+    with open(filename, "r") as fi:
+      return json.load(fi)
+  except (IOError, ValueError) as e:
+    if os.path.exists(filename):
+      log.warning("Ignoring bad fingerprint %s: %s", filename, e)
+    return None
+
+
+def _is_up_to_date(filename, src, options, loader):
+  """Compare a stored fingerprint against the current inputs."""
+  fingerprint = _load_fingerprint(filename)
+  if (not isinstance(fingerprint, dict) or
+      fingerprint.get("version") != _FORMAT_VERSION):
+    return False
+  if (fingerprint["source"] != _hash(src) or
+      fingerprint["options"] != _fingerprint_options(options)):
+    return False
+  outputs = [] if options.check else [options.output]
+  if options.output_pickled:
+    outputs.append(options.output_pickled)
+  if not all(os.path.exists(output) for output in outputs):
+    return False
+  for module_name, module_fingerprint in sorted(
+      fingerprint["modules"].items()):
+    module_name = str(module_name)  # json gives us unicode
+    try:
+      ast = loader.import_name(module_name)
+    except (load_pytd.BadDependencyError, parser.ParseError) as e:
+      log.info("Couldn't load %s: %s", module_name, e)
+      return False
+    if (ast is None or
+        _fingerprint_module(module_name, ast) != module_fingerprint):
+      log.info("Interface of %s changed", module_name)
+      return False
+  return True
+
+
+def is_up_to_date(filename, src, options, loader):
+  """Check whether the outputs of a module can be reused.
+
+  Args:
+    filename: The fingerprint file, from get_fingerprint_file.
+    src: The source code of the module.
+    options: config.Options object.
+    loader: A load_pytd.Loader, for loading the dependencies of the module.
+  Returns:
+    True if the module's source, the options, and the interfaces of all the
+    modules it loaded are the same as when the fingerprint was stored, and
+    the outputs still exist.
+  """
+  if _is_up_to_date(filename, src, options, loader):
+    _up_to_date.inc()
+    return True
+  else:
+    _out_of_date.inc()
+    return False
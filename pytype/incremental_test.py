@@ -0,0 +1,144 @@
+"""Tests for incremental.py."""
+
+import os
+
+
+from pytype import config
+from pytype import incremental
+from pytype import load_pytd
+from pytype import utils
+
+import unittest
+
+
+class IncrementalTest(unittest.TestCase):
+  """Tests for storing and comparing fingerprints."""
+
+  def _CreateOptions(self, d, **kwargs):
+    return config.Options.create(
+        incremental=True, check=False, output=d["a.pyi"], module_name="a",
+        pythonpath=[d.path], **kwargs)
+
+  def _StoreFingerprint(self, d, src, options):
+    loader = load_pytd.Loader("a", options)
+    loader.import_name("b")
+    d.create_file("a.pyi", "")
+    incremental.store_fingerprint(
+        incremental.get_fingerprint_file(options),
+        incremental.compute_fingerprint(src, options, loader))
+
+  def _IsUpToDate(self, src, options):
+    return incremental.is_up_to_date(
+        incremental.get_fingerprint_file(options), src, options,
+        load_pytd.Loader("a", options))
+
+  def testGetFingerprintFile(self):
+    options = config.Options.create(check=False, output="a.pyi")
+    self.assertIsNone(incremental.get_fingerprint_file(options))
+    options.tweak(incremental=True)
+    self.assertEqual("a.pyi.fingerprint",
+                     incremental.get_fingerprint_file(options))
+    options.tweak(output="-")
+    self.assertIsNone(incremental.get_fingerprint_file(options))
+    options.tweak(check=True, touch="a.ok")
+    self.assertEqual("a.ok.fingerprint",
+                     incremental.get_fingerprint_file(options))
+
+  def testUpToDate(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int")
+      options = self._CreateOptions(d)
+      self.assertFalse(self._IsUpToDate("import b", options))
+      self._StoreFingerprint(d, "import b", options)
+      self.assertTrue(self._IsUpToDate("import b", options))
+
+  def testSourceChanged(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int")
+      options = self._CreateOptions(d)
+      self._StoreFingerprint(d, "import b", options)
+      self.assertFalse(self._IsUpToDate("import b\n", options))
+
+  def testOptionsChanged(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int")
+      options = self._CreateOptions(d)
+      self._StoreFingerprint(d, "import b", options)
+      options.tweak(quick=True)
+      self.assertFalse(self._IsUpToDate("import b", options))
+
+  def testBudgetChanged(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int")
+      options = self._CreateOptions(d)
+      self._StoreFingerprint(d, "import b", options)
+      options.tweak(function_budget_opcodes=100)
+      self.assertFalse(self._IsUpToDate("import b", options))
+
+  def testUnrelatedModule(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int")
+      d.create_file("c.pyi", "def g() -> int")
+      options = self._CreateOptions(d)
+      # Modules imported by earlier users of the loader, e.g. by other modules
+      # of a --batch run, aren't dependencies.
+      loader = load_pytd.Loader("c_user", options)
+      loader.import_name("c")
+      loader.start_module("a")
+      loader.import_name("b")
+      d.create_file("a.pyi", "")
+      incremental.store_fingerprint(
+          incremental.get_fingerprint_file(options),
+          incremental.compute_fingerprint("import b", options, loader))
+      d.create_file("c.pyi", "def g() -> str")
+      self.assertTrue(self._IsUpToDate("import b", options))
+
+  def testInterfaceChanged(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int")
+      options = self._CreateOptions(d)
+      self._StoreFingerprint(d, "import b", options)
+      d.create_file("b.pyi", "def f() -> str")
+      self.assertFalse(self._IsUpToDate("import b", options))
+
+  def testInterfaceReordered(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int\ndef g() -> str")
+      options = self._CreateOptions(d)
+      self._StoreFingerprint(d, "import b", options)
+      d.create_file("b.pyi", "def g() -> str\ndef f() -> int")
+      self.assertTrue(self._IsUpToDate("import b", options))
+
+  def testDependencyRemoved(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int")
+      options = self._CreateOptions(d)
+      self._StoreFingerprint(d, "import b", options)
+      os.remove(d["b.pyi"])
+      self.assertFalse(self._IsUpToDate("import b", options))
+
+  def testOutputRemoved(self):
+    with utils.Tempdir() as d:
+      d.create_file("b.pyi", "def f() -> int")
+      options = self._CreateOptions(d)
+      self._StoreFingerprint(d, "import b", options)
+      os.remove(d["a.pyi"])
+      self.assertFalse(self._IsUpToDate("import b", options))
+
+  def testBadFingerprint(self):
+    with utils.Tempdir() as d:
+      options = self._CreateOptions(d)
+      d.create_file("a.pyi", "")
+      d.create_file("a.pyi.fingerprint", "{")
+      self.assertFalse(self._IsUpToDate("", options))
+
+  def testRemoveFingerprint(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.pyi.fingerprint", "{}")
+      incremental.remove_fingerprint(d["a.pyi.fingerprint"])
+      self.assertFalse(os.path.exists(d["a.pyi.fingerprint"]))
+      incremental.remove_fingerprint(d["a.pyi.fingerprint"])
+
+
+if __name__ == "__main__":
+  unittest.main()
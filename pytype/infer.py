@@ -1,6 +1,7 @@
 """Code for generating and storing inferred types."""
 
 import collections
+import gc
 import logging
 import os
 import StringIO
@@ -10,6 +11,7 @@ import sys
 
 from pytype import abstract
 from pytype import convert_structural
+from pytype import errors
 from pytype import exceptions
 from pytype import function
 from pytype import metrics
@@ -39,6 +41,10 @@ INIT_MAXIMUM_DEPTH = 4
 _INITIALIZING = object()
 
 
+_typegraph_gc_counter = metrics.Counter("typegraph_gc_runs")
+_typegraph_gc_freed = metrics.Distribution("typegraph_gc_freed_objects")
+
+
 class CallTracer(vm.VirtualMachine):
   """Virtual machine that records all function calls.
 
@@ -56,7 +62,7 @@ class CallTracer(vm.VirtualMachine):
     self._calls = set()
     self._method_calls = set()
     # Used by init_class.
-    self._instance_cache = {}
+    self._instance_cache = self.caches.get("instances")
     # Used by call_init. Can differ from _instance_cache because we also call
     # __init__ on classes not initialized via init_class.
     self._initialized_instances = set()
@@ -64,6 +70,9 @@ class CallTracer(vm.VirtualMachine):
     self._analyzed_functions = set()
     self._generated_classes = {}
     self.exitpoint = None
+    # The memory use after the last garbage collection. See
+    # --typegraph-gc-interval.
+    self._memory_after_gc = 0
 
   def create_argument(self, node, signature, name):
     t = signature.annotations.get(name)
@@ -165,9 +174,37 @@ class CallTracer(vm.VirtualMachine):
         log.info("%r is abstract, not analyzing further.", fname)
       else:
         node, args = self.create_method_arguments(node, method)
-        node, _ = self.call_function_with_args(node, val, args)
+        budget = vm.AnalysisBudget(
+            "function",
+            seconds=self.options.function_budget_seconds,
+            opcodes=self.options.function_budget_opcodes,
+            nodes=self.options.function_budget_nodes)
+        # If the budget is exceeded, the function isn't analyzed at all, so
+        # its signature will fall back to returning Any.
+        error, (node, _) = self.run_with_budget(
+            budget, (node, None), self.call_function_with_args, node, val, args)
+        if error:
+          stack = [frame_state.SimpleFrame(method.get_first_opcode())]
+          self.errorlog.analysis_budget_exceeded(
+              stack, "function %s" % fname, error.reason)
+        self._maybe_collect_garbage()
     return node
 
+  def _maybe_collect_garbage(self):
+    """Free unreachable bindings if the memory use grew enough."""
+    interval = self.options.typegraph_gc_interval
+    if not interval or not self.program.weak_node_bindings:
+      return
+    memory = utils.get_memory_usage()
+    if memory is None or memory - self._memory_after_gc < interval << 20:
+      return
+    freed = gc.collect()
+    _typegraph_gc_counter.inc()
+    _typegraph_gc_freed.add(freed)
+    self._memory_after_gc = utils.get_memory_usage()
+    log.info("Collected %d objects, memory use: %d -> %d bytes", freed,
+             memory, self._memory_after_gc)
+
   def _call_with_fake_args(self, node, funcv):
     """Attempt to call the given function with made-up arguments."""
     # TODO(tsudol): If expand this beyond __init__, need to handle
@@ -287,7 +324,14 @@ class CallTracer(vm.VirtualMachine):
         self._mark_maybe_missing_members(instance.data)
       else:
         self._instance_cache[key] = _INITIALIZING
-        node = self.call_init(node, instance)
+        try:
+          node = self.call_init(node, instance)
+        except:
+          # E.g. a budget was exceeded. Later calls with the same key need to
+          # initialize the class again, rather than treating it as recursive.
+          del self._instance_cache[key]
+          self._initialized_instances.difference_update(instance.data)
+          raise
       self._instance_cache[key] = node, clsvar, instance
     return self._instance_cache[key]
 
@@ -373,7 +417,17 @@ class CallTracer(vm.VirtualMachine):
   def analyze(self, node, defs, maximum_depth):
     assert not self.frame
     self.maximum_depth = sys.maxint if maximum_depth is None else maximum_depth
-    self.analyze_toplevel(node, defs)
+    budget = vm.AnalysisBudget(
+        "module",
+        seconds=self.options.module_budget_seconds,
+        opcodes=self.options.module_budget_opcodes,
+        nodes=self.options.module_budget_nodes)
+    error, _ = self.run_with_budget(
+        budget, None, self.analyze_toplevel, node, defs)
+    if error:
+      # The functions that haven't been analyzed yet are left as they are.
+      self.errorlog.analysis_budget_exceeded(
+          error.stack, "module", error.reason)
     return node
 
   def trace_module_member(self, module, name, member):
@@ -728,18 +782,79 @@ def get_module_name(filename, options):
     return _filename_to_module_name(filename)
 
 
+def _create_tracer(errorlog, options, loader, module_name, check, deep,
+                   cache_unknowns, analyze_annotated):
+  if check:
+    return CallTracer(errorlog=errorlog, options=options,
+                      module_name=module_name,
+                      cache_unknowns=cache_unknowns,
+                      analyze_annotated=True,
+                      generate_unknowns=False,
+                      loader=loader)
+  else:
+    return CallTracer(errorlog=errorlog, options=options,
+                      module_name=module_name,
+                      cache_unknowns=cache_unknowns,
+                      analyze_annotated=analyze_annotated,
+                      generate_unknowns=not options.quick,
+                      store_all_calls=not deep, loader=loader)
+
+
+def create_preloaded_tracer(options, loader, check,
+                            run_builtins=True,
+                            deep=True,
+                            cache_unknowns=False,
+                            analyze_annotated=False,
+                            init_maximum_depth=INIT_MAXIMUM_DEPTH):
+  """Create a CallTracer that has already run the builtins.
+
+  Running the builtins is the same for every module, so when analyzing many
+  modules, it only needs to be done once. A tracer can analyze only a single
+  module, though, since it accumulates the module's definitions. So the
+  returned tracer is meant to be kept unchanged in a parent process, with the
+  analysis of each module happening in a forked child (see
+  batch.run_in_forked_process).
+
+  Args:
+    options: config.Options object.
+    loader: A load_pytd.Loader instance.
+    check: True to create a tracer for check_types, False for infer_types.
+    run_builtins: See infer_types.
+    deep: See infer_types.
+    cache_unknowns: See infer_types.
+    analyze_annotated: See infer_types. Ignored if check is True.
+    init_maximum_depth: See infer_types.
+  Returns:
+    A CallTracer, to be passed as the tracer argument of check_types or
+    infer_types, together with the same arguments as above.
+  """
+  tracer = _create_tracer(errors.ErrorLog(), options, loader, None, check,
+                          deep, cache_unknowns, analyze_annotated)
+  tracer.load_builtins(init_maximum_depth, run_builtins)
+  return tracer
+
+
+def _use_tracer(tracer, errorlog, options):
+  # The errors while running the builtins aren't associated with any module,
+  # so we drop them, together with the errorlog the tracer was created with.
+  tracer.errorlog = errorlog
+  tracer.options = options
+  return tracer
+
+
 def check_types(py_src, py_filename, errorlog, options, loader,
                 run_builtins=True,
                 deep=True,
                 cache_unknowns=False,
-                init_maximum_depth=INIT_MAXIMUM_DEPTH):
+                init_maximum_depth=INIT_MAXIMUM_DEPTH,
+                tracer=None):
   """Verify a PyTD against the Python code."""
-  tracer = CallTracer(errorlog=errorlog, options=options,
-                      module_name=get_module_name(py_filename, options),
-                      cache_unknowns=cache_unknowns,
-                      analyze_annotated=True,
-                      generate_unknowns=False,
-                      loader=loader)
+  if tracer is None:
+    tracer = _create_tracer(errorlog, options, loader,
+                            get_module_name(py_filename, options), True, deep,
+                            cache_unknowns, True)
+  else:
+    tracer = _use_tracer(tracer, errorlog, options)
   loc, defs = tracer.run_program(
       py_src, py_filename, init_maximum_depth, run_builtins)
   snapshotter = metrics.get_metric("memory", metrics.Snapshot)
@@ -748,6 +863,8 @@ def check_types(py_src, py_filename, errorlog, options, loader,
     tracer.analyze(loc, defs, maximum_depth=(2 if options.quick else None))
   snapshotter.take_snapshot("infer:check_types:post")
   _maybe_output_debug(options, tracer.program)
+  _maybe_output_cost_report(options, tracer)
+  tracer.caches.reset()
 
 
 def infer_types(src, errorlog, options, loader,
@@ -755,7 +872,8 @@ def infer_types(src, errorlog, options, loader,
                 deep=True,
                 cache_unknowns=False, show_library_calls=False,
                 analyze_annotated=False,
-                init_maximum_depth=INIT_MAXIMUM_DEPTH, maximum_depth=None):
+                init_maximum_depth=INIT_MAXIMUM_DEPTH, maximum_depth=None,
+                tracer=None):
   """Given Python source return its types.
 
   Args:
@@ -773,17 +891,19 @@ def infer_types(src, errorlog, options, loader,
     analyze_annotated: If True, analyze methods with type annotations, too.
     init_maximum_depth: Depth of analysis during module loading.
     maximum_depth: Depth of the analysis. Default: unlimited.
+    tracer: Optionally, a CallTracer from create_preloaded_tracer, created
+      with the same arguments. It's used instead of creating a new tracer.
   Returns:
     A TypeDeclUnit
   Raises:
     AssertionError: In case of a bad parameter combination.
   """
-  tracer = CallTracer(errorlog=errorlog, options=options,
-                      module_name=get_module_name(filename, options),
-                      cache_unknowns=cache_unknowns,
-                      analyze_annotated=analyze_annotated,
-                      generate_unknowns=not options.quick,
-                      store_all_calls=not deep, loader=loader)
+  if tracer is None:
+    tracer = _create_tracer(errorlog, options, loader,
+                            get_module_name(filename, options), False, deep,
+                            cache_unknowns, analyze_annotated)
+  else:
+    tracer = _use_tracer(tracer, errorlog, options)
   loc, defs = tracer.run_program(
       src, filename, init_maximum_depth, run_builtins)
   log.info("===Done running definitions and module-level code===")
@@ -822,6 +942,8 @@ def infer_types(src, errorlog, options, loader,
     proc.stdin.close()
 
   _maybe_output_debug(options, tracer.program)
+  _maybe_output_cost_report(options, tracer)
+  tracer.caches.reset()
   return ast, builtins_pytd
 
 
@@ -833,3 +955,8 @@ def _maybe_output_debug(options, program):
     else:
       with open(options.output_debug, "w") as fi:
         fi.write(text)
+
+
+def _maybe_output_cost_report(options, tracer):
+  if options.cost_report and tracer.cost_report:
+    tracer.cost_report.write(options.cost_report)
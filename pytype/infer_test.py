@@ -1,8 +1,13 @@
 """Tests for infer.py."""
 
+import textwrap
+
 
 from pytype import config
+from pytype import errors
 from pytype import infer
+from pytype import load_pytd
+from pytype.pytd import pytd
 
 import unittest
 
@@ -34,6 +39,69 @@ class InferTest(unittest.TestCase):
       module = infer.get_module_name(filename, options)
       self.assertEquals(module, expected)
 
+  def _Infer(self, src, tracer=None):
+    errorlog = errors.ErrorLog()
+    ast, _ = infer.infer_types(src, errorlog, self.options, self.loader,
+                               tracer=tracer)
+    return pytd.Print(ast), errorlog
+
+  def testPreloadedTracer(self):
+    self.options = config.Options.create()
+    self.loader = load_pytd.Loader(None, self.options)
+    src = textwrap.dedent("""
+      def f(x):
+        return len(x) + 1
+      y = f([1, 2]) + ""
+    """)
+    tracer = infer.create_preloaded_tracer(self.options, self.loader,
+                                           check=False)
+    result, errorlog = self._Infer(src, tracer)
+    expected, expected_errorlog = self._Infer(src)
+    self.assertMultiLineEqual(expected, result)
+    self.assertEqual([e.name for e in expected_errorlog],
+                     [e.name for e in errorlog])
+    self.assertTrue(errorlog.has_error())
+
+  def testCachesAreReset(self):
+    self.options = config.Options.create()
+    self.loader = load_pytd.Loader(None, self.options)
+    tracer = infer.create_preloaded_tracer(self.options, self.loader,
+                                           check=False)
+    other_tracer = infer.create_preloaded_tracer(self.options, self.loader,
+                                                 check=False)
+    # Running the builtins defines functions, which each tracer caches
+    # separately.
+    functions = tracer.caches.get("interpreter_functions")
+    self.assertTrue(functions)
+    self.assertFalse(set(functions.values()) & set(
+        other_tracer.caches.get("interpreter_functions").values()))
+    self._Infer(textwrap.dedent("""
+      def f(x):
+        return [x]
+      y = f(42)
+    """), tracer)
+    self.assertFalse(any(tracer.caches.sizes().values()))
+
+  def testTypegraphGc(self):
+    src = textwrap.dedent("""
+      class Foo(object):
+        def __init__(self, x):
+          self.x = x
+        def get(self):
+          return {"x": [self.x]}
+      def f(x):
+        return Foo(x).get()
+      def g():
+        return f(3)
+    """)
+    self.options = config.Options.create()
+    self.loader = load_pytd.Loader(None, self.options)
+    expected, _ = self._Infer(src)
+    self.options = config.Options.create(typegraph_gc_interval=1)
+    self.loader = load_pytd.Loader(None, self.options)
+    result, _ = self._Infer(src)
+    self.assertMultiLineEqual(expected, result)
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -1,18 +1,29 @@
 """Load and link .pyi files."""
 
+import collections
 import logging
 import os
 
 
+from pytype import metrics
+from pytype import stdlib_cache
+from pytype.pyi import parser
+from pytype.pytd import pytd
 from pytype.pytd import serialize_ast
 from pytype.pytd import typeshed
 from pytype.pytd import utils as pytd_utils
 from pytype.pytd.parse import builtins
+from pytype.pytd.parse import node
 from pytype.pytd.parse import visitors
 
 log = logging.getLogger(__name__)
 
 
+_modules_loaded = metrics.Counter("loader_modules_loaded")
+_lazy_modules_used = metrics.Counter("loader_lazy_modules_used")
+_lazy_members_resolved = metrics.Counter("loader_lazy_members_resolved")
+
+
 class Module(object):
   """Represents a parsed module.
 
@@ -42,6 +53,136 @@ class BadDependencyError(Exception):
     return self.message
 
 
+class LazyAst(serialize_ast.LazyUnit):
+  """A module whose members are resolved when they're first looked up.
+
+  Created by a Loader with options.lazy_imports. The module itself is parsed
+  when it's imported, but the modules it depends on are only loaded (and its
+  references to them resolved) once a member that uses them is looked up.
+  Everything else that needs all of the members (e.g. accessing the "classes"
+  field, or visiting the unit) resolves all of them first, and then operates on
+  a regular TypeDeclUnit.
+  """
+
+  def __new__(cls, ast, loader):
+    fields = {}  # name -> field
+    unresolved = collections.OrderedDict()  # name -> member, as it was parsed
+    for field in ("constants", "classes", "functions", "aliases"):
+      for member in getattr(ast, field):
+        fields[member.name] = field
+        unresolved[member.name] = member
+    self = cls._CreateLazy(ast.name, ast.type_params, unresolved)
+    self._loader = loader
+    self._fields = fields
+    self._unresolved = unresolved
+    self._resolved = {}  # name -> member
+    self._resolving = set()
+    self._extra_type_params = set()
+    return self
+
+  def IsUsed(self):
+    """Whether any of the members of this module have been resolved."""
+    return bool(self._resolved)
+
+  def GetUnresolved(self, name):
+    return self._unresolved[name]
+
+  def IsDeferrable(self, name):
+    """Whether looking up the member can wait until the current one is done.
+
+    Classes are only referenced through ClassType pointers, which the Loader
+    fills in again once everything has been resolved. Other members (e.g.
+    aliases) are copied into the member that references them, so they need to
+    be resolved right away, unless they're part of a cycle.
+
+    Args:
+      name: The full name of the member.
+
+    Returns:
+      True if the parsed member can be returned for now.
+    """
+    return (isinstance(self._unresolved[name], pytd.Class) or
+            name in self._resolving)
+
+  def IsResolved(self, name):
+    return name in self._resolved
+
+  def Resolve(self, name):
+    """Resolve the references of a member, loading the modules it uses.
+
+    The ClassType pointers of the result might still point to parsed,
+    unresolved classes that were looked up in the meantime. See
+    Loader.resolve_lazy_member.
+
+    Args:
+      name: The full name of the member.
+
+    Returns:
+      The resolved member.
+    """
+    # pylint: disable=protected-access
+    member = self._unresolved[name]
+    self._resolving.add(name)
+    try:
+      dependencies = self._loader._collect_ast_dependencies(member)
+      self._loader._load_ast_dependencies(dependencies, member, self.name)
+      try:
+        member = member.Visit(visitors.LookupExternalTypes(
+            self._loader._get_module_map(), full_names=True,
+            self_name=self.name))
+      except KeyError as e:
+        raise BadDependencyError(e.message, self.name)
+      adjuster = visitors.AdjustTypeParameters()
+      member = member.Visit(adjuster)
+      self._extra_type_params.update(adjuster.all_typeparams)
+      member.Visit(visitors.FillInModuleClasses({"": self, self.name: self}))
+    finally:
+      self._resolving.discard(name)
+    self._resolved[name] = member
+    return member
+
+  def Unresolve(self, name):
+    """Forget a resolved member, e.g. because a member it uses is broken."""
+    del self._resolved[name]
+
+  def Lookup(self, name):
+    if name in self._resolved:
+      return self._resolved[name]
+    if name in self._type_params:
+      return self._type_params[name]
+    if name not in self._unresolved:
+      raise KeyError(name)
+    return self._loader.resolve_lazy_member(self, name)
+
+  def GetResolvedAst(self):
+    """Return a TypeDeclUnit with only the members resolved so far."""
+    if self._full is not None:
+      return self._full
+    return self._CreateUnit(
+        [name for name in self._order if name in self._resolved])
+
+  def _CreateUnit(self, names):
+    fields = {"constants": [], "classes": [], "functions": [], "aliases": []}
+    for name in names:
+      fields[self._fields[name]].append(self._resolved[name])
+    declared_type_params = {t.name for t in self.type_params}
+    type_params = self.type_params + tuple(
+        {t.Replace(scope=None) for t in self._extra_type_params
+         if t.name not in declared_type_params})
+    return pytd.TypeDeclUnit(
+        self.name, tuple(fields["constants"]), type_params,
+        tuple(fields["classes"]), tuple(fields["functions"]),
+        tuple(fields["aliases"]))
+
+  def Materialize(self):
+    """Resolve all members, and create a regular TypeDeclUnit from them."""
+    if self._full is None:
+      for name in self._order:
+        self.Lookup(name)
+      self._full = self._CreateUnit(self._order)
+    return self._full
+
+
 class Loader(object):
   """A cache for loaded PyTD files.
 
@@ -54,6 +195,16 @@ class Loader(object):
     _modules: A map, filename to Module, for caching modules already loaded.
     _concatenated: A concatenated pytd of all the modules. Refreshed when
                    necessary.
+    _lazy_queue: With options.lazy_imports, the members of LazyAst modules
+      that still need to be resolved while we're resolving one. None if we're
+      not resolving anything.
+    _lazy_resolved: The (LazyAst, name) pairs resolved since _lazy_queue was
+      created.
+    _imports: The names of the modules imported by the module we're analyzing,
+      since the last start_module.
+    _dependencies: A map, module name to the names of the modules it refers to.
+    _stdlib_cache: A stdlib_cache.StdlibCache, for options.stdlib_cache.
+    _interner: A node.Interner shared by all modules, for options.intern_pytd.
   """
 
   PREFIX = "pytd:"  # for pytd files that ship with pytype
@@ -71,6 +222,16 @@ class Loader(object):
         Module("typing", self.PREFIX + "typing", self.typing)
     }
     self._concatenated = None
+    self._lazy_queue = None
+    self._lazy_resolved = []
+    self._imports = set()
+    self._dependencies = {}
+    if self.options.stdlib_cache and self.options.typeshed:
+      self._stdlib_cache = stdlib_cache.StdlibCache(
+          self.options.stdlib_cache, self.options.python_version)
+    else:
+      self._stdlib_cache = None
+    self._interner = node.Interner() if self.options.intern_pytd else None
     # Paranoid verification that pytype.main properly checked the flags:
     if self.options.imports_map is not None:
       assert self.options.pythonpath == [""]
@@ -97,10 +258,10 @@ class Loader(object):
 
   def load_file(self, module_name, filename, ast=None):
     """Load (or retrieve from cache) a module and resolve its dependencies."""
-    self._concatenated = None  # invalidate
     existing = self._get_existing_ast(module_name, filename)
     if existing:
       return existing
+    self._concatenated = None  # invalidate
     if not ast:
       ast = builtins.ParsePyTD(filename=filename,
                                module=module_name,
@@ -118,7 +279,15 @@ class Loader(object):
     Returns:
       The ast (pytd.TypeDeclUnit) as represented in this loader.
     """
+    _modules_loaded.inc()
     ast = self._postprocess_pyi(ast)
+    if self.options.lazy_imports:
+      # The dependencies are loaded once the members that use them are looked
+      # up, and LazyAst fills in its own ClassType pointers.
+      module = Module(module_name, filename, LazyAst(ast, self))
+      module.dirty = False
+      self._modules[module_name] = module
+      return module.ast
     module = Module(module_name, filename, ast)
     self._modules[module_name] = module
     try:
@@ -130,6 +299,10 @@ class Loader(object):
       # Now that any imported TypeVar instances have been resolved, adjust type
       # parameters in classes and functions.
       module.ast = module.ast.Visit(visitors.AdjustTypeParameters())
+      if self._interner is not None:
+        # Interning rebuilds the classes of the module, so it has to happen
+        # before the ClassType pointers to them are filled in below.
+        module.ast = self._interner.Intern(module.ast)
       # Now we can fill in internal cls pointers to ClassType nodes in the
       # module. This code executes when the module is first loaded, which
       # happens before any others use it to resolve dependencies, so there are
@@ -152,6 +325,8 @@ class Loader(object):
   def _load_ast_dependencies(self, dependencies, ast, ast_name=None):
     """Fill in all ClassType.cls pointers."""
     if dependencies:
+      self._dependencies.setdefault(ast_name or ast.name, set()).update(
+          dependencies)
       for name in dependencies:
         if name not in self._modules:
           other_ast = self._import_name(name)
@@ -174,10 +349,10 @@ class Loader(object):
 
   def _verify_ast(self, ast):
     try:
-      ast.Visit(visitors.VerifyLookup())
+      visitors.VisitorPipeline([visitors.VerifyLookup(),
+                                visitors.VerifyContainers()]).Run(ast)
     except ValueError as e:
       raise BadDependencyError(e.message)
-    ast.Visit(visitors.VerifyContainers())
 
   def resolve_ast(self, ast):
     """Resolve the dependencies of an AST, without adding it to our modules."""
@@ -197,15 +372,81 @@ class Loader(object):
         self._finish_ast(module.ast)
         module.dirty = False
 
+  def resolve_lazy_member(self, lazy_ast, name):
+    """Resolve a member of a LazyAst, and everything it refers to.
+
+    Classes that are looked up while a member is being resolved are queued,
+    and only resolved once that member is done. This keeps the recursion
+    shallow, and deals with cycles. Afterwards, the ClassType pointers of all
+    the members resolved in the meantime are filled in again, so that they
+    point to the resolved classes, and the members are verified.
+
+    Args:
+      lazy_ast: A LazyAst.
+      name: The full name of the member.
+
+    Returns:
+      The member. If we're in the middle of resolving another member, this
+      might be the member as it was parsed, see LazyAst.IsDeferrable.
+
+    Raises:
+      BadDependencyError: If the member, or a member it refers to, can't be
+        resolved.
+    """
+    if self._lazy_queue is not None:
+      if lazy_ast.IsDeferrable(name):
+        self._lazy_queue.append((lazy_ast, name))
+        return lazy_ast.GetUnresolved(name)
+      return self._resolve_lazy_member_now(lazy_ast, name)
+    self._lazy_queue = [(lazy_ast, name)]
+    self._lazy_resolved = []
+    try:
+      while self._lazy_queue:
+        queued_ast, queued_name = self._lazy_queue.pop()
+        if not queued_ast.IsResolved(queued_name):
+          self._resolve_lazy_member_now(queued_ast, queued_name)
+      self._lazy_queue = None
+      module_map = self._get_module_map()
+      for resolved_ast, resolved_name in self._lazy_resolved:
+        module_map[""] = resolved_ast
+        member = resolved_ast.Lookup(resolved_name)
+        member.Visit(visitors.FillInModuleClasses(module_map))
+        try:
+          self._verify_ast(member)
+        except visitors.ContainerError as e:
+          raise BadDependencyError(e.message, resolved_ast.name)
+    except:
+      for resolved_ast, resolved_name in self._lazy_resolved:
+        resolved_ast.Unresolve(resolved_name)
+      raise
+    finally:
+      self._lazy_queue = None
+      self._lazy_resolved = []
+    self._concatenated = None  # invalidate
+    return lazy_ast.Lookup(name)
+
+  def _resolve_lazy_member_now(self, lazy_ast, name):
+    """Resolve a member of a LazyAst, without waiting for the queue."""
+    if not lazy_ast.IsUsed():
+      _lazy_modules_used.inc()
+    try:
+      member = lazy_ast.Resolve(name)
+    except (parser.ParseError, visitors.ContainerError,
+            visitors.SymbolLookupError) as e:
+      # Errors in the modules we depend on only show up now, so report them
+      # the same way as a missing dependency.
+      raise BadDependencyError(str(e), lazy_ast.name)
+    self._lazy_resolved.append((lazy_ast, name))
+    _lazy_members_resolved.inc()
+    return member
+
   def import_relative_name(self, name):
     """IMPORT_NAME with level=-1. A name relative to the current directory."""
     if self.base_module is None:
       raise ValueError("Attempting relative import in non-package.")
     path = self.base_module.split(".")[:-1]
     path.append(name)
-    ast = self._import_name(".".join(path))
-    self._lookup_all_classes()
-    return ast
+    return self._import_and_record(".".join(path))
 
   def import_relative(self, level):
     """Import a module relative to our base module.
@@ -230,17 +471,36 @@ class Loader(object):
       raise ValueError("Attempting relative import in non-package.")
     components = self.base_module.split(".")
     sub_module = ".".join(components[0:-level])
-    ast = self._import_name(sub_module)
-    self._lookup_all_classes()
-    return ast
+    return self._import_and_record(sub_module)
 
   def import_name(self, module_name):
+    return self._import_and_record(module_name)
+
+  def _import_and_record(self, module_name):
     ast = self._import_name(module_name)
+    self._imports.add(module_name)
     self._lookup_all_classes()
     return ast
 
+  def start_module(self, module_name):
+    """Reuse this loader for analyzing another module, e.g. with --batch.
+
+    Args:
+      module_name: The full name of the module, for the new base_module.
+    """
+    self.base_module = module_name
+    self._imports = set()
+
   def _load_builtin(self, subdir, module_name, typeshed_only=False):
     """Load a pytd/pyi that ships with pytype or typeshed."""
+    if self._stdlib_cache:
+      filename = self._stdlib_cache.get_filename(subdir, module_name)
+      if filename:
+        existing = self._get_existing_ast(module_name, filename)
+        if existing:
+          return existing
+        self._concatenated = None  # invalidate
+        return self._load_lazy_file(module_name, filename)
     version = self.options.python_version
     # Try our own type definitions first.
     if typeshed_only:
@@ -257,6 +517,30 @@ class Loader(object):
                             ast=mod)
     return None
 
+  def _load_lazy_file(self, module_name, filename):
+    """Load a module written by serialize_ast.StoreAst.
+
+    The members of the module are only unpickled when they're looked up.
+
+    Args:
+      module_name: The fully qualified name of the module being imported.
+      filename: The file to load.
+
+    Returns:
+      A serialize_ast.LazyTypeDeclUnit.
+    """
+    ast = serialize_ast.LazyTypeDeclUnit(filename, module_name)
+    dependencies = [d for d in ast.dependencies if d != ast.stored_name]
+    self._modules[module_name] = Module(module_name, filename, ast)
+    self._load_ast_dependencies(dependencies, ast, module_name)
+    try:
+      serialize_ast.ProcessLazyAst(ast, self._get_module_map())
+    except serialize_ast.UnrestorableDependencyError as e:
+      del self._modules[module_name]
+      raise BadDependencyError(e.message, module_name)
+    self._modules[module_name].dirty = False
+    return ast
+
   def _import_name(self, module_name):
     """Load a name like 'sys' or 'foo.bar.baz'.
 
@@ -363,12 +647,70 @@ class Loader(object):
       return None
 
   def concat_all(self):
+    """Concatenate all the modules loaded so far.
+
+    For modules loaded with options.lazy_imports, this only contains the
+    members that have been looked up.
+
+    Returns:
+      A pytd.TypeDeclUnit.
+    """
     if not self._concatenated:
       self._concatenated = pytd_utils.Concat(
-          *(module.ast for module in self._modules.values()),
+          *(module.ast.GetResolvedAst() if isinstance(module.ast, LazyAst)
+            else module.ast for module in self._modules.values()),
           name="<all>")
     return self._concatenated
 
+  def get_loaded_modules(self):
+    """Return all the modules loaded so far, as a list of Module."""
+    return self._modules.values()
+
+  def forget_module(self, module_name):
+    """Drop a module, and every loaded module that refers to it.
+
+    E.g. with --batch, a module's pyi file might have been loaded (from a
+    previous run, or because of an import cycle) before it was written. The
+    dropped modules are loaded again the next time they're imported.
+
+    Args:
+      module_name: The fully qualified name of the module.
+    """
+    stale = {module_name}
+    changed = True
+    while changed:
+      changed = False
+      for name, dependencies in self._dependencies.items():
+        if name not in stale and not stale.isdisjoint(dependencies):
+          stale.add(name)
+          changed = True
+    for name in stale:
+      if self._modules.pop(name, None):
+        log.debug("Forgetting module %s", name)
+      self._dependencies.pop(name, None)
+    self._concatenated = None
+
+  def get_dependencies(self):
+    """Return the modules the analyzed module depends on, as a list of Module.
+
+    These are the builtins, the modules imported since the last start_module,
+    and all the modules these refer to, transitively. Other modules the loader
+    holds, e.g. those imported by earlier modules of a --batch run, aren't
+    included.
+
+    Returns:
+      A list of Module.
+    """
+    seen = set()
+    queue = ["__builtin__", "typing"] + sorted(self._imports)
+    while queue:
+      name = queue.pop()
+      if name in seen or name not in self._modules:
+        continue
+      seen.add(name)
+      queue.extend(self._dependencies.get(name, ()))
+    return [self._modules[name] for name in sorted(seen)]
+
   def _get_module_map(self):
     return {name: module.ast for name, module in self._modules.items()}
 
@@ -394,6 +736,9 @@ class PickledPyiLoader(Loader):
     existing = self._get_existing_ast(module_name, filename)
     if existing:
       return existing
+    self._concatenated = None  # invalidate
+    if serialize_ast.IsIndexedAst(filename):
+      return self._load_lazy_file(module_name, filename)
     loaded_ast = pytd_utils.LoadPickle(filename)
 
     # At this point ast.name and module_name could be different.
@@ -113,6 +113,69 @@ class ImportPathsTest(unittest.TestCase):
       self.assertEquals("bar.Bar", f1.return_type.cls.name)
       self.assertEquals("foo.Foo", f2.return_type.cls.name)
 
+  def testGetDependencies(self):
+    with utils.Tempdir() as d:
+      d.create_file("module1.pyi", "def get_bar() -> module2.Bar")
+      d.create_file("module2.pyi", "class Bar:\n  pass")
+      d.create_file("module3.pyi", "def f() -> int")
+      self.options.tweak(pythonpath=[d.path])
+      loader = load_pytd.Loader("base", self.options)
+      loader.import_name("module3")
+      loader.start_module("other")
+      loader.import_name("module1")
+      self.assertEquals(["__builtin__", "module1", "module2", "typing"],
+                        [m.module_name for m in loader.get_dependencies()])
+      self.assertEquals("other", loader.base_module)
+
+  def testForgetModule(self):
+    with utils.Tempdir() as d:
+      d.create_file("module1.pyi", "def get_bar() -> module2.Bar")
+      d.create_file("module2.pyi", "class Bar:\n  pass")
+      d.create_file("module3.pyi", "def f() -> int")
+      self.options.tweak(pythonpath=[d.path])
+      loader = load_pytd.Loader("base", self.options)
+      module1 = loader.import_name("module1")
+      module3 = loader.import_name("module3")
+      d.create_file("module2.pyi", "class Bar:\n  pass\nclass Bar2:\n  pass")
+      loader.forget_module("module2")
+      # module1 refers to module2, so it's dropped, too.
+      self.assertIsNot(module1, loader.import_name("module1"))
+      self.assertIs(module3, loader.import_name("module3"))
+      self.assertTrue(loader.import_name("module2").Lookup("module2.Bar2"))
+
+  def testInternPytd(self):
+    with utils.Tempdir() as d:
+      d.create_file("foo.pyi", """
+        from typing import List
+        def get_bar() -> List[bar.Bar]
+        def f(x: str) -> str
+        class Foo:
+          pass
+      """)
+      d.create_file("bar.pyi", """
+        from typing import List
+        def get_foo() -> foo.Foo
+        def g(x: str) -> List[Bar]
+        class Bar:
+          pass
+      """)
+      self.options.tweak(pythonpath=[d.path], intern_pytd=True)
+      loader = load_pytd.Loader("base", self.options)
+      foo = loader.import_name("foo")
+      bar = loader.import_name("bar")
+      get_bar, = foo.Lookup("foo.get_bar").signatures
+      f, = foo.Lookup("foo.f").signatures
+      get_foo, = bar.Lookup("bar.get_foo").signatures
+      g, = bar.Lookup("bar.g").signatures
+      self.assertIs(f.params[0].type, g.params[0].type)
+      self.assertIs(f.params, g.params)
+      self.assertIs(get_bar.return_type, g.return_type)
+      self.assertIs(bar.Lookup("bar.Bar"),
+                    get_bar.return_type.parameters[0].cls)
+      self.assertIs(foo.Lookup("foo.Foo"), get_foo.return_type.cls)
+      foo.Visit(visitors.VerifyLookup())
+      bar.Visit(visitors.VerifyLookup())
+
   def testRelative(self):
     with utils.Tempdir() as d:
       d.create_file("__init__.pyi", "base = ...  # type: ?")
@@ -185,6 +248,123 @@ class ImportPathsTest(unittest.TestCase):
       self.assertEquals("empty2", empty2.name)
 
 
+class LazyImportsTest(unittest.TestCase):
+  """Tests for Loader with --lazy-imports."""
+
+  PYTHON_VERSION = (2, 7)
+
+  def setUp(self):
+    self.options = config.Options.create(python_version=self.PYTHON_VERSION,
+                                         lazy_imports=True)
+
+  def _LoadedModules(self, loader):
+    return {m.module_name for m in loader.get_loaded_modules()}
+
+  def testDependencyNotLoaded(self):
+    with utils.Tempdir() as d:
+      d.create_file("module1.pyi", """
+        def get_bar() -> module2.Bar
+        def get_int() -> int
+      """)
+      d.create_file("module2.pyi", "class Bar:\n  pass")
+      self.options.tweak(pythonpath=[d.path])
+      loader = load_pytd.Loader("base", self.options)
+      module1 = loader.import_name("module1")
+      self.assertIsInstance(module1, load_pytd.LazyAst)
+      module1.Lookup("module1.get_int")
+      self.assertNotIn("module2", self._LoadedModules(loader))
+      f, = module1.Lookup("module1.get_bar").signatures
+      self.assertIn("module2", self._LoadedModules(loader))
+      self.assertEquals("module2.Bar", f.return_type.cls.name)
+      f.return_type.cls.Visit(visitors.VerifyLookup())
+
+  def testCircularDependency(self):
+    with utils.Tempdir() as d:
+      d.create_file("foo.pyi", """
+        def get_bar() -> bar.Bar
+        class Foo:
+          def get_bar(self) -> bar.Bar
+      """)
+      d.create_file("bar.pyi", """
+        def get_foo() -> foo.Foo
+        class Bar:
+          def get_foo(self) -> foo.Foo
+      """)
+      self.options.tweak(pythonpath=[d.path])
+      loader = load_pytd.Loader("base", self.options)
+      foo = loader.import_name("foo")
+      bar = loader.import_name("bar")
+      f, = foo.Lookup("foo.get_bar").signatures
+      bar_cls = bar.Lookup("bar.Bar")
+      self.assertIs(bar_cls, f.return_type.cls)
+      m, = bar_cls.Lookup("get_foo").signatures
+      self.assertIs(foo.Lookup("foo.Foo"), m.return_type.cls)
+
+  def testResolveAlias(self):
+    with utils.Tempdir() as d:
+      d.create_file("module1.pyi", """
+          from typing import List
+          x = List[int]
+      """)
+      d.create_file("module2.pyi", """
+          def f() -> module1.x
+      """)
+      self.options.tweak(pythonpath=[d.path])
+      loader = load_pytd.Loader("base", self.options)
+      module2 = loader.import_name("module2")
+      f, = module2.Lookup("module2.f").signatures
+      self.assertEquals("List[int]", pytd.Print(f.return_type))
+
+  def testMissingDependency(self):
+    with utils.Tempdir() as d:
+      d.create_file("foo.pyi", """
+        def f() -> int
+        def g() -> bar.Bar
+      """)
+      self.options.tweak(pythonpath=[d.path])
+      loader = load_pytd.Loader("base", self.options)
+      foo = loader.import_name("foo")
+      self.assertTrue(foo.Lookup("foo.f"))
+      self.assertRaises(load_pytd.BadDependencyError, foo.Lookup, "foo.g")
+
+  def testMaterialize(self):
+    with utils.Tempdir() as d:
+      d.create_file("foo.pyi", """
+        from typing import List, TypeVar
+        T = TypeVar("T")
+        def f(x: List[T]) -> T
+        class A(List[T]):
+          def get_bar(self) -> bar.Bar
+      """)
+      d.create_file("bar.pyi", "class Bar: ...")
+      self.options.tweak(pythonpath=[d.path])
+      lazy_loader = load_pytd.Loader("base", self.options)
+      lazy_ast = lazy_loader.import_name("foo")
+      self.options.tweak(lazy_imports=False)
+      loader = load_pytd.Loader("base", self.options)
+      ast = loader.import_name("foo")
+      self.assertMultiLineEqual(pytd.Print(ast), pytd.Print(lazy_ast))
+      self.assertEquals([c.name for c in ast.classes],
+                        [c.name for c in lazy_ast.classes])
+      lazy_ast.Visit(visitors.VerifyLookup())
+
+  def testConcatAll(self):
+    with utils.Tempdir() as d:
+      d.create_file("foo.pyi", """
+        def f() -> int
+        def g() -> str
+      """)
+      self.options.tweak(pythonpath=[d.path])
+      loader = load_pytd.Loader("base", self.options)
+      foo = loader.import_name("foo")
+      foo.Lookup("foo.f")
+      concatenated = loader.concat_all()
+      self.assertTrue(concatenated.Lookup("foo.f"))
+      self.assertRaises(KeyError, concatenated.Lookup, "foo.g")
+      foo.Lookup("foo.g")
+      self.assertTrue(loader.concat_all().Lookup("foo.g"))
+
+
 class PickledPyiLoaderTest(unittest.TestCase):
 
   PYTHON_VERSION = (2, 7)
@@ -246,6 +426,35 @@ class PickledPyiLoaderTest(unittest.TestCase):
       self.assertTrue(ast.ASTeq(loaded_ast))
       loaded_ast.Visit(visitors.VerifyLookup())
 
+  def testLoadPickledFile(self):
+    with utils.Tempdir() as d:
+      module_name = "foo.bar.module1"
+      ast = self._CreateFiles(temp_dir=d, module_name=module_name)
+      self.options.tweak(pythonpath=[])
+      pickle_loader = load_pytd.PickledPyiLoader(
+          base_module=None, options=self.options)
+      module2 = pickle_loader.load_file(
+          "module2", os.path.join(d.path, "module2.pyi.pickled"))
+      loaded_ast = pickle_loader.load_file(
+          module_name, os.path.join(d.path, "module1.pyi.pickled"))
+
+      cls = loaded_ast.Lookup("foo.bar.module1.SomeClass")
+      cls.Visit(visitors.VerifyLookup())
+      self.assertIs(
+          module2.Lookup("module2.ObjectMod2"),
+          cls.Lookup("__init__").signatures[0].params[1].type.cls)
+      self.assertTrue(ast.ASTeq(loaded_ast))
+      loaded_ast.Visit(visitors.VerifyLookup())
+
+  def testLoadPickledFileWithMissingDependency(self):
+    with utils.Tempdir() as d:
+      self._CreateFiles(temp_dir=d, module_name="module1")
+      self.options.tweak(pythonpath=[])
+      pickle_loader = load_pytd.PickledPyiLoader(
+          base_module=None, options=self.options)
+      self.assertRaises(load_pytd.BadDependencyError, pickle_loader.load_file,
+                        "module1", os.path.join(d.path, "module1.pyi.pickled"))
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -307,6 +307,132 @@ class PytypeTest(unittest.TestCase):
     self.assertTrue(parser.parse_string(pyi).ASTeq(
         parser.parse_string(expected_pyi)))
 
+  def testBatch(self):
+    self._TestBatch()
+
+  def testBatchWithJobs(self):
+    self.pytype_args["--jobs"] = 2
+    self._TestBatch()
+
+  def testBatchForkPerModule(self):
+    self.pytype_args["--fork-per-module"] = self.INCLUDE
+    self._TestBatch()
+
+  def _TestBatch(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", """
+        import b
+        def g():
+          return b.f()
+      """)
+      d.create_file("b.py", """
+        def f():
+          return 42
+      """)
+      self.pytype_args["--batch"] = self.INCLUDE
+      self.pytype_args["--pythonpath"] = d.path
+      self.pytype_args[d["a.py"] + ":" + d["a.pyi"]] = self.INCLUDE
+      self.pytype_args[d["b.py"] + ":" + d["b.pyi"]] = self.INCLUDE
+      self._RunPytype(self.pytype_args)
+      self.assertOutputStateMatches(stdout=False, stderr=False,
+                                    returncode=False)
+      with open(d["a.pyi"], "r") as f:
+        pyi = f.read()
+    self.assertTrue(parser.parse_string(pyi).ASTeq(parser.parse_string(
+        textwrap.dedent("""
+          b = ...  # type: module
+          def g() -> int: ...
+        """))))
+
+  def testBatchCycle(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", """
+        import b
+        def fa():
+          return b.fb()
+      """)
+      d.create_file("b.py", """
+        import a
+        def fb():
+          return "x"
+        def ga():
+          return a.fa()
+      """)
+      d.create_file("c.py", """
+        import b
+        def gc():
+          return b.fb()
+      """)
+      # An outdated output of b, which is loaded while analyzing the cycle.
+      d.create_file("b.pyi", "def fb() -> float")
+      self.pytype_args["--batch"] = self.INCLUDE
+      self.pytype_args["--pythonpath"] = d.path
+      for name in ("a", "b", "c"):
+        self.pytype_args[d[name + ".py"] + ":" + d[name + ".pyi"]] = (
+            self.INCLUDE)
+      self._RunPytype(self.pytype_args)
+      self.assertOutputStateMatches(stdout=False, stderr=False,
+                                    returncode=False)
+      with open(d["c.pyi"], "r") as f:
+        pyi = f.read()
+    # c sees the regenerated b, like it would when run by itself.
+    self.assertTrue(parser.parse_string(pyi).ASTeq(parser.parse_string(
+        textwrap.dedent("""
+          b = ...  # type: module
+          def gc() -> str: ...
+        """))))
+
+  def testBatchCostReport(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", "x = 42")
+      d.create_file("b.py", "y = 42")
+      self.pytype_args["--batch"] = self.INCLUDE
+      self.pytype_args["--pythonpath"] = d.path
+      self.pytype_args["--cost-report"] = d["costs"]
+      self.pytype_args[d["a.py"] + ":" + d["a.pyi"]] = self.INCLUDE
+      self.pytype_args[d["b.py"] + ":" + d["b.pyi"]] = self.INCLUDE
+      self._RunPytype(self.pytype_args)
+      self.assertOutputStateMatches(stdout=False, stderr=False,
+                                    returncode=False)
+      # Every module has a report of its own.
+      self.assertTrue(os.path.exists(d["costs.a"]))
+      self.assertTrue(os.path.exists(d["costs.b.folded"]))
+
+  def testIncremental(self):
+    with utils.Tempdir() as d:
+      d.create_file("a.py", """
+        def f():
+          return 42
+      """)
+      self.pytype_args["--incremental"] = self.INCLUDE
+      self.pytype_args[d["a.py"]] = self.INCLUDE
+      self.pytype_args["--output"] = d["a.pyi"]
+      self._RunPytype(self.pytype_args)
+      self.assertOutputStateMatches(stdout=False, stderr=False,
+                                    returncode=False)
+      self.assertTrue(os.path.exists(d["a.pyi.fingerprint"]))
+      # The second run reuses the output, so it doesn't notice this.
+      d.create_file("a.pyi", "# reused")
+      self._RunPytype(self.pytype_args)
+      self.assertOutputStateMatches(stdout=False, stderr=False,
+                                    returncode=False)
+      with open(d["a.pyi"], "r") as f:
+        self.assertEqual("# reused", f.read().strip())
+
+  def testBatchOutputConflict(self):
+    self.pytype_args["--batch"] = self.INCLUDE
+    self.pytype_args[self._DataPath("simple.py")] = self.INCLUDE
+    self.pytype_args["--output"] = "-"
+    self._RunPytype(self.pytype_args)
+    self.assertOutputStateMatches(stdout=False, stderr=True, returncode=True)
+
+  def testBatchErrorsCsvConflict(self):
+    self.pytype_args["--batch"] = self.INCLUDE
+    self.pytype_args[self._DataPath("simple.py")] = self.INCLUDE
+    self.pytype_args["--output-errors-csv"] = self.errors_csv
+    self._RunPytype(self.pytype_args)
+    self.assertOutputStateMatches(stdout=False, stderr=True, returncode=True)
+
   def testPytree(self):
     """Test pytype on a real-world program."""
     self.pytype_args["--quick"] = self.INCLUDE
@@ -1,4 +1,11 @@
-"""Compiles a single .py to a .pyc and writes it to stdout."""
+"""Compiles a single .py to a .pyc and writes it to stdout.
+
+With --server, this instead reads any number of compile requests from stdin,
+and answers each of them on stdout. All requests and responses consist of
+"frames": A 32 bit little-endian length, followed by that many bytes. A request
+is three frames (mode, filename and source code), a response is one frame (the
+same data that is written to stdout for a single file).
+"""
 
 # These are C modules built into Python. Don't add any modules that are
 # implemented in a .py:
@@ -26,9 +33,33 @@ def write_pyc(f, codeobject, source_size=0, timestamp=0):
   f.write(marshal.dumps(codeobject))
 
 
+def _read32(f):
+  data = bytearray(f.read(4))
+  if len(data) != 4:
+    raise EOFError()
+  return data[0] | (data[1] << 8) | (data[2] << 16) | (data[3] << 24)
+
+
+def read_frame(f):
+  size = _read32(f)
+  data = f.read(size)
+  if len(data) != size:
+    raise EOFError()
+  return data
+
+
+def write_frame(f, data):
+  _write32(f, len(data))
+  f.write(data)
+
+
 def compile_to_pyc(data_file, filename, output, mode="exec"):
   with open(data_file, "r") as fi:
     src = fi.read()
+  compile_src_to_pyc(src, filename, output, mode)
+
+
+def compile_src_to_pyc(src, filename, output, mode="exec"):
   try:
     codeobject = compile(src, filename, mode)
   except Exception as err:  # pylint: disable=broad-except
@@ -42,14 +73,51 @@ def compile_to_pyc(data_file, filename, output, mode="exec"):
     write_pyc(output, codeobject)
 
 
+class _Buffer(object):
+  """A minimal replacement for io.BytesIO, which isn't a builtin module."""
+
+  def __init__(self):
+    self.chunks = []
+
+  def write(self, data):
+    self.chunks.append(bytes(data))
+
+  def getvalue(self):
+    return b"".join(self.chunks)
+
+
+def serve(infile, outfile):
+  """Answer compile requests until infile is closed."""
+  while True:
+    try:
+      mode = read_frame(infile)
+      filename = read_frame(infile)
+      src = read_frame(infile)
+    except EOFError:
+      return
+    if sys.version_info[0] == 3:
+      mode = mode.decode("utf-8")
+      filename = filename.decode("utf-8")
+    output = _Buffer()
+    compile_src_to_pyc(src, filename, output, mode)
+    write_frame(outfile, output.getvalue())
+    outfile.flush()
+
+
 def main():
-  if len(sys.argv) != 4:
-    sys.exit(1)
   # pytype: disable=attribute-error
   output = sys.stdout.buffer if hasattr(sys.stdout, "buffer") else sys.stdout
   # pytype: enable=attribute-error
-  compile_to_pyc(data_file=sys.argv[1], filename=sys.argv[2],
-                 output=output, mode=sys.argv[3])
+  if sys.argv[1:] == ["--server"]:
+    # pytype: disable=attribute-error
+    infile = sys.stdin.buffer if hasattr(sys.stdin, "buffer") else sys.stdin
+    # pytype: enable=attribute-error
+    serve(infile, output)
+  elif len(sys.argv) == 4:
+    compile_to_pyc(data_file=sys.argv[1], filename=sys.argv[2],
+                   output=output, mode=sys.argv[3])
+  else:
+    sys.exit(1)
 
 
 if __name__ == "__main__":
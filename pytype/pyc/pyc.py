@@ -1,6 +1,9 @@
 """Functions for generating, reading and parsing pyc."""
 
+import atexit
+import contextlib
 import copy
+import logging
 import os
 import re
 import StringIO
@@ -13,6 +16,9 @@ from pytype.pyc import loadmarshal
 from pytype.pyc import magic
 
 
+log = logging.getLogger(__name__)
+
+
 COMPILE_SCRIPT = "pyc/compile_bytecode.py"
 COMPILE_ERROR_RE = re.compile(r"^(.*) \((.*), line (\d+)\)$")
 
@@ -32,13 +38,152 @@ class CompileError(Exception):
       self.lineno = 1
 
 
+class _CompileServer(object):
+  """A long-running Python interpreter that compiles source code for us.
+
+  Starting an interpreter is expensive compared to compiling a small module, so
+  we keep one process per interpreter around, and send it the source code of
+  all the modules we need to compile. See compile_bytecode.py for the protocol.
+  """
+
+  def __init__(self, exe):
+    self._exe = exe
+    self._proc = None
+    self._pid = None
+    # A file collecting the stderr of the server, for error messages. (A pipe
+    # could fill up and block the server, since we only read it on failure.)
+    self._stderr = None
+    # Whether processes forked from the owner may use this server. See
+    # lend_compile_servers().
+    self._lent = False
+
+  def _start(self):
+    script = utils.load_pytype_file(COMPILE_SCRIPT)
+    self._stderr = tempfile.TemporaryFile()
+    self._proc = subprocess.Popen(self._exe + ["-c", script, "--server"],
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE,
+                                  stderr=self._stderr)
+    # A process forked from ours (e.g. a worker of pytype --jobs) has to start
+    # its own server, since sharing the pipes would mix up the responses.
+    self._pid = os.getpid()
+
+  def _is_running(self):
+    if self._proc is None:
+      return False
+    elif self._pid == os.getpid():
+      return self._proc.poll() is None
+    else:
+      # We can't poll() the server of our parent, since it's not our child
+      # process. If it died, the next request fails, and we start our own.
+      return self._lent and self._pid == os.getppid()
+
+  def _request(self, src, filename, mode):
+    compile_bytecode.write_frame(self._proc.stdin, mode)
+    compile_bytecode.write_frame(self._proc.stdin, filename)
+    compile_bytecode.write_frame(self._proc.stdin, src)
+    self._proc.stdin.flush()
+    return compile_bytecode.read_frame(self._proc.stdout)
+
+  def compile(self, src, filename, mode):
+    """Compile source code, restarting the server if it crashed."""
+    for attempt in range(2):
+      if not self._is_running():
+        self._start()
+      try:
+        return self._request(src, filename, mode)
+      except (EOFError, IOError, OSError) as e:
+        reason = self._stop_after_failure(e)
+        if attempt:
+          raise IOError("Compile server %s failed: %s" % (self._exe, reason))
+        log.warning("Restarting compile server %s: %s", self._exe, reason)
+
+  def _stop_after_failure(self, error):
+    """Stop the server after a failed request, and describe what went wrong.
+
+    Args:
+      error: The exception the request failed with.
+
+    Returns:
+      A string with the error, and the exit code and stderr of the server, if
+      it's our child process.
+    """
+    proc, stderr = self._proc, self._stderr
+    owned = proc is not None and self._pid == os.getpid()
+    self._stderr = None  # Keep stop() from closing it before we read it.
+    self.stop()
+    reason = str(error) or type(error).__name__
+    if owned:
+      reason += " (exit code %s)" % proc.returncode
+      stderr.seek(0)
+      output = stderr.read().strip()
+      stderr.close()
+      if output:
+        reason += "\n" + "\n".join(output.splitlines()[-10:])
+    return reason
+
+  def stop(self):
+    if self._proc is not None and self._pid == os.getpid():
+      try:
+        self._proc.stdin.close()
+      except IOError:
+        # Flushing a request to a server that died fails with a broken pipe.
+        pass
+      if self._proc.poll() is None:
+        self._proc.kill()
+      self._proc.wait()
+      if self._stderr is not None:
+        self._stderr.close()
+    self._proc = None
+    self._stderr = None
+
+
+# Compile servers, by the command line used to start them.
+_compile_servers = {}
+
+
+def _get_compile_server(exe):
+  key = tuple(exe)
+  if key not in _compile_servers:
+    _compile_servers[key] = _CompileServer(exe)
+  return _compile_servers[key]
+
+
+@contextlib.contextmanager
+def lend_compile_servers():
+  """Let the processes forked in this context use our compile servers.
+
+  This is only safe if we don't compile anything ourselves until the child
+  processes have exited, and if they exited cleanly, i.e. not in the middle of
+  a request. Call stop_compile_servers() otherwise.
+
+  Yields:
+    Nothing.
+  """
+  servers = _compile_servers.values()
+  for server in servers:
+    server._lent = True  # pylint: disable=protected-access
+  try:
+    yield
+  finally:
+    for server in servers:
+      server._lent = False  # pylint: disable=protected-access
+
+
+@atexit.register
+def stop_compile_servers():
+  for server in _compile_servers.values():
+    server.stop()
+  _compile_servers.clear()
+
+
 def compile_src_string_to_pyc_string(src, filename, python_version, python_exe,
                                      mode="exec"):
   """Compile Python source code to pyc data.
 
-  This may use py_compile if the src is for the same version as we're running,
-  or else it spawns an external process to produce a .pyc file. The generated
-  bytecode (.pyc file) is read and both it and any temporary files are deleted.
+  This may compile in-process if python_exe is "HOST", or else it sends the
+  source to a compile server, a long-running instance of the target Python
+  interpreter that's started on first use.
 
   Args:
     src: Python sourcecode
@@ -57,34 +202,21 @@ def compile_src_string_to_pyc_string(src, filename, python_version, python_exe,
     CompileError: If we find a syntax error in the file.
     IOError: If our compile script failed.
   """
-  fi = tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False)
-
-  try:
-    fi.write(src)
-    fi.close()
-    if python_exe == "HOST":
-      # We were asked to use the version of Python we're running to compile.
-      output = StringIO.StringIO()
-      compile_bytecode.compile_to_pyc(fi.name, filename or fi.name,
-                                      output, mode)
-      bytecode = output.getvalue()
+  filename = filename or "<string>"
+  if python_exe == "HOST":
+    # We were asked to use the version of Python we're running to compile.
+    output = StringIO.StringIO()
+    compile_bytecode.compile_src_to_pyc(src, filename, output, mode)
+    bytecode = output.getvalue()
+  else:
+    # In order to be able to compile pyc files for both Python 2 and Python 3,
+    # we use an external process.
+    if python_exe:
+      # Allow python_exe to contain parameters (E.g. "-T")
+      exe = python_exe.split() + ["-S"]
     else:
-      # In order to be able to compile pyc files for both Python 2 and Python 3,
-      # we spawn an external process.
-      if python_exe:
-        # Allow python_exe to contain parameters (E.g. "-T")
-        exe = python_exe.split() + ["-S"]
-      else:
-        exe = ["python" + ".".join(map(str, python_version))]
-      cmd = exe + ["-", fi.name, filename or fi.name, mode]
-
-      src = utils.load_pytype_file(COMPILE_SCRIPT)
-
-      p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-      bytecode, _ = p.communicate(src)
-      assert p.poll() == 0, "Child process failed"
-  finally:
-    os.unlink(fi.name)
+      exe = ["python" + ".".join(map(str, python_version))]
+    bytecode = _get_compile_server(exe).compile(src, filename, mode)
   if bytecode[0] == chr(0):  # compile OK
     return bytecode[1:]
   elif bytecode[0] == chr(1):  # compile error
@@ -155,6 +287,20 @@ def compile_src(src, python_version, python_exe, filename=None, mode="exec"):
   """
   pyc_data = compile_src_string_to_pyc_string(
       src, filename, python_version, python_exe, mode)
+  return load_pyc_string(pyc_data, python_version, filename)
+
+
+def load_pyc_string(pyc_data, python_version, filename=None):
+  """Parse the output of compile_src_string_to_pyc_string.
+
+  Args:
+    pyc_data: pyc data.
+    python_version: Python version, (major, minor).
+    filename: The filename the sourcecode is from.
+
+  Returns:
+    An instance of loadmarshal.CodeType.
+  """
   code = parse_pyc_string(pyc_data)
   assert code.python_version == python_version
   visit(code, AdjustFilename(filename))
@@ -1,5 +1,8 @@
 """Tests for pyc.py."""
 
+import errno
+import os
+
 
 from pytype.pyc import opcodes
 from pytype.pyc import pyc
@@ -21,6 +24,12 @@ class TestCompileError(unittest.TestCase):
     self.assertEquals("some error in foo.py at line 123", e.error)
 
 
+class _BrokenPipe(object):
+
+  def close(self):
+    raise IOError(errno.EPIPE, "Broken pipe")
+
+
 class TestPyc(unittest.TestCase):
   """Tests for pyc.py."""
 
@@ -91,6 +100,71 @@ class TestPyc(unittest.TestCase):
                        ("LOAD_CONST", 3),
                        ("RETURN_VALUE", 3)], op_and_line)
 
+  def test_reuse_compile_server(self):
+    self._compile("a = 1")
+    server = pyc._get_compile_server(["python2.7"])
+    proc = server._proc
+    self._compile("b = 2")
+    self.assertIs(proc, server._proc)
+
+  def test_restart_compile_server(self):
+    self._compile("a = 1")
+    server = pyc._get_compile_server(["python2.7"])
+    server._proc.kill()
+    server._proc.wait()
+    code = self._compile("b = 2")
+    self.assertIn("b", code.co_names)
+
+  def test_compile_server_crash_during_request(self):
+    self._compile("a = 1")
+    server = pyc._get_compile_server(["python2.7"])
+    # Don't wait for the process, so the next request might still see it
+    # running, and fail.
+    server._proc.kill()
+    code = self._compile("b = 2")
+    self.assertIn("b", code.co_names)
+
+  def test_compile_server_failure(self):
+    server = pyc._CompileServer([
+        "python2.7", "-c",
+        "import sys; sys.stderr.write('no luck\\n'); sys.exit(3)"])
+    try:
+      server.compile("a = 1", "test_input.py", "exec")
+      self.fail("Did not raise IOError")
+    except IOError as e:
+      self.assertIn("exit code 3", str(e))
+      self.assertIn("no luck", str(e))
+    self.assertIsNone(server._proc)
+
+  def test_stop_compile_server_with_broken_pipe(self):
+    server = pyc._CompileServer(["python2.7"])
+    server._start()
+    server._proc.kill()
+    server._proc.wait()
+    server._proc.stdin.close()
+    # Closing stdin flushes it, which fails if the server died.
+    server._proc.stdin = _BrokenPipe()
+    server.stop()
+    self.assertIsNone(server._proc)
+
+  def test_lend_compile_server(self):
+    self._compile("a = 1")
+    server = pyc._get_compile_server(["python2.7"])
+    proc = server._proc
+    with pyc.lend_compile_servers():
+      pid = os.fork()
+      if not pid:
+        try:
+          code = self._compile("b = 2")
+          os._exit(0 if "b" in code.co_names and server._proc is proc else 1)
+        finally:
+          os._exit(1)
+      _, status = os.waitpid(pid, 0)
+    self.assertEqual(0, status)
+    code = self._compile("c = 3")
+    self.assertIn("c", code.co_names)
+    self.assertIs(proc, server._proc)
+
 
 if __name__ == "__main__":
   unittest.main()
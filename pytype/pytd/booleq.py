@@ -524,9 +524,73 @@ class Solver(object):
         # If a variable does not have any constraints, it can be anything.
         self.implications[var][Solver.ANY_VALUE] = TRUE
 
+  def _get_components(self):
+    """Split the system into independent subsystems.
+
+    Two variables are in the same subsystem if an implication or a conjunct of
+    the ground truth mentions both of them. Conjuncts of the ground truth that
+    don't mention any variable are added to every subsystem.
+
+    Returns:
+      A list of tuples (variables, implications, ground truth), one for each
+      subsystem. variables is a set of strings, implications maps each of
+      these variables to its entry in self.implications.
+    """
+    roots = {var: var for var in self.variables}
+
+    def find(var):
+      root = var
+      while roots[root] != root:
+        root = roots[root]
+      while roots[var] != root:
+        roots[var], var = root, roots[var]
+      return root
+
+    def union(names):
+      names = [name for name in names if name in roots]
+      if names:
+        root = find(names[0])
+        for name in names[1:]:
+          roots[find(name)] = root
+
+    for var in self.variables:
+      names = [var]
+      for value, implication in self.implications[var].items():
+        names.append(value)
+        names.extend(chain(implication.extract_equalities()))
+      union(names)
+    if isinstance(self.ground_truth, _And):
+      terms = self.ground_truth.exprs
+    else:
+      terms = [self.ground_truth]
+    shared_terms = []
+    term_names = []
+    for term in terms:
+      names = [name for name in chain(term.extract_equalities())
+               if name in roots]
+      if names:
+        union(names)
+        term_names.append((term, names[0]))
+      else:
+        shared_terms.append(term)
+
+    variables = collections.defaultdict(set)
+    for var in self.variables:
+      variables[find(var)].add(var)
+    ground_truths = collections.defaultdict(lambda: list(shared_terms))
+    for term, name in term_names:
+      ground_truths[find(name)].append(term)
+    return [(variables[root],
+             {var: self.implications[var] for var in variables[root]},
+             And(ground_truths[root]))
+            for root in sorted(variables)]
+
   def solve(self):
     """Solve the system of equations.
 
+    The system is split into subsystems that don't share any variables, which
+    are solved independently.
+
     Returns:
       An assignment, mapping strings (variables) to sets of strings (values).
     """
@@ -535,44 +599,65 @@ class Solver(object):
 
     self._complete()
 
-    assignments = {var: self._get_nonfalse_values(var)
-                   for var in self.variables}
-
-    ground_pivots = self.ground_truth.simplify(assignments).extract_pivots(
-        assignments)
-    for pivot, possible_values in ground_pivots.items():
-      if pivot in assignments:
-        assignments[pivot] &= set(possible_values)
-
-    something_changed = True
-    while something_changed:
-      something_changed = False
-
-      and_terms = []
-      for var in self.variables:
-        or_terms = []
-        for value in assignments[var].copy():
-          implication = self.implications[var][value].simplify(assignments)
-          if implication is FALSE:
-            # As an example of what kind of code triggers this,
-            # see TestBoolEq.testFilter
-            assignments[var].remove(value)
-            something_changed = True
-          else:
-            or_terms.append(implication)
-          self.implications[var][value] = implication
-        and_terms.append(Or(or_terms))
-      d = And(and_terms)
-
-      for pivot, possible_values in d.extract_pivots(assignments).items():
-        if pivot in assignments:
-          length_before = len(assignments[pivot])
-          assignments[pivot] &= set(possible_values)
-          length_after = len(assignments[pivot])
-          something_changed |= (length_before != length_after)
+    assignments = {}
+    for component in self._get_components():
+      assignments.update(_solve_component(component))
 
     self.register_variable = utils.disabled_function
     self.implies = utils.disabled_function
 
     self.assignments = assignments
     return assignments
+
+
+def _solve_component(component):
+  """Solve one of the subsystems returned by Solver._get_components().
+
+  Args:
+    component: A tuple (variables, implications, ground truth). The
+      implications dictionaries are shared with the Solver, so simplified
+      implications are written back to Solver.implications.
+
+  Returns:
+    An assignment, mapping the variables to sets of strings (values).
+  """
+  variables, implications, ground_truth = component
+  assignments = {var: set(value for value, implication
+                          in implications[var].items()
+                          if implication is not FALSE)
+                 for var in variables}
+
+  ground_pivots = ground_truth.simplify(assignments).extract_pivots(
+      assignments)
+  for pivot, possible_values in ground_pivots.items():
+    if pivot in assignments:
+      assignments[pivot] &= set(possible_values)
+
+  something_changed = True
+  while something_changed:
+    something_changed = False
+
+    and_terms = []
+    for var in variables:
+      or_terms = []
+      for value in assignments[var].copy():
+        implication = implications[var][value].simplify(assignments)
+        if implication is FALSE:
+          # As an example of what kind of code triggers this,
+          # see TestBoolEq.testFilter
+          assignments[var].remove(value)
+          something_changed = True
+        else:
+          or_terms.append(implication)
+        implications[var][value] = implication
+      and_terms.append(Or(or_terms))
+    d = And(and_terms)
+
+    for pivot, possible_values in d.extract_pivots(assignments).items():
+      if pivot in assignments:
+        length_before = len(assignments[pivot])
+        assignments[pivot] &= set(possible_values)
+        length_after = len(assignments[pivot])
+        something_changed |= (length_before != length_after)
+
+  return assignments
@@ -282,5 +282,41 @@ class TestBoolEq(unittest.TestCase):
     self.assertIn("1", m["y.T"])
     self.assertNotIn("4", m["y.T"])
 
+  def _MakeIndependentSolver(self):
+    solver = booleq.Solver()
+    for var in ("a", "b", "c", "x", "y"):
+      solver.register_variable(var)
+    solver.implies(Eq("a", "1"), Eq("b", "1"))
+    solver.implies(Eq("a", "2"), FALSE)
+    solver.implies(Eq("b", "1"), TRUE)
+    solver.implies(Eq("x", "1"), Or([Eq("y", "1"), Eq("y", "2")]))
+    solver.implies(Eq("y", "1"), FALSE)
+    solver.always_true(And([Eq("c", "b"), Eq("x", "1")]))
+    return solver
+
+  def testComponents(self):
+    solver = self._MakeIndependentSolver()
+    solver._complete()
+    components = solver._get_components()
+    self.assertEquals([{"a", "b", "c"}, {"x", "y"}],
+                      [variables for variables, _, _ in components])
+    self.assertEquals([Eq("c", "b"), Eq("x", "1")],
+                      [ground_truth for _, _, ground_truth in components])
+
+  def testSolveComponents(self):
+    self.assertDictEqual(self._MakeIndependentSolver().solve(),
+                         {"a": {"1"},
+                          "b": {"1"},
+                          "c": {"1"},
+                          "x": {"1"},
+                          "y": {"2"}})
+
+  def testSolveComponentsWritesBack(self):
+    solver = self._MakeIndependentSolver()
+    solver.solve()
+    self.assertIs(FALSE, solver.implications["y"]["1"])
+    self.assertEquals(Eq("y", "2"), solver.implications["x"]["1"])
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -6,6 +6,7 @@ and to model path-specific visibility of nested data structures.
 
 import collections
 import logging
+import weakref
 
 
 from pytype import metrics
@@ -24,6 +25,11 @@ _variable_size_metric = metrics.Distribution("variable_size")
 # use that as the cutoff.
 MAX_VAR_SIZE = 64
 
+# Bindings and variables look up their origins and bindings with a linear
+# search, and only build a dictionary once they have more than this many. Most
+# have just one, and an empty dictionary takes more memory than the binding.
+_MAX_LINEAR_LOOKUP = 8
+
 
 class Program(object):
   """Program instances describe program entities.
@@ -36,19 +42,31 @@ class Program(object):
     entrypoint: Entrypoint of the program, if it has one. (None otherwise)
     cfg_nodes: CFG nodes in use. Will be used for assigning node IDs.
     variables: Variables in use. Will be used for assigning variable IDs.
+    num_bindings: The number of bindings created so far.
+    solver_cache_size: The maximum number of entries in each of the caches of
+      the solver, or None if they're unbounded.
+    weak_node_bindings: Whether CFG nodes only keep weak references to the
+      bindings assigned at them. Bindings (and their variables) that aren't
+      reachable from anywhere else can then be garbage collected, but
+      CFGNode.bindings and Program.variables only contain the live ones.
+    dominator_tree: A _DominatorTree of the CFG, for the solver.
   """
 
-  def __init__(self):
+  def __init__(self, solver_cache_size=None, weak_node_bindings=False):
     """Initialize a new (initially empty) program."""
     self.entrypoint = None
     self.cfg_nodes = []
     self.next_variable_id = 0
+    self.num_bindings = 0
     self.solver = None
     self.default_data = None
+    self.solver_cache_size = solver_cache_size
+    self.weak_node_bindings = weak_node_bindings
+    self.dominator_tree = _DominatorTree(self)
 
   def CreateSolver(self):
     if self.solver is None:
-      self.solver = Solver(self)
+      self.solver = Solver(self, self.solver_cache_size)
     return self.solver
 
   def InvalidateSolver(self):
@@ -59,6 +77,7 @@ class Program(object):
     self.InvalidateSolver()
     cfg_node = CFGNode(self, name, len(self.cfg_nodes), condition)
     self.cfg_nodes.append(cfg_node)
+    self.dominator_tree.AddNode(cfg_node)
     return cfg_node
 
   @property
@@ -147,7 +166,7 @@ class CFGNode(object):
                  fulfilled to take the branch represented by this node.
   """
   __slots__ = ("program", "id", "name", "incoming", "outgoing", "bindings",
-               "condition")
+               "_condition")
 
   def __init__(self, program, name, cfgnode_id, condition):
     """Initialize a new CFG node. Called from Program.NewCFGNode."""
@@ -156,8 +175,18 @@ class CFGNode(object):
     self.name = name
     self.incoming = set()
     self.outgoing = set()
-    self.bindings = set()  # filled through RegisterBinding()
-    self.condition = condition
+    # filled through RegisterBinding()
+    self.bindings = weakref.WeakSet() if program.weak_node_bindings else set()
+    self._condition = condition
+
+  @property
+  def condition(self):
+    return self._condition
+
+  @condition.setter
+  def condition(self, condition):
+    self._condition = condition
+    self.program.dominator_tree.Invalidate()
 
   def ConnectNew(self, name=None, condition=None):
     """Add a new node connected to this node."""
@@ -168,23 +197,25 @@ class CFGNode(object):
   def ConnectTo(self, cfg_node):
     """Connect this node to an existing node."""
     self.program.InvalidateSolver()
+    self.program.dominator_tree.AddEdge(self, cfg_node)
     self.outgoing.add(cfg_node)
     cfg_node.incoming.add(self)
 
+  def BindingFilter(self):
+    """Get a function that tells whether a binding can be visible at this node.
+
+    This is CanHaveCombination for a single binding. All calls of the returned
+    function share one traversal of the CFG, so checking any number of bindings
+    costs at most one traversal.
+
+    Returns:
+      A function that takes a Binding and returns a boolean.
+    """
+    return _OriginSearch(self).HasOrigin
+
   def CanHaveCombination(self, bindings):
     """Quick version of HasCombination below."""
-    goals = set(bindings)
-    seen = set()
-    stack = [self]
-    # TODO(kramm): Take blocked nodes into account, like in Bindings()?
-    while stack and goals:
-      node = stack.pop()
-      if node in seen:
-        continue
-      seen.add(node)
-      goals -= goals & node.bindings
-      stack.extend(node.incoming)
-    return not goals
+    return all(map(self.BindingFilter(), bindings))
 
   def HasCombination(self, bindings):
     """Query whether a combination is possible.
@@ -205,6 +236,36 @@ class CFGNode(object):
     return (all(self.program.solver.Solve({b}, self) for b in bindings)
             and self.program.solver.Solve(bindings, self))
 
+  def HasCombinations(self, combinations, possible=None):
+    """Batch version of HasCombination.
+
+    All combinations are answered by the same solver, so that they share solved
+    states and path queries, and each binding is only checked by itself once.
+
+    Arguments:
+      combinations: A list of lists of Bindings.
+      possible: Optionally, a dictionary mapping Bindings to whether
+        HasCombination is true for them by themselves at this node, e.g. from
+        filtering the bindings before building the combinations. Bindings that
+        are missing are checked, and added to it.
+    Returns:
+      A list of booleans, one for each combination.
+    """
+    solver = self.program.CreateSolver()
+    if possible is None:
+      possible = {}
+    results = []
+    for bindings in combinations:
+      for b in bindings:
+        if b not in possible:
+          possible[b] = solver.Solve({b}, self)
+        if not possible[b]:
+          results.append(False)
+          break
+      else:
+        results.append(solver.Solve(bindings, self))
+    return results
+
   def RegisterBinding(self, binding):
     self.bindings.add(binding)
 
@@ -237,6 +298,34 @@ class CFGNode(object):
       return pytype.utils.ascii_tree(self, lambda node: node.incoming)
 
 
+class _OriginSearch(object):
+  """Finds bindings with an origin at a node or one of its ancestors.
+
+  The CFG is traversed backwards from the node, only as far as needed to answer
+  the queries so far.
+  """
+
+  def __init__(self, node):
+    self._stack = [node]
+    self._seen = set()
+
+  def HasOrigin(self, binding):
+    # Check the origins we've already found, before extending the search.
+    nodes = {origin.where for origin in binding.origins}
+    if not nodes.isdisjoint(self._seen):
+      return True
+    # TODO(kramm): Take blocked nodes into account, like in Bindings()?
+    while self._stack:
+      node = self._stack.pop()
+      if node in self._seen:
+        continue
+      self._seen.add(node)
+      self._stack.extend(node.incoming)
+      if node in nodes:
+        return True
+    return False
+
+
 class SourceSet(frozenset):
   """A SourceSet is a combination of Bindings that was used to form a Binding.
 
@@ -247,6 +336,10 @@ class SourceSet(frozenset):
   __slots__ = ()
 
 
+# Many bindings are constants, which have no sources. They share this one.
+_EMPTY_SOURCE_SET = SourceSet()
+
+
 class Origin(collections.namedtuple("_", "where, source_sets")):
   """An "origin" is an explanation of how a binding was constructed.
 
@@ -265,7 +358,11 @@ class Origin(collections.namedtuple("_", "where, source_sets")):
 
   def AddSourceSet(self, source_set):
     """Add a new possible source set."""
-    self.source_sets.add(SourceSet(source_set))
+    if not source_set:
+      source_set = _EMPTY_SOURCE_SET
+    elif not isinstance(source_set, SourceSet):
+      source_set = SourceSet(source_set)
+    self.source_sets.add(source_set)
 
 
 class Binding(object):
@@ -281,7 +378,8 @@ class Binding(object):
   originally retrieved from, before being assigned to something else here.
   Origins contain, through source_sets, "sources", which are other bindings.
   """
-  __slots__ = ("program", "variable", "origins", "data", "_cfgnode_to_origin")
+  __slots__ = ("program", "variable", "origins", "data", "_cfgnode_to_origin",
+               "__weakref__")
 
   def __init__(self, program, variable, data):
     """Initialize a new Binding. Usually called through Variable.AddBinding."""
@@ -289,7 +387,7 @@ class Binding(object):
     self.variable = variable
     self.origins = []
     self.data = data
-    self._cfgnode_to_origin = {}
+    self._cfgnode_to_origin = None  # see _MAX_LINEAR_LOOKUP
 
   def IsVisible(self, viewpoint):
     """Can we "see" this binding from the current cfg node?
@@ -310,18 +408,25 @@ class Binding(object):
     return self.program.solver.Solve({self}, viewpoint)
 
   def _FindOrAddOrigin(self, cfg_node):
-    try:
-      origin = self._cfgnode_to_origin[cfg_node]
-    except KeyError:
+    origin = self.FindOrigin(cfg_node)
+    if origin is None:
       origin = Origin(cfg_node)
       self.origins.append(origin)
-      self._cfgnode_to_origin[cfg_node] = origin
+      if self._cfgnode_to_origin is not None:
+        self._cfgnode_to_origin[cfg_node] = origin
+      elif len(self.origins) > _MAX_LINEAR_LOOKUP:
+        self._cfgnode_to_origin = {o.where: o for o in self.origins}
       self.variable.RegisterBindingAtNode(self, cfg_node)
       cfg_node.RegisterBinding(self)
     return origin
 
   def FindOrigin(self, cfg_node):
     """Return an Origin instance for a CFGNode, or None."""
+    if self._cfgnode_to_origin is None:
+      for origin in self.origins:
+        if origin.where is cfg_node:
+          return origin
+      return None
     return self._cfgnode_to_origin.get(cfg_node)
 
   def AddOrigin(self, where, source_set):
@@ -383,12 +488,14 @@ class Variable(object):
   executed when a binding is added. The bindings are stored in a list for
   determinicity; new bindings should be added via AddBinding or
   (FilterAnd)PasteVariable rather than appended to bindings directly to ensure
-  that bindings and _data_id_to_bindings are updated together. We do this rather
+  that bindings and _data_id_to_binding are updated together. We do this rather
   than making _data_id_to_binding a collections.OrderedDict because a CFG can
   easily have tens of thousands of variables, and it takes about 40x as long to
   create an OrderedDict instance as to create a list and a dict, while adding a
   binding to the OrderedDict takes 2-3x as long as adding it to both the list
-  and the dict.
+  and the dict. For the same reason, _data_id_to_binding is only created once
+  there are more than _MAX_LINEAR_LOOKUP bindings, and _callbacks once a
+  callback is registered.
   """
   __slots__ = ("program", "id", "bindings", "_data_id_to_binding",
                "_cfgnode_to_bindings", "_callbacks")
@@ -398,9 +505,9 @@ class Variable(object):
     self.program = program
     self.id = variable_id
     self.bindings = []
-    self._data_id_to_binding = {}
-    self._cfgnode_to_bindings = {}
-    self._callbacks = []
+    self._data_id_to_binding = None
+    self._cfgnode_to_bindings = {}  # CFGNode -> list of bindings
+    self._callbacks = None
 
   def __repr__(self):
     return "<Variable v%d: %d choices>" % (
@@ -467,20 +574,33 @@ class Variable(object):
     """Like Filter(viewpoint), but only return the data."""
     return [b.data for b in self.bindings if b.IsVisible(viewpoint)]
 
+  def _FindBinding(self, data):
+    """Return the binding for data, or None."""
+    if self._data_id_to_binding is None:
+      for binding in self.bindings:
+        if binding.data is data:
+          return binding
+      return None
+    return self._data_id_to_binding.get(id(data))
+
   def _FindOrAddBinding(self, data):
     """Add a new binding if necessary, otherwise return existing binding."""
-    if (len(self.bindings) >= MAX_VAR_SIZE - 1 and
-        id(data) not in self._data_id_to_binding):
+    binding = self._FindBinding(data)
+    if binding is None and len(self.bindings) >= MAX_VAR_SIZE - 1:
       data = self.program.default_data
-    try:
-      binding = self._data_id_to_binding[id(data)]
-    except KeyError:
+      binding = self._FindBinding(data)
+    if binding is None:
       self.program.InvalidateSolver()
       binding = Binding(self.program, self, data)
+      self.program.num_bindings += 1
       self.bindings.append(binding)
-      self._data_id_to_binding[id(data)] = binding
-      for callback in self._callbacks:
-        callback()
+      if self._data_id_to_binding is not None:
+        self._data_id_to_binding[id(data)] = binding
+      elif len(self.bindings) > _MAX_LINEAR_LOOKUP:
+        self._data_id_to_binding = {id(b.data): b for b in self.bindings}
+      if self._callbacks:
+        for callback in self._callbacks:
+          callback()
       _variable_size_metric.add(len(self.bindings))
     return binding
 
@@ -543,16 +663,20 @@ class Variable(object):
     return new_variable
 
   def RegisterBindingAtNode(self, binding, node):
+    # A binding is only registered once per node, when its origin is created,
+    # so a list (which is smaller than a set) suffices.
     if node not in self._cfgnode_to_bindings:
-      self._cfgnode_to_bindings[node] = {binding}
+      self._cfgnode_to_bindings[node] = [binding]
     else:
-      self._cfgnode_to_bindings[node].add(binding)
+      self._cfgnode_to_bindings[node].append(binding)
 
   def RegisterChangeListener(self, callback):
+    if self._callbacks is None:
+      self._callbacks = []
     self._callbacks.append(callback)
 
   def UnregisterChangeListener(self, callback):
-    self._callbacks.remove(callback)
+    (self._callbacks or []).remove(callback)
 
   @property
   def data(self):
@@ -563,31 +687,68 @@ class Variable(object):
     return set(self._cfgnode_to_bindings)
 
 
-def _GoalsConflict(goals):
-  """Are the given bindings conflicting?
+class _BindingBits(object):
+  """Represents sets of bindings as integers, with one bit per binding.
 
-  Args:
-    goals: A list of goals.
+  Bits are handed out in the order bindings are first seen, so the integers
+  stay small for a solver that only looks at a part of the program.
+  """
 
-  Returns:
-    True if we would need a variable to be assigned to two distinct
-    bindings at the same time in order to solve this combination of goals.
-    False if there are no conflicting goals.
+  def __init__(self):
+    self._bits = {}
+    self._bindings = []
+    # Map from variable to the bits of all its bindings that we've seen.
+    self._variable_masks = collections.defaultdict(int)
+
+  def Bit(self, binding):
+    bit = self._bits.get(binding)
+    if bit is None:
+      bit = self._bits[binding] = 1 << len(self._bindings)
+      self._bindings.append(binding)
+      self._variable_masks[binding.variable] |= bit
+    return bit
+
+  def Mask(self, bindings):
+    mask = 0
+    for binding in bindings:
+      mask |= self.Bit(binding)
+    return mask
+
+  def Bindings(self, mask):
+    """Get the bindings in a mask, ordered by when they were first seen."""
+    bindings = []
+    while mask:
+      bit = mask & -mask
+      mask ^= bit
+      bindings.append(self._bindings[bit.bit_length() - 1])
+    return bindings
+
+  def Conflict(self, mask):
+    """Are the given bindings conflicting?
 
-  Raises:
-    AssertionError: For internal errors.
-  """
-  variables = {}
-  for goal in goals:
-    existing = variables.get(goal.variable)
-    if existing:
-      if existing is goal:
-        raise AssertionError("Internal error. Duplicate goal.")
-      if existing.data is goal.data:
-        raise AssertionError("Internal error. Duplicate data across bindings")
-      return True
-    variables[goal.variable] = goal
-  return False
+    Args:
+      mask: A set of goals, as a mask.
+
+    Returns:
+      True if we would need a variable to be assigned to two distinct
+      bindings at the same time in order to solve this combination of goals.
+      False if there are no conflicting goals.
+
+    Raises:
+      AssertionError: For internal errors.
+    """
+    remaining = mask
+    while remaining:
+      bit = remaining & -remaining
+      remaining ^= bit
+      goal = self._bindings[bit.bit_length() - 1]
+      others = mask & self._variable_masks[goal.variable] ^ bit
+      if others:
+        other, = self.Bindings(others & -others)
+        if other.data is goal.data:
+          raise AssertionError("Internal error. Duplicate data across bindings")
+        return True
+    return False
 
 
 class State(object):
@@ -595,15 +756,16 @@ class State(object):
 
   Attributes:
     pos: Our current position in the CFG.
-    goals: A list of bindings we'd like to be valid at this position.
+    goals: The bindings we'd like to be valid at this position, as a mask of
+      the _BindingBits this state was created with.
   """
-  __slots__ = ("pos", "goals")
+  __slots__ = ("pos", "goals", "_bits")
 
-  def __init__(self, pos, goals):
+  def __init__(self, pos, goals, bits):
     """Initialize a state that starts at the given cfg node."""
-    assert all(isinstance(goal, Binding) for goal in goals)
     self.pos = pos
-    self.goals = set(goals)  # Make a copy. We modify these.
+    self.goals = goals
+    self._bits = bits
 
   def Done(self):
     """Is this State solved? This checks whether the list of goals is empty."""
@@ -620,13 +782,14 @@ class State(object):
       A set of instances of CFGNode. At every CFGNode in this set, at least
       one variable in the list of goals is assigned to something.
     """
-    return set.union(*(goal.variable.nodes for goal in self.goals))
+    return set.union(*(goal.variable.nodes
+                       for goal in self._bits.Bindings(self.goals)))
 
   def Replace(self, goal, replace_with):
     """Replace a goal with new goals (the origins of the expanded goal)."""
-    assert goal in self.goals, "goal to expand not in state"
-    self.goals.remove(goal)
-    self.goals.update(replace_with)
+    bit = self._bits.Bit(goal)
+    assert self.goals & bit, "goal to expand not in state"
+    self.goals = self.goals & ~bit | self._bits.Mask(replace_with)
 
   def _AddSources(self, goal, new_goals):
     """If the goal is trivially fulfilled, add its sources as new goals.
@@ -649,16 +812,22 @@ class State(object):
     return False
 
   def RemoveFinishedGoals(self):
-    """Remove all goals that are trivially fulfilled at the current CFG node."""
+    """Remove all goals that are trivially fulfilled at the current CFG node.
+
+    Returns:
+      The removed goals, as a mask.
+    """
+    goals = self._bits.Bindings(self.goals)
     new_goals = set()
-    goals_to_remove = set()
-    for goal in self.goals:
-      if self._AddSources(goal, new_goals):
-        goals_to_remove.add(goal)
+    goals_to_remove = [goal for goal in goals
+                       if self._AddSources(goal, new_goals)]
+    if not goals_to_remove:
+      return 0
     # We might remove multiple layers of nested goals, so loop until we don't
     # find anything to replace anymore. Storing new goals in a separate set is
     # faster than adding and removing them from self.goals.
-    seen_goals = self.goals.copy()
+    seen_goals = set(goals)
+    goals_to_add = []
     while new_goals:
       goal = new_goals.pop()
       if goal in seen_goals:
@@ -667,16 +836,16 @@ class State(object):
         continue
       seen_goals.add(goal)
       if self._AddSources(goal, new_goals):
-        goals_to_remove.add(goal)
+        goals_to_remove.append(goal)
       else:
-        self.goals.add(goal)
-    for goal in goals_to_remove:
-      self.goals.discard(goal)
-    return goals_to_remove
+        goals_to_add.append(goal)
+    removed = self._bits.Mask(goals_to_remove)
+    self.goals = (self.goals | self._bits.Mask(goals_to_add)) & ~removed
+    return removed
 
   def __hash__(self):
     """Compute hash for this State. We use States as keys when memoizing."""
-    return hash(self.pos) + hash(frozenset(self.goals))
+    return hash(self.pos) + hash(self.goals)
 
   def __eq__(self, other):
     return self.pos == other.pos and self.goals == other.goals
@@ -685,11 +854,264 @@ class State(object):
     return not self == other
 
 
+class _LruCache(object):
+  """A dictionary that only keeps the most recently used entries.
+
+  Hits, misses and evictions are counted in a metrics.MapCounter. Values can't
+  be None, since that's what Get returns for missing keys.
+  """
+
+  def __init__(self, max_size, metric):
+    """Initialize an empty cache.
+
+    Arguments:
+      max_size: The maximum number of entries, or None for an unbounded cache.
+      metric: A metrics.MapCounter.
+    """
+    self._max_size = max_size
+    self._metric = metric
+    # Only a bounded cache needs to remember the order of accesses.
+    self._data = collections.OrderedDict() if max_size else {}
+
+  def __len__(self):
+    return len(self._data)
+
+  def __contains__(self, key):
+    return key in self._data
+
+  def Get(self, key):
+    """Look up a key, and mark it as the most recently used one.
+
+    Arguments:
+      key: The key.
+
+    Returns:
+      The value, or None if the key isn't in the cache.
+    """
+    value = self._data.get(key)
+    if value is None:
+      self._metric.inc("miss")
+      return None
+    self._metric.inc("hit")
+    if self._max_size:
+      del self._data[key]
+      self._data[key] = value
+    return value
+
+  def Put(self, key, value):
+    """Store a value, evicting the least recently used entry if needed."""
+    assert value is not None
+    self._data.pop(key, None)
+    self._data[key] = value
+    if self._max_size and len(self._data) > self._max_size:
+      self._data.popitem(last=False)
+      self._metric.inc("eviction")
+
+
+class _DominatorTree(object):
+  """The dominator tree of a CFG, kept up to date as the CFG grows.
+
+  A node dominates another node if all paths to the latter go through it, where
+  paths start at a virtual root that's connected to every node without incoming
+  edges. Given that finish dominates start, the nodes that are on all paths
+  from finish to start are exactly the ones in the tree between them.
+
+  New nodes, edges to nodes without outgoing edges, and edges back to a
+  dominator of their source node are handled incrementally. This covers the
+  CFGs built by the VM. Any other edge invalidates the tree, and it's rebuilt
+  the next time it's queried.
+
+  Nodes are stored at position node.id + 1 of the lists below. Position 0 is
+  the virtual root.
+  """
+
+  _rebuild_metric = metrics.Counter("cfg_dominator_tree_rebuilds")
+
+  def __init__(self, program):
+    self._program = program
+    self._valid = True
+    # The position of the immediate dominator of each position.
+    self._parent = [0]
+    self._depth = [0]
+    # The position of an ancestor, chosen such that any ancestor can be found in
+    # a logarithmic number of steps. See _Attach.
+    self._jump = [0]
+    # The position of the closest ancestor-or-self with a condition, or 0.
+    self._conditioned = [0]
+
+  def _Attach(self, pos, parent, node):
+    """Set the parent of a position that has no children."""
+    self._parent[pos] = parent
+    self._depth[pos] = self._depth[parent] + 1
+    # Skew-binary jump pointers (Myers, "An applicative random-access stack").
+    jump = self._jump[parent]
+    if (self._depth[parent] - self._depth[jump] ==
+        self._depth[jump] - self._depth[self._jump[jump]]):
+      self._jump[pos] = self._jump[jump]
+    else:
+      self._jump[pos] = parent
+    self._conditioned[pos] = pos if node.condition else (
+        self._conditioned[parent])
+
+  def _Ancestor(self, pos, depth):
+    """Find the ancestor-or-self of a position at the given depth."""
+    while self._depth[pos] > depth:
+      jump = self._jump[pos]
+      pos = jump if self._depth[jump] >= depth else self._parent[pos]
+    return pos
+
+  def _CommonAncestor(self, pos1, pos2):
+    depth = min(self._depth[pos1], self._depth[pos2])
+    pos1 = self._Ancestor(pos1, depth)
+    pos2 = self._Ancestor(pos2, depth)
+    while pos1 != pos2:
+      # Positions at the same depth have jump pointers of the same depth.
+      if self._jump[pos1] != self._jump[pos2]:
+        pos1, pos2 = self._jump[pos1], self._jump[pos2]
+      else:
+        pos1, pos2 = self._parent[pos1], self._parent[pos2]
+    return pos1
+
+  def _Dominates(self, pos1, pos2):
+    return self._Ancestor(pos2, self._depth[pos1]) == pos1
+
+  def AddNode(self, node):
+    """Add a new node, without any edges."""
+    for positions in self._parent, self._depth, self._jump, self._conditioned:
+      positions.append(0)
+    if self._valid:
+      self._Attach(node.id + 1, 0, node)
+
+  def AddEdge(self, source, target):
+    """Update the tree for an edge. Called before the edge is added."""
+    if not self._valid or source in target.incoming:
+      return
+    s = source.id + 1
+    t = target.id + 1
+    if target.outgoing or source is target:
+      # An edge back to a dominator doesn't create any paths that bypass
+      # existing dominators. Other nodes might now be reachable in new ways.
+      if not self._Dominates(t, s):
+        self.Invalidate()
+    elif not target.incoming:
+      self._Attach(t, s, target)
+    else:
+      # Nothing is dominated by target, so only its own dominators change.
+      self._Attach(t, self._CommonAncestor(self._parent[t], s), target)
+
+  def Invalidate(self):
+    self._valid = False
+
+  def _Rebuild(self):
+    """Compute the tree from scratch.
+
+    Uses the algorithm from Cooper, Harvey & Kennedy, "A Simple, Fast Dominance
+    Algorithm".
+    """
+    _DominatorTree._rebuild_metric.inc()
+    nodes = self._program.cfg_nodes
+    # Nodes that are only reachable through cycles are connected to the root,
+    # too.
+    roots = [node for node in nodes if not node.incoming]
+    roots.extend(nodes)
+    is_root_child = [False] * (len(nodes) + 1)
+    visited = set()
+    postorder = []
+    for root in roots:
+      if root in visited:
+        continue
+      visited.add(root)
+      is_root_child[root.id + 1] = True
+      stack = [(root, iter(root.outgoing))]
+      while stack:
+        node, children = stack[-1]
+        for child in children:
+          if child not in visited:
+            visited.add(child)
+            stack.append((child, iter(child.outgoing)))
+            break
+        else:
+          stack.pop()
+          postorder.append(node.id + 1)
+    order = [0] + postorder[::-1]
+    number = [0] * len(order)
+    for i, pos in enumerate(order):
+      number[pos] = i
+    preds = [None]
+    for node in nodes:
+      node_preds = [n.id + 1 for n in node.incoming]
+      if is_root_child[node.id + 1]:
+        node_preds.append(0)
+      preds.append(node_preds)
+    idom = [None] * len(order)
+    idom[0] = 0
+    changed = True
+    while changed:
+      changed = False
+      for pos in order[1:]:
+        new_idom = None
+        for pred in preds[pos]:
+          if idom[pred] is None:
+            continue
+          if new_idom is None:
+            new_idom = pred
+            continue
+          while pred != new_idom:
+            while number[pred] > number[new_idom]:
+              pred = idom[pred]
+            while number[new_idom] > number[pred]:
+              new_idom = idom[new_idom]
+        if idom[pos] != new_idom:
+          idom[pos] = new_idom
+          changed = True
+    # Dominators come before the nodes they dominate in reverse postorder.
+    for pos in order[1:]:
+      self._Attach(pos, idom[pos], nodes[pos - 1])
+    self._valid = True
+
+  def FindConditionsBetween(self, start, finish):
+    """Find the nodes with conditions on all paths from finish to start.
+
+    Arguments:
+      start: A CFG node.
+      finish: A CFG node.
+
+    Returns:
+      The nodes with conditions, including start and finish, ordered from start
+      to finish. None if finish doesn't dominate start, in which case the
+      answer can't be read off the tree.
+    """
+    if not self._valid:
+      self._Rebuild()
+    s = start.id + 1
+    f = finish.id + 1
+    if not self._Dominates(f, s):
+      return None
+    depth = self._depth[f]
+    path = []
+    pos = self._conditioned[s]
+    while self._depth[pos] >= depth:
+      path.append(self._program.cfg_nodes[pos - 1])
+      pos = self._conditioned[self._parent[pos]]
+    return path
+
+
 class _PathFinder(object):
   """Finds a path between two nodes and collects nodes with conditions."""
 
-  def __init__(self):
-    self._solved_find_queries = {}
+  _cache_metric = metrics.MapCounter("cfg_path_finder_cache")
+  _dominator_metric = metrics.MapCounter("cfg_path_finder_dominator_tree")
+
+  def __init__(self, cache_size=None, dominator_tree=None):
+    """Initialize a path finder.
+
+    Arguments:
+      cache_size: The maximum number of queries to remember, or None.
+      dominator_tree: Optionally, a _DominatorTree to answer queries without
+        blocked nodes from.
+    """
+    self._solved_find_queries = _LruCache(cache_size, self._cache_metric)
+    self._dominator_tree = dominator_tree
 
   def FindAnyPathToNode(self, start, finish, blocked):
     """Determine whether we can reach a node at all.
@@ -808,9 +1230,17 @@ class _PathFinder(object):
       condition, that are on *all* paths from start to finish, ordered by when
       they occur on said path(s).
     """
+    if self._dominator_tree is not None and (
+        not blocked or (len(blocked) == 1 and finish in blocked)):
+      path = self._dominator_tree.FindConditionsBetween(start, finish)
+      if path is not None:
+        self._dominator_metric.inc("hit")
+        return True, path
+      self._dominator_metric.inc("miss")
     query = (start, finish, blocked)
-    if query in self._solved_find_queries:
-      return self._solved_find_queries[query]
+    result = self._solved_find_queries.Get(query)
+    if result is not None:
+      return result
     shortest_path = self.FindShortestPathToNode(start, finish, blocked)
     if shortest_path is None:
       result = False, ()
@@ -833,8 +1263,7 @@ class _PathFinder(object):
           break
         node = self.FindHighestReachableWeight(node, blocked, weights)
       result = True, path
-    # TODO(kramm): This dict can grow pretty big. Use a MRU cache?
-    self._solved_find_queries[query] = result
+    self._solved_find_queries.Put(query, result)
     return result
 
 
@@ -846,17 +1275,27 @@ class Solver(object):
   """
 
   _cache_metric = metrics.MapCounter("cfg_solver_cache")
+  _blocked_cache_metric = metrics.MapCounter("cfg_solver_blocked_cache")
   _goals_per_find_metric = metrics.Distribution("cfg_solver_goals_per_find")
 
-  def __init__(self, program):
+  def __init__(self, program, cache_size=None):
     """Initialize a solver instance. Every instance has their own cache.
 
     Arguments:
       program: The program we're in.
+      cache_size: The maximum number of solved states, and of path queries, to
+        remember. None means unbounded.
     """
     self.program = program
-    self._solved_states = {}
-    self._path_finder = _PathFinder()
+    # Goals are represented as masks of these bits. Bindings don't change
+    # while the solver is in use, so neither do the bits.
+    self._bits = _BindingBits()
+    self._solved_states = _LruCache(cache_size, self._cache_metric)
+    # Map from (pos, goals) to the nodes a state blocks. Reusing the frozensets
+    # also means their hashes are only computed once, for the path finder.
+    self._blocked = _LruCache(cache_size, self._blocked_cache_metric)
+    self._states_in_progress = set()
+    self._path_finder = _PathFinder(cache_size, program.dominator_tree)
 
   def Solve(self, start_attrs, start_node):
     """Try to solve the given problem.
@@ -874,43 +1313,67 @@ class Solver(object):
       this might only look for a partial path (i.e., a path that doesn't go
       back all the way to the entry point of the program).
     """
-    state = State(start_node, start_attrs)
-    return self._RecallOrFindSolution(state, frozenset(start_attrs))
+    goals = self._bits.Mask(start_attrs)
+    state = State(start_node, goals, self._bits)
+    return self._RecallOrFindSolution(state, goals)
 
   def _RecallOrFindSolution(self, state, seen_goals):
     """Memoized version of FindSolution()."""
-    if state in self._solved_states:
-      Solver._cache_metric.inc("hit")
-      return self._solved_states[state]
-
-    # To prevent infinite loops, we insert this state into the hashmap as a
-    # solvable state, even though we have not solved it yet. The reasoning is
+    # To prevent infinite loops, we treat states we're still solving as
+    # solvable, even though we have not solved them yet. The reasoning is
     # that if it's possible to solve this state at this level of the tree, it
-    # can also be solved in any of the children.
-    self._solved_states[state] = True
+    # can also be solved in any of the children. These are kept out of
+    # _solved_states, so that they can't be evicted.
+    if state in self._states_in_progress:
+      Solver._cache_metric.inc("hit")
+      return True
+    result = self._solved_states.Get(state)
+    if result is not None:
+      return result
 
-    Solver._cache_metric.inc("miss")
-    result = self._solved_states[state] = self._FindSolution(state, seen_goals)
+    self._states_in_progress.add(state)
+    try:
+      result = self._FindSolution(state, seen_goals)
+    finally:
+      self._states_in_progress.remove(state)
+    self._solved_states.Put(state, result)
     return result
 
+  def _GetBlocked(self, state):
+    key = (state.pos, state.goals)
+    blocked = self._blocked.Get(key)
+    if blocked is None:
+      blocked = state.NodesWithAssignments()
+      # We don't treat our current CFG node as blocked: If one of the goal
+      # variables is overwritten by an assignment at our current pos, we
+      # assume that assignment can still see the previous bindings.
+      # TODO(kramm): Is there a better way? See testConflict in cfg_test.py.
+      blocked.discard(state.pos)
+      blocked = frozenset(blocked)
+      self._blocked.Put(key, blocked)
+    return blocked
+
   def _FindSolution(self, state, seen_goals):
-    """Find a sequence of assignments that would solve the given state."""
+    """Find a sequence of assignments that would solve the given state.
+
+    Arguments:
+      state: The State to solve.
+      seen_goals: A mask of all the goals of this state and its ancestors.
+
+    Returns:
+      True if the state can be solved, False otherwise.
+    """
     if state.Done():
       return True
-    if _GoalsConflict(state.goals):
+    goals = self._bits.Bindings(state.goals)
+    if self._bits.Conflict(state.goals):
       return False
-    Solver._goals_per_find_metric.add(len(state.goals))
-    blocked = state.NodesWithAssignments()
-    # We don't treat our current CFG node as blocked: If one of the goal
-    # variables is overwritten by an assignment at our current pos, we assume
-    # that assignment can still see the previous bindings.
-    # TODO(kramm): Is there a better way? See testConflict in cfg_test.py.
-    blocked.discard(state.pos)
-    blocked = frozenset(blocked)
+    Solver._goals_per_find_metric.add(len(goals))
+    blocked = self._GetBlocked(state)
     # Find the goal cfg node that was assigned last.  Due to the fact that we
     # treat CFGs as DAGs, there's typically one unique cfg node with this
     # property.
-    for goal in state.goals:
+    for goal in goals:
       # "goal" is the assignment we're trying to find.
       for origin in goal.origins:
         path_exist, path = self._path_finder.FindNodeBackwards(
@@ -919,19 +1382,20 @@ class Solver(object):
           # This loop over multiple different combinations of origins is why
           # we need memoization of states.
           for source_set in origin.source_sets:
-            new_goals = set(state.goals)
+            new_goals = state.goals
             where = origin.where
             # If we found conditions on the way, see whether we need to add
             # any of them to our goals.
             for node in path:
-              if node.condition not in seen_goals:
+              condition = self._bits.Bit(node.condition)
+              if not seen_goals & condition:
                 # It can happen that node == state.pos, typically if the node
                 # we're calling HasCombination on has a condition. If so, we'll
                 # treat it like any other condition and add it to our goals.
-                new_goals.add(node.condition)
+                new_goals |= condition
                 where = node
                 break
-            new_state = State(where, new_goals)
+            new_state = State(where, new_goals, self._bits)
             if origin.where is new_state.pos:
               # The goal can only be replaced if origin.where was actually
               # reached.
@@ -940,8 +1404,8 @@ class Solver(object):
             # Also remove all goals that are trivially fulfilled at the
             # new CFG node.
             removed = new_state.RemoveFinishedGoals()
-            removed.add(goal)
-            if _GoalsConflict(removed):
+            removed |= self._bits.Bit(goal)
+            if self._bits.Conflict(removed):
               # Sometimes, we bulk-remove goals that are internally conflicting.
               return False
             if self._RecallOrFindSolution(new_state, seen_goals | new_goals):
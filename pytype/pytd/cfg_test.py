@@ -1,6 +1,9 @@
 """Test for the cfg Python extension module."""
 
+import gc
+import random
 import unittest
+from pytype import metrics
 from pytype.pytd import cfg
 import unittest
 
@@ -215,6 +218,31 @@ class CFGTest(unittest.TestCase):
     self.assertFalse(n2.CanHaveCombination([x1, y2]))
     self.assertFalse(n3.CanHaveCombination([x1, y2]))
 
+  def testCombinations(self):
+    # n1 -> n2 -> n4 (x = 1 or x = 2, at n2), n1 -> n3 -> n4 (y = 3, at n3)
+    p = cfg.Program()
+    n1 = p.NewCFGNode("n1")
+    n2 = n1.ConnectNew("n2")
+    n3 = n1.ConnectNew("n3")
+    n4 = p.NewCFGNode("n4")
+    n2.ConnectTo(n4)
+    n3.ConnectTo(n4)
+    x = p.NewVariable()
+    y = p.NewVariable()
+    x1 = x.AddBinding("1", source_set=[], where=n2)
+    x2 = x.AddBinding("2", source_set=[], where=n2)
+    y3 = y.AddBinding("3", source_set=[], where=n3)
+    combinations = [[], [x1], [x2, y3], [x1, x2], [y3, x1]]
+    for node in n1, n2, n3, n4:
+      self.assertEquals([node.HasCombination(c) for c in combinations],
+                        node.HasCombinations(combinations))
+    self.assertEquals([True, True, False, False, False],
+                      n4.HasCombinations(combinations))
+    self.assertEquals([], n4.HasCombinations([]))
+    # Bindings that are known to be (im)possible aren't checked again.
+    self.assertEquals([True, False, False, False, False],
+                      n4.HasCombinations(combinations, {x1: False}))
+
   def testPathFinder(self):
     # +-->n2--.       +--+
     # |       v       |  |
@@ -289,6 +317,68 @@ class CFGTest(unittest.TestCase):
     self.assertEquals((True, [n5, n4, n2]), f.FindNodeBackwards(n5, n2, ()))
     self.assertEquals((True, [n5, n4]), f.FindNodeBackwards(n5, n3, ()))
 
+  def testDominatorTree(self):
+    # n1 --> n2 --> n4 --> n5
+    #  |            ^ |
+    #  +---> n3 ----+ +--> n6
+    p = cfg.Program()
+    n1 = p.NewCFGNode("n1")
+    c = p.NewVariable().AddBinding("c", source_set=[], where=n1)
+    n2 = n1.ConnectNew("n2", c)
+    n3 = n1.ConnectNew("n3")
+    n4 = n2.ConnectNew("n4", c)
+    n5 = n4.ConnectNew("n5")
+    n6 = n4.ConnectNew("n6", c)
+    t = p.dominator_tree
+    self.assertEquals([n4, n2], t.FindConditionsBetween(n5, n1))
+    n3.ConnectTo(n4)  # n4 has outgoing edges, so this invalidates the tree.
+    self.assertEquals([n4], t.FindConditionsBetween(n5, n1))
+    self.assertEquals([n6, n4], t.FindConditionsBetween(n6, n4))
+    self.assertIsNone(t.FindConditionsBetween(n4, n2))
+    self.assertIsNone(t.FindConditionsBetween(n1, n5))
+    n5.ConnectTo(n1)  # An edge back to a dominator doesn't change anything.
+    self.assertEquals([], t.FindConditionsBetween(n5, n5))
+    self.assertEquals([n6], t.FindConditionsBetween(n6, n6))
+    n5.condition = c
+    self.assertEquals([n5, n4], t.FindConditionsBetween(n5, n1))
+
+  def testDominatorTreeRandomGraphs(self):
+    rand = random.Random(42)
+    for _ in range(50):
+      p = cfg.Program()
+      v = p.NewVariable()
+      nodes = [p.NewCFGNode()]
+      for _ in range(30):
+        condition = v.AddBinding("c") if rand.random() < 0.3 else None
+        r = rand.random()
+        if r < 0.5:
+          nodes.append(rand.choice(nodes).ConnectNew(condition=condition))
+        elif r < 0.8:
+          node = p.NewCFGNode(condition=condition)
+          for pred in rand.sample(nodes, min(len(nodes), rand.randint(1, 3))):
+            pred.ConnectTo(node)
+          nodes.append(node)
+        else:
+          rand.choice(nodes).ConnectTo(rand.choice(nodes))
+      # Compare both the incrementally built tree and a rebuilt one against
+      # brute force.
+      f = cfg._PathFinder()
+      for _ in range(2):
+        for start in nodes:
+          for finish in nodes:
+            path = p.dominator_tree.FindConditionsBetween(start, finish)
+            if path is None:
+              continue
+            self.assertItemsEqual(
+                [n for n in nodes if n.condition and (
+                    n in (start, finish) or
+                    not f.FindAnyPathToNode(start, finish, {n}))], path)
+            for i, node in enumerate(path):
+              for later in path[i + 1:]:
+                if later is not finish:
+                  self.assertFalse(f.FindAnyPathToNode(node, finish, {later}))
+        p.dominator_tree.Invalidate()
+
   def testConditionOnStartNode2(self):
     # Test that a condition on the initial node is tests.
     # At the time of writing this can not happen in pytype. The test guards
@@ -945,6 +1035,108 @@ class CFGTest(unittest.TestCase):
     x = p.NewVariable(["b"], [a], n2)
     self.assertIsNone(p.solver)
 
+  def testBindingBits(self):
+    p = cfg.Program()
+    n = p.NewCFGNode()
+    x = p.NewVariable()
+    y = p.NewVariable()
+    x1 = x.AddBinding(1, source_set=[], where=n)
+    x2 = x.AddBinding(2, source_set=[], where=n)
+    y1 = y.AddBinding(1, source_set=[], where=n)
+    bits = cfg._BindingBits()
+    self.assertEquals(0, bits.Mask([]))
+    self.assertEquals(0b11, bits.Mask([y1, x2]))
+    self.assertEquals(0b101, bits.Mask([y1, x1]))
+    self.assertEquals([y1, x2, x1], bits.Bindings(0b111))
+    self.assertEquals([], bits.Bindings(0))
+    self.assertFalse(bits.Conflict(bits.Mask([x1, y1])))
+    self.assertTrue(bits.Conflict(bits.Mask([x1, x2])))
+    self.assertTrue(bits.Conflict(bits.Mask([x1, x2, y1])))
+
+  def testLruCache(self):
+    metrics._prepare_for_test()  # pylint: disable=protected-access
+    try:
+      metric = metrics.MapCounter("test_lru_cache")
+      cache = cfg._LruCache(2, metric)  # pylint: disable=protected-access
+      cache.Put("a", 1)
+      cache.Put("b", 2)
+      self.assertEquals(1, cache.Get("a"))
+      cache.Put("c", 3)  # evicts "b", the least recently used entry
+      self.assertIsNone(cache.Get("b"))
+      self.assertEquals(1, cache.Get("a"))
+      self.assertEquals(3, cache.Get("c"))
+      self.assertEquals(2, len(cache))
+      self.assertEquals("test_lru_cache: 5 {eviction=1, hit=3, miss=1}",
+                        str(metric))
+    finally:
+      metrics._prepare_for_test(enabled=False)  # pylint: disable=protected-access
+
+  def testSolverCacheSize(self):
+    for cache_size in (None, 1):
+      p = cfg.Program(solver_cache_size=cache_size)
+      n1 = p.NewCFGNode("n1")
+      n2 = n1.ConnectNew("n2")
+      n2.ConnectTo(n1)
+      n3 = n2.ConnectNew("n3")
+      x = p.NewVariable()
+      a = x.AddBinding("a")
+      b = x.AddBinding("b")
+      c = p.NewVariable().AddBinding("c")
+      a.AddOrigin(n1, [b])
+      b.AddOrigin(n2, [a])
+      c.AddOrigin(n1, [])
+      self.assertTrue(n3.HasCombination([b]))
+      self.assertTrue(n3.HasCombination([b, c]))
+      self.assertFalse(n3.HasCombination([a]))
+      # pylint: disable=protected-access
+      solved_states = len(p.solver._solved_states)
+      solved_queries = len(p.solver._path_finder._solved_find_queries)
+      if cache_size:
+        self.assertEquals(1, solved_states)
+        self.assertEquals(1, solved_queries)
+      else:
+        self.assertGreater(solved_states, 1)
+        self.assertGreater(solved_queries, 1)
+
+  def testWeakNodeBindings(self):
+    p = cfg.Program(weak_node_bindings=True)
+    n1 = p.NewCFGNode("n1")
+    n2 = n1.ConnectNew("n2")
+    x = p.NewVariable()
+    a = x.AddBinding("a", source_set=[], where=n1)
+    y = p.NewVariable()
+    b = y.AddBinding("b", source_set=[a], where=n2)
+    self.assertItemsEqual([a], n1.bindings)
+    self.assertItemsEqual([b], n2.bindings)
+    self.assertTrue(n2.CanHaveCombination([a, b]))
+    del y, b
+    gc.collect()
+    self.assertItemsEqual([a], n1.bindings)
+    self.assertFalse(list(n2.bindings))
+    self.assertItemsEqual([x], p.variables)
+    self.assertTrue(n2.HasCombination([a]))
+
+  def testManyBindingsAndOrigins(self):
+    # Past _MAX_LINEAR_LOOKUP, bindings and origins are looked up in a dict.
+    p = cfg.Program()
+    nodes = [p.NewCFGNode("n%d" % i) for i in range(20)]
+    x = p.NewVariable()
+    data = [object() for _ in range(20)]
+    bindings = [x.AddBinding(d) for d in data]
+    for d, b in zip(data, bindings):
+      self.assertIs(b, x.AddBinding(d))
+    self.assertEquals(bindings, x.bindings)
+    b = bindings[0]
+    for n in nodes:
+      b.AddOrigin(n, [])
+    for n in nodes:
+      origin = b.FindOrigin(n)
+      self.assertIs(n, origin.where)
+      self.assertItemsEqual([cfg.SourceSet()], origin.source_sets)
+      self.assertIs(origin, b.FindOrigin(n))
+    self.assertEquals(20, len(b.origins))
+    self.assertIsNone(bindings[1].FindOrigin(nodes[0]))
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,229 @@
+"""An index over the class hierarchy of a set of modules.
+
+Matching types against each other (type_match), solving unknowns
+(convert_structural) and simplifying unions (optimize) all need to know which
+classes are sub- or superclasses of which. A ClassHierarchy computes this once,
+and then answers those queries with bit operations instead of walking the
+inheritance graph again.
+"""
+
+import logging
+
+from pytype.pytd import pytd
+from pytype.pytd import utils
+
+log = logging.getLogger(__name__)
+
+
+def _ParentName(t):
+  """Get the name of the class a base class type refers to, or None."""
+  if isinstance(t, pytd.GenericType):
+    t = t.base_type
+  if isinstance(t, pytd.ClassType) and t.cls:
+    # The name of the class is the complete name. (E.g. t.name might be "int"
+    # while t.cls.name is "__builtin__.int".)
+    return t.cls.name
+  elif isinstance(t, pytd.GENERIC_BASE_TYPE):
+    return t.name
+  else:
+    return None
+
+
+def _IterBits(bits):
+  """Yield the positions of the bits that are set in an int, lowest first."""
+  while bits:
+    low = bits & -bits
+    yield low.bit_length() - 1
+    bits ^= low
+
+
+class ClassHierarchy(object):
+  """Ancestors, descendants and MROs of classes, indexed by name.
+
+  Every class gets a topological id, with superclasses numbered before their
+  subclasses. The ancestors and descendants of a class are stored as bitsets
+  (Python ints) over these ids, so asking whether one class is a subclass of
+  another is a single bit test. The index doesn't change after construction.
+
+  Names the index doesn't know about are treated as classes without sub- or
+  superclasses.
+  """
+
+  def __init__(self, superclasses, classes=None):
+    """Construct.
+
+    Args:
+      superclasses: A dictionary, mapping class names to lists of the names of
+        their direct superclasses. Names that only appear as superclasses are
+        added as classes without superclasses of their own.
+      classes: Optionally, a dictionary mapping class names to pytd.Class, for
+        GetClass().
+    """
+    self._classes = classes or {}
+    self._parents = {}
+    for name, parents in superclasses.items():
+      self._parents[name] = tuple(parents)
+      for parent in parents:
+        self._parents.setdefault(parent, ())
+    self._names = self._Sort()
+    self._ids = {name: i for i, name in enumerate(self._names)}
+    parent_ids = [[self._ids[p] for p in self._parents[name]
+                   if self._ids[p] < i]  # skip edges that close a cycle
+                  for i, name in enumerate(self._names)]
+    self._ancestors = []
+    for i, parents in enumerate(parent_ids):
+      bits = 1 << i
+      for p in parents:
+        bits |= self._ancestors[p]
+      self._ancestors.append(bits)
+    self._descendants = [1 << i for i in range(len(self._names))]
+    for i in reversed(range(len(self._names))):
+      for p in parent_ids[i]:
+        self._descendants[p] |= self._descendants[i]
+    self._mros = []
+    for i, name in enumerate(self._names):
+      self._mros.append(self._ComputeMRO(name, parent_ids[i]))
+
+  @classmethod
+  def FromAsts(cls, asts):
+    """Build the hierarchy of all classes in asts and their superclasses.
+
+    Superclasses that live in other modules are followed through their
+    ClassType pointers, so their ancestors are part of the index, too.
+
+    Args:
+      asts: A list of pytd.TypeDeclUnit.
+
+    Returns:
+      A ClassHierarchy.
+    """
+    classes = {}
+    queue = [c for ast in asts for c in ast.classes]
+    while queue:
+      c = queue.pop()
+      if c.name in classes:
+        continue
+      classes[c.name] = c
+      for parent in c.parents:
+        if isinstance(parent, pytd.GenericType):
+          parent = parent.base_type
+        if isinstance(parent, pytd.ClassType) and parent.cls:
+          queue.append(parent.cls)
+    superclasses = {}
+    for name, c in classes.items():
+      parents = (_ParentName(p) for p in c.parents)
+      superclasses[name] = [p for p in parents if p is not None]
+    return cls(superclasses, classes)
+
+  def _Sort(self):
+    """Order all names topologically, superclasses first."""
+    order = []
+    done = set()
+    for name in sorted(self._parents):
+      # Iterative depth-first search, appending each class after its parents.
+      stack = [(name, iter(self._parents[name]))]
+      active = {name}
+      while stack:
+        current, parents = stack[-1]
+        for parent in parents:
+          if parent not in done and parent not in active:
+            stack.append((parent, iter(self._parents[parent])))
+            active.add(parent)
+            break
+        else:
+          stack.pop()
+          active.discard(current)
+          if current not in done:
+            done.add(current)
+            order.append(current)
+    return order
+
+  def _ComputeMRO(self, name, parent_ids):
+    parent_mros = [list(self._mros[p]) for p in parent_ids]
+    parents = [self._names[p] for p in parent_ids]
+    try:
+      return (name,) + tuple(utils.MROMerge(parent_mros + [parents]))
+    except utils.MROError:
+      log.warning("Can't compute the MRO of %s", name)
+      # Fall back to depth-first order.
+      return tuple(utils.Dedup([name] + sum(parent_mros, [])))
+
+  def __contains__(self, name):
+    return name in self._ids
+
+  def __len__(self):
+    return len(self._names)
+
+  def GetId(self, name):
+    """The topological id of a class. Superclasses have smaller ids."""
+    return self._ids[name]
+
+  def GetClass(self, name):
+    """The pytd.Class with the given name, or None."""
+    return self._classes.get(name)
+
+  def GetSuperClasses(self, name):
+    """The names of the direct superclasses of a class."""
+    return self._parents.get(name, ())
+
+  def GetMRO(self, name):
+    """The method resolution order of a class, starting with the class."""
+    if name in self._ids:
+      return self._mros[self._ids[name]]
+    return (name,)
+
+  def IsSubClass(self, name, base):
+    """Whether the class name is base, or a (transitive) subclass of it."""
+    if name not in self._ids or base not in self._ids:
+      return name == base
+    return bool(self._ancestors[self._ids[name]] >> self._ids[base] & 1)
+
+  def HasSubClassInSet(self, name, names):
+    """Whether a proper (transitive) subclass of name is in names."""
+    if name not in self._ids:
+      return False
+    i = self._ids[name]
+    bits = self._descendants[i] & ~(1 << i)
+    return any(n in self._ids and bits >> self._ids[n] & 1 for n in names)
+
+  def ExpandSuperClasses(self, name):
+    """Generate a set of all (known) superclasses for a type.
+
+    Arguments:
+      name: A type name. E.g. "int".
+
+    Returns:
+      A set of type names. This set includes name as well as all its
+      superclasses. For example, this will return "bool", "int" and "object"
+      for "bool".
+    """
+    if name not in self._ids:
+      return {name}
+    return {self._names[i]
+            for i in _IterBits(self._ancestors[self._ids[name]])}
+
+  def ExpandSubClasses(self, name):
+    """Generate a set of all (known) subclasses for a type.
+
+    Arguments:
+      name: A type name. E.g. "int".
+
+    Returns:
+      A set of type names. This set includes name as well as all its
+      subclasses. For example, this will return "int" and "bool" for "int".
+    """
+    return set(self.GetSubClassesInOrder(name))
+
+  def GetSubClassesInOrder(self, name):
+    """Like ExpandSubClasses, but as a list in topological order.
+
+    Arguments:
+      name: A type name.
+
+    Returns:
+      A list of type names, starting with name.
+    """
+    if name not in self._ids:
+      return [name]
+    return [self._names[i]
+            for i in _IterBits(self._descendants[self._ids[name]])]
@@ -0,0 +1,96 @@
+"""Tests for class_hierarchy.py."""
+
+import textwrap
+
+
+from pytype.pyi import parser
+from pytype.pytd import class_hierarchy
+from pytype.pytd.parse import visitors
+import unittest
+
+
+class ClassHierarchyTest(unittest.TestCase):
+  """Tests for ClassHierarchy."""
+
+  def setUp(self):
+    # A diamond: bool and Fraction are both Numbers, bool is also an int.
+    self.hierarchy = class_hierarchy.ClassHierarchy({
+        "object": [],
+        "Number": ["object"],
+        "int": ["Number"],
+        "Fraction": ["Number"],
+        "bool": ["int", "Fraction"],
+        "str": ["object"],
+    })
+
+  def testIds(self):
+    self.assertEquals(6, len(self.hierarchy))
+    for name in ("Number", "int", "Fraction", "bool", "str"):
+      for parent in self.hierarchy.GetSuperClasses(name):
+        self.assertLess(self.hierarchy.GetId(parent),
+                        self.hierarchy.GetId(name))
+
+  def testIsSubClass(self):
+    self.assertTrue(self.hierarchy.IsSubClass("bool", "object"))
+    self.assertTrue(self.hierarchy.IsSubClass("bool", "Fraction"))
+    self.assertTrue(self.hierarchy.IsSubClass("int", "int"))
+    self.assertFalse(self.hierarchy.IsSubClass("int", "bool"))
+    self.assertFalse(self.hierarchy.IsSubClass("str", "Number"))
+    self.assertTrue(self.hierarchy.IsSubClass("unknown", "unknown"))
+    self.assertFalse(self.hierarchy.IsSubClass("unknown", "object"))
+
+  def testHasSubClassInSet(self):
+    self.assertTrue(self.hierarchy.HasSubClassInSet("Number", {"bool"}))
+    self.assertTrue(self.hierarchy.HasSubClassInSet("object", {"str", "x"}))
+    self.assertFalse(self.hierarchy.HasSubClassInSet("int", {"int"}))
+    self.assertFalse(self.hierarchy.HasSubClassInSet("int", {"Fraction"}))
+    self.assertFalse(self.hierarchy.HasSubClassInSet("unknown", {"bool"}))
+
+  def testExpand(self):
+    self.assertSetEqual({"bool", "int", "Fraction", "Number", "object"},
+                        self.hierarchy.ExpandSuperClasses("bool"))
+    self.assertSetEqual({"Number", "int", "Fraction", "bool"},
+                        self.hierarchy.ExpandSubClasses("Number"))
+    self.assertSetEqual({"unknown"},
+                        self.hierarchy.ExpandSuperClasses("unknown"))
+    self.assertSetEqual({"unknown"},
+                        self.hierarchy.ExpandSubClasses("unknown"))
+    self.assertEquals("Number",
+                      self.hierarchy.GetSubClassesInOrder("Number")[0])
+
+  def testMRO(self):
+    self.assertEquals(("bool", "int", "Fraction", "Number", "object"),
+                      self.hierarchy.GetMRO("bool"))
+    self.assertEquals(("unknown",), self.hierarchy.GetMRO("unknown"))
+
+  def testInconsistentMRO(self):
+    hierarchy = class_hierarchy.ClassHierarchy({
+        "A": [], "B": ["A"], "C": ["A", "B"]})
+    self.assertEquals(("C", "A", "B"), hierarchy.GetMRO("C"))
+
+  def testCycle(self):
+    hierarchy = class_hierarchy.ClassHierarchy({"A": ["B"], "B": ["A"]})
+    self.assertEquals(2, len(hierarchy))
+    self.assertNotEquals(hierarchy.IsSubClass("A", "B"),
+                         hierarchy.IsSubClass("B", "A"))
+
+  def testFromAsts(self):
+    builtins = parser.parse_string(textwrap.dedent("""
+      class object: ...
+      class int(object): ...
+    """), name="__builtin__")
+    ast = parser.parse_string(textwrap.dedent("""
+      class A(int): ...
+      class B(A): ...
+    """))
+    ast = visitors.LookupClasses(ast, builtins)
+    # Classes in other modules are found through the class pointers.
+    hierarchy = class_hierarchy.ClassHierarchy.FromAsts([ast])
+    self.assertEquals(("B", "A", "__builtin__.int",
+                       "__builtin__.object"), hierarchy.GetMRO("B"))
+    self.assertIs(ast.Lookup("B"), hierarchy.GetClass("B"))
+    self.assertIsNone(hierarchy.GetClass("bar"))
+
+
+if __name__ == "__main__":
+  unittest.main()
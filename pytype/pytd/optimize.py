@@ -28,6 +28,7 @@ import logging
 
 from pytype.pytd import abc_hierarchy
 from pytype.pytd import booleq
+from pytype.pytd import class_hierarchy
 from pytype.pytd import pytd
 from pytype.pytd import type_match
 from pytype.pytd import utils
@@ -84,7 +85,7 @@ class RemoveRedundantSignatures(visitors.Visitor):
 
   def __init__(self, hierarchy):
     super(RemoveRedundantSignatures, self).__init__()
-    self.match = type_match.TypeMatch(hierarchy.GetSuperClasses(),
+    self.match = type_match.TypeMatch(hierarchy=hierarchy.GetIndex(),
                                       any_also_is_bottom=False)
     self.subst = {}
 
@@ -490,25 +491,14 @@ class SuperClassHierarchy(object):
 
   def __init__(self, superclasses):
     self._superclasses = superclasses
-    self._subclasses = abc_hierarchy.Invert(self._superclasses)
+    self._index = class_hierarchy.ClassHierarchy(superclasses)
 
   def GetSuperClasses(self):
     return self._superclasses
 
-  def _CollectSuperclasses(self, type_name, collect):
-    """Recursively collect super classes for a type.
-
-    Arguments:
-      type_name: A string, the type's name.
-      collect: A set() of strings, modified to contain all superclasses.
-    """
-    collect.add(type_name)
-    superclasses = [name
-                    for name in self._superclasses.get(type_name, [])]
-
-    # The superclasses might have superclasses of their own, so recurse.
-    for superclass in superclasses:
-      self._CollectSuperclasses(superclass, collect)
+  def GetIndex(self):
+    """The class_hierarchy.ClassHierarchy over the superclasses."""
+    return self._index
 
   def ExpandSuperClasses(self, t):
     """Generate a list of all (known) superclasses for a type.
@@ -520,9 +510,7 @@ class SuperClassHierarchy(object):
       A set of types. This set includes t as well as all its superclasses. For
       example, this will return "bool", "int" and "object" for "bool".
     """
-    superclasses = set()
-    self._CollectSuperclasses(t, superclasses)
-    return superclasses
+    return self._index.ExpandSuperClasses(t)
 
   def ExpandSubClasses(self, t):
     """Generate a set of all (known) subclasses for a type.
@@ -534,19 +522,15 @@ class SuperClassHierarchy(object):
       A set of types. This set includes t as well as all its subclasses. For
       example, this will return "int" and "bool" for "int".
     """
-    queue = [t]
-    seen = set()
-    while queue:
-      item = queue.pop()
-      if item not in seen:
-        seen.add(item)
-        queue.extend(self._subclasses[item])
-    return seen
+    return self._index.ExpandSubClasses(t)
+
+  def IsSubClass(self, t, base):
+    """Whether the type name t is base or a (transitive) subclass of it."""
+    return self._index.IsSubClass(t, base)
 
   def HasSubClassInSet(self, cls, known):
     """Queries whether a subclass of a type is present in a given set."""
-    return any(sub in known
-               for sub in self._subclasses[cls])
+    return self._index.HasSubClassInSet(cls, known)
 
   def HasSuperClassInSet(self, cls, known):
     """Queries whether a superclass of a type is present in a given set."""
@@ -572,15 +556,15 @@ class SimplifyUnionsWithSuperclasses(visitors.Visitor):
     self.hierarchy = hierarchy
 
   def VisitUnionType(self, union):
-    c = collections.Counter()
-    for t in set(union.type_list):
-      # TODO(rechen): How can we make this work with GenericType?
-      if isinstance(t, pytd.GENERIC_BASE_TYPE):
-        c += collections.Counter(self.hierarchy.ExpandSubClasses(str(t)))
-    # Below, c[str[t]] can be zero - that's the default for non-existent items
-    # in collections.Counter. It'll happen for types that are not
-    # instances of GENERIC_BASE_TYPE, like container types.
-    new_type_list = [t for t in union.type_list if c[str(t)] <= 1]
+    # TODO(rechen): How can we make this work with GenericType?
+    names = {str(t) for t in union.type_list
+             if isinstance(t, pytd.GENERIC_BASE_TYPE)}
+    # Types that are not instances of GENERIC_BASE_TYPE, like container types,
+    # are never subclasses of anything in the hierarchy, so they're kept.
+    new_type_list = [
+        t for t in union.type_list
+        if not any(self.hierarchy.IsSubClass(str(t), name)
+                   for name in names if name != str(t))]
     return utils.JoinTypes(new_type_list)
 
 
@@ -67,10 +67,9 @@ def GetBuiltinsAndTyping():
                                           "__builtin__": b}))
     t.Visit(visitors.FillInModuleClasses({"": t, "typing": t,
                                           "__builtin__": b}))
-    b.Visit(visitors.VerifyLookup())
-    t.Visit(visitors.VerifyLookup())
-    b.Visit(visitors.VerifyContainers())
-    t.Visit(visitors.VerifyContainers())
+    for ast in (b, t):
+      visitors.VisitorPipeline([visitors.VerifyLookup(),
+                                visitors.VerifyContainers()]).Run(ast)
     _cached_builtins_pytd = b, t
   return _cached_builtins_pytd
 
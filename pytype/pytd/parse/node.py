@@ -351,3 +351,93 @@ def _VisitNode(node, visitor, *args, **kwargs):
 
   del visitor.old_node
   return new_node
+
+
+class Interner(object):
+  """Shares a single instance between structurally equal nodes.
+
+  Intern() rebuilds a tree bottom-up, and replaces every node that is equal to
+  one it has seen before by the earlier one. Since the children of a node are
+  interned first, nodes are keyed on their class and the identity of their
+  children, so interning never hashes or compares whole subtrees. Comparing
+  interned trees mostly hits the identity checks in __eq__ and in tuple
+  comparison.
+
+  Only nodes without instance attributes are immutable, and shared. A node
+  class with instance attributes can still be shared by defining InternKey(),
+  which returns a key for the node, or None. See pytd.ClassType.
+
+  The Interner keeps all nodes it has seen alive, so it should live as long
+  as the trees it was used on, e.g. as long as a load_pytd.Loader.
+  """
+
+  def __init__(self):
+    self._nodes = {}
+
+  def __len__(self):
+    return len(self._nodes)
+
+  def Intern(self, tree):
+    """Return a tree equal to the given one, made of shared nodes.
+
+    Args:
+      tree: A node. Not modified.
+
+    Returns:
+      The interned tree. Nodes are only rebuilt if their children changed.
+    """
+    return self._Intern(tree, {})[0]
+
+  def _Share(self, key, value):
+    return self._nodes.setdefault(key, value)
+
+  def _Intern(self, value, memo):
+    """Intern a value.
+
+    Args:
+      value: A node, tuple or leaf value.
+      memo: A dictionary from the ids of values that were already interned in
+        this tree to the result of _Intern.
+
+    Returns:
+      A tuple of the interned value, and whether it's shared. Values that
+      aren't shared can't be part of the key of their parent.
+    """
+    value_id = id(value)
+    if value_id in memo:
+      return memo[value_id]
+    value_class = value.__class__
+    if not isinstance(value, tuple):
+      try:
+        result = self._Share((value_class, value), value), True
+      except TypeError:  # unhashable
+        result = value, False
+    elif (value_class is not tuple and
+          value.VisitNode.im_func is not _VisitNode):
+      # Node with an overloaded VisitNode(), e.g. a lazily resolved module.
+      result = value, False
+    elif hasattr(value, "InternKey"):
+      key = value.InternKey()
+      if key is None:
+        result = value, False
+      else:
+        result = self._Share((value_class, key), value), True
+    else:
+      children = [self._Intern(child, memo) for child in value]
+      new_value = value
+      if any(new is not old for (new, _), old in zip(children, value)):
+        new_children = [new for new, _ in children]
+        if value_class is tuple:
+          new_value = tuple(new_children)
+        else:
+          new_value = _CreateUnchecked(value_class, *new_children)
+      # namedtuple defines a __dict__ property, so check whether instances
+      # actually have a dictionary.
+      if (all(shared for _, shared in children) and
+          not value_class.__dictoffset__):
+        key = (value_class,) + tuple(id(new) for new, _ in children)
+        result = self._Share(key, new_value), True
+      else:
+        result = new_value, False
+    memo[value_id] = result
+    return result
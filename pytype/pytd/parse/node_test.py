@@ -63,6 +63,11 @@ class XY(node.Node("x", "y")):
   pass
 
 
+class Slotted(node.Node("x", "y")):
+  """Node without instance attributes, which node.Interner shares."""
+  __slots__ = ()
+
+
 class NodeWithVisit(node.Node("x", "y")):
   """A node with its own VisitNode function."""
 
@@ -217,6 +222,28 @@ class TestNode(unittest.TestCase):
     for p in itertools.permutations(nodes):
       self.assertEquals(list(sorted(p)), nodes)
 
+  def testIntern(self):
+    interner = node.Interner()
+    tree = Slotted((Slotted(1, "a"), Slotted(1, "a")), X(Slotted(1, "a"), 2))
+    interned = interner.Intern(tree)
+    self.assertEquals(tree, interned)
+    (a1, a2), x = interned
+    self.assertIs(a1, a2)
+    # X has instance attributes, so it's rebuilt, but not shared.
+    self.assertIs(a1, x.a)
+    self.assertIsNot(x, interner.Intern(X(Slotted(1, "a"), 2)))
+    # Interning the same tree again returns it unchanged.
+    self.assertIs(interned.x, interner.Intern(tree).x)
+    self.assertIs(a1, interner.Intern(Slotted(1, "a")))
+    self.assertIsNot(a1, interner.Intern(Slotted(1, "b")))
+    self.assertIsNot(a1, interner.Intern(Slotted(True, "a")))
+
+  def testInternUnchanged(self):
+    interner = node.Interner()
+    tree = Slotted((1, 2), "a")
+    self.assertIs(tree, interner.Intern(tree))
+    self.assertIs(tree, interner.Intern(Slotted((1, 2), "a")))
+
   def testPrecondition(self):
     class MyNode(node.Node("s: str")):
       pass
@@ -20,8 +20,10 @@ import collections
 import itertools
 import logging
 import re
+import time
 
 
+from pytype import metrics
 from pytype import utils
 from pytype.pytd import pytd
 from pytype.pytd.parse import parser_constants  # pylint: disable=g-importing-member
@@ -64,12 +66,13 @@ def _FindNodeClasses():
 
 _IGNORED_TYPENAMES = set(["str", "bool", "NoneType"])
 _ancestor_map = None  # Memoized ancestors map.
+_recursive_node_names = None  # Node classes that can appear below themselves.
 
 
 def _GetAncestorMap():
   """Return a map of node class names to a set of ancestor class names."""
 
-  global _ancestor_map
+  global _ancestor_map, _recursive_node_names
   if _ancestor_map is None:
     # Map from name to _NodeClassInfo.
     node_classes = {i.name: i for i in _FindNodeClasses()}
@@ -93,9 +96,20 @@ def _GetAncestorMap():
     # Convert predecessors keys and values to use names instead of info objects.
     _ancestor_map = {
         k.name: {n.name for n in v} for k, v in predecessors.items()}
+    _recursive_node_names = {
+        info.name for info in node_classes.values()
+        if any(child in predecessors[info] for child in info.outgoing)}
   return _ancestor_map
 
 
+def _CanContain(outer, inner):
+  """Whether a node of class outer can have a node of class inner below it."""
+  ancestors = _GetAncestorMap()
+  if outer == inner:
+    return outer in _recursive_node_names
+  return outer in ancestors[inner]
+
+
 class Visitor(object):
   """Base class for visitors.
 
@@ -193,6 +207,177 @@ class Visitor(object):
     self.leave_functions[node.__class__.__name__](self, node, *args, **kwargs)
 
 
+def _HandledNames(functions):
+  # Every visitor has an entry for "", from the generic Enter/Visit/Leave.
+  return {name for name in functions if name}
+
+
+def _StagesConflict(first, second):
+  """Whether two visitors can't share a traversal.
+
+  In a shared traversal, both visitors are called on a node before the
+  traversal moves on, so the second one sees the nodes the first one replaced
+  (in Visit<Name>) or modified in place (in Enter<Name> or Leave<Name>) below
+  and at the current node, but not above it; and the first one sees what the
+  second one did below the current node. That is the same as running them one
+  after the other unless the node classes they handle are nested the wrong
+  way. A Visit<Name> function is assumed to return a node that can only contain
+  the node classes a <Name> can contain.
+
+  Args:
+    first: The visitor that would run first on its own.
+    second: The visitor that would run second.
+
+  Returns:
+    True if the visitors have to run in separate traversals.
+  """
+  for visitor in (first, second):
+    if (visitor.visits_all_node_types or
+        visitor.visit_class_names is ALL_NODE_NAMES):
+      return True
+  first_visit = _HandledNames(first.visit_functions)
+  first_enter = _HandledNames(first.enter_functions)
+  first_leave = _HandledNames(first.leave_functions)
+  second_visit = _HandledNames(second.visit_functions)
+  second_enter = _HandledNames(second.enter_functions)
+  second_leave = _HandledNames(second.leave_functions)
+  for x in first_visit:
+    # The first visitor would see the second one's replacements below x.
+    if any(_CanContain(x, y)
+           for y in second_visit | second_enter | second_leave):
+      return True
+    # The second visitor would see nodes the first one hasn't replaced yet.
+    if any(x == y or _CanContain(y, x) for y in second_enter | second_leave):
+      return True
+  for x in first_enter | first_leave:
+    # The second visitor would enter x's ancestors before x is modified.
+    if any(_CanContain(y, x) for y in second_enter):
+      return True
+  for x in first_leave:
+    # The second visitor would enter x before the first one leaves it, and the
+    # first one would leave x after the second one modified nodes below it.
+    if any(x == y for y in second_enter):
+      return True
+    if any(_CanContain(x, y) for y in second_enter | second_leave):
+      return True
+  return False
+
+
+class _FusedVisitor(Visitor):
+  """Runs several visitors in a single traversal. See VisitorPipeline."""
+
+  def __init__(self, stages):  # pylint: disable=super-init-not-called
+    self.stages = stages
+    self.seconds = [0.0] * len(stages)
+    # For each stage, the node whose Enter<Name> returned False, if any. The
+    # stage skips that node and everything below it.
+    self._stopped_at = [None] * len(stages)
+    self.unchecked_node_names = set()
+    self.visit_class_names = set()
+    enter_names = set()
+    visit_names = set()
+    for stage in stages:
+      self.unchecked_node_names.update(stage.unchecked_node_names)
+      self.visit_class_names.update(stage.visit_class_names)
+      enter_names.update(stage.enter_functions)
+      visit_names.update(stage.visit_functions)
+      visit_names.update(stage.leave_functions)
+    # _VisitNode only looks at the keys. Visit() runs the stages' Visit<Name>
+    # and Leave<Name> functions, in order, and Leave() restarts stopped stages.
+    self.enter_functions = dict.fromkeys(enter_names)
+    self.visit_functions = dict.fromkeys(visit_names)
+    self.leave_functions = dict.fromkeys(enter_names)
+
+  def Enter(self, node, *args, **kwargs):
+    name = node.__class__.__name__
+    for i, stage in enumerate(self.stages):
+      if self._stopped_at[i] is None and name in stage.enter_functions:
+        start = time.clock()
+        status = stage.Enter(node, *args, **kwargs)
+        self.seconds[i] += time.clock() - start
+        if status is False:
+          self._stopped_at[i] = node
+        else:
+          assert status is None, repr((name, status))
+
+  def Visit(self, node, *args, **kwargs):
+    old_node = self.old_node
+    old_name = old_node.__class__.__name__
+    for i, stage in enumerate(self.stages):
+      if self._stopped_at[i] is not None:
+        continue
+      visit = node.__class__.__name__ in stage.visit_functions
+      leave = old_name in stage.leave_functions
+      if not visit and not leave:
+        continue
+      start = time.clock()
+      if visit:
+        stage.old_node = old_node
+        node = stage.Visit(node, *args, **kwargs)
+        del stage.old_node
+      if leave:
+        stage.Leave(old_node, *args, **kwargs)
+      self.seconds[i] += time.clock() - start
+    return node
+
+  def Leave(self, node, *args, **kwargs):
+    for i, stopped_at in enumerate(self._stopped_at):
+      if stopped_at is node:
+        self._stopped_at[i] = None
+
+
+class VisitorPipeline(object):
+  """Runs visitors one after the other, fusing their traversals if possible.
+
+  Consecutive visitors share a traversal if neither of them would notice, i.e.
+  if they don't replace or modify node classes that are nested in the ones the
+  other handles, according to the preconditions of the nodes. Like every
+  visitor, a shared traversal skips subtrees that contain no node class any of
+  its visitors handles. The time spent in the callbacks of each visitor is
+  recorded in the same visit_<Visitor> metric a separate traversal records.
+
+  Visitors that override Enter, Visit or Leave, or visit all node types, always
+  get their own traversal. Visitors that look at other parts of the tree than
+  the nodes they're called on, e.g. by following ClassType pointers like
+  VerifyContainers does, mustn't be put in a pipeline after the ones that
+  change those parts.
+  """
+
+  def __init__(self, stages):
+    """Create the pipeline.
+
+    Args:
+      stages: A list of visitors, in the order they have to run.
+    """
+    self.groups = []
+    for stage in stages:
+      if self.groups and not any(_StagesConflict(previous, stage)
+                                 for previous in self.groups[-1]):
+        self.groups[-1].append(stage)
+      else:
+        self.groups.append([stage])
+
+  def Run(self, node):
+    """Run all visitors on a tree.
+
+    Args:
+      node: The tree.
+
+    Returns:
+      The result of the last visitor.
+    """
+    for group in self.groups:
+      if len(group) == 1:
+        node = node.Visit(group[0])
+        continue
+      fused = _FusedVisitor(group)
+      node = node.Visit(fused)
+      for stage, seconds in zip(group, fused.seconds):
+        metrics.get_metric("visit_" + type(stage).__name__,
+                           metrics.Distribution).add(seconds)
+    return node
+
+
 def InventStarArgParams(existing_names):
   """Try to find names for *args, **kwargs that aren't taken already."""
   names = {x if isinstance(x, str) else x.name
@@ -815,8 +1000,8 @@ def LookupClasses(target, global_module=None):
     global_module = target
   elif isinstance(target, pytd.TypeDeclUnit):
     module_map[""] = target
-  target.Visit(FillInModuleClasses(module_map, fallback=global_module))
-  target.Visit(VerifyLookup())
+  VisitorPipeline([FillInModuleClasses(module_map, fallback=global_module),
+                   VerifyLookup()]).Run(target)
   return target
 
 
@@ -1813,7 +1998,7 @@ class VerifyContainers(Visitor):
     ContainerError: If a problematic container definition is encountered.
   """
 
-  def EnterGenericType(self, node):
+  def LeaveGenericType(self, node):
     if not pytd.IsContainer(node.base_type.cls):
       raise ContainerError("Class %s is not a container" % node.base_type.name)
     elif node.base_type.name == "typing.Generic":
@@ -1828,11 +2013,11 @@ class VerifyContainers(Visitor):
             "Too many parameters on %s: expected %s, got %s" % (
                 node.base_type.name, max_param_count, actual_param_count))
 
-  def EnterCallableType(self, node):
-    self.EnterGenericType(node)
+  def LeaveCallableType(self, node):
+    self.LeaveGenericType(node)
 
-  def EnterTupleType(self, node):
-    self.EnterGenericType(node)
+  def LeaveTupleType(self, node):
+    self.LeaveGenericType(node)
 
 
 class ExpandCompatibleBuiltins(Visitor):
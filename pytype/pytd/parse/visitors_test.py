@@ -17,6 +17,7 @@
 import textwrap
 
 
+from pytype import metrics
 from pytype.pytd import pytd
 from pytype.pytd.parse import builtins as parser_builtins
 from pytype.pytd.parse import parser_test_base
@@ -797,6 +798,97 @@ class TestAncestorMap(unittest.TestCase):
     self.assertNotIn("NothingType", named_type)
     self.assertNotIn("AnythingType", named_type)
 
+  def testCanContain(self):
+    self.assertTrue(visitors._CanContain("Function", "Parameter"))
+    self.assertFalse(visitors._CanContain("Parameter", "Class"))
+    # A union can contain a generic type that contains another union.
+    self.assertTrue(visitors._CanContain("UnionType", "UnionType"))
+    self.assertFalse(visitors._CanContain("ClassType", "ClassType"))
+
+
+class VisitorPipelineTest(parser_test_base.ParserTest):
+  """Tests for VisitorPipeline."""
+
+  def _GetGroups(self, pipeline):
+    return [[type(stage) for stage in group] for group in pipeline.groups]
+
+  def testGroups(self):
+    b, _ = parser_builtins.GetBuiltinsAndTyping()
+    pipeline = visitors.VisitorPipeline([
+        visitors.FillInModuleClasses({}),
+        visitors.VerifyLookup(),
+        visitors.VerifyContainers(),
+        visitors.LookupBuiltins(b),
+        visitors.ExpandCompatibleBuiltins(b)])
+    self.assertEquals([[visitors.FillInModuleClasses, visitors.VerifyLookup,
+                        visitors.VerifyContainers],
+                       [visitors.LookupBuiltins],
+                       [visitors.ExpandCompatibleBuiltins]],
+                      self._GetGroups(pipeline))
+
+  def testNoFusionWithGenericVisit(self):
+    pipeline = visitors.VisitorPipeline([
+        visitors.VerifyLookup(), visitors.PrintVisitor()])
+    self.assertEquals([[visitors.VerifyLookup], [visitors.PrintVisitor]],
+                      self._GetGroups(pipeline))
+
+  def testSameResult(self):
+    src = textwrap.dedent("""
+        class A(B):
+            def f(self, x: A or B) -> foo.Foo[A]
+        class B(foo.Bar):
+            pass
+        def g(x: A) -> A or foo.Bar
+    """)
+    stages = lambda: [visitors.LookupLocalTypes(),
+                      visitors.NamedTypeToClassType()]
+    pipeline = visitors.VisitorPipeline(stages())
+    self.assertEquals(1, len(pipeline.groups))
+    tree = self.Parse(src)
+    expected = tree
+    for stage in stages():
+      expected = expected.Visit(stage)
+    self.assertTrue(expected.ASTeq(pipeline.Run(tree)))
+
+  def testEnterReturnsFalse(self):
+
+    class SkipClasses(visitors.Visitor):
+
+      def __init__(self):
+        super(SkipClasses, self).__init__()
+        self.names = set()
+
+      def EnterClass(self, _):
+        return False
+
+      def EnterNamedType(self, node):
+        self.names.add(node.name)
+
+    src = textwrap.dedent("""
+        class A(object):
+            def f(self) -> foo.Foo
+        def g() -> bar.Bar
+    """)
+    skip = SkipClasses()
+    deps = visitors.CollectDependencies()
+    pipeline = visitors.VisitorPipeline([skip, deps])
+    self.assertEquals(1, len(pipeline.groups))
+    pipeline.Run(self.Parse(src))
+    self.assertEquals({"bar.Bar"}, skip.names)
+    self.assertEquals({"foo", "bar"}, deps.modules)
+
+  def testMetrics(self):
+    metrics._prepare_for_test()  # pylint: disable=protected-access
+    try:
+      ast = self.ParseWithBuiltins("def f(x: int) -> list[str]")
+      visitors.VisitorPipeline([visitors.VerifyLookup(),
+                                visitors.VerifyContainers()]).Run(ast)
+      for name in "VerifyLookup", "VerifyContainers":
+        metric = metrics.get_metric("visit_" + name, metrics.Distribution)
+        self.assertIn("count=1,", str(metric))
+    finally:
+      metrics._prepare_for_test(enabled=False)  # pylint: disable=protected-access
+
 
 class ReplaceWithAnyReferenceVisitorTest(unittest.TestCase):
 
@@ -347,6 +347,17 @@ class ClassType(node.Node('name: str'), Type):
   # __eq__ is inherited (using tuple equality + requiring the two classes
   #                      be the same)
 
+  def InternKey(self):
+    """Key for node.Interner, which would otherwise not share this node.
+
+    A fully qualified name always resolves to the same class, so ClassTypes
+    with such a name can share the cls pointer that is filled in later.
+
+    Returns:
+      The name, if it's fully qualified, and None otherwise.
+    """
+    return self.name if '.' in self.name else None
+
   def __str__(self):
     return str(self.cls.name) if self.cls else self.name
 
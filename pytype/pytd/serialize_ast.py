@@ -3,13 +3,45 @@
 Used to speed up module importing. This is done by loading the ast and
 serializing it to disk. Further users only need to read the serialized data from
 disk, which is faster to digest than a pyi file.
+
+Every top-level member of the module (class, function, constant or alias) is
+pickled separately, followed by an index of the members. The file is mapped
+into memory when it's loaded, and a member is only unpickled when it's looked
+up, so importing a big module costs time proportional to the number of names
+that are actually used:
+
+  _MAGIC
+  offset of the index (8 bytes, big-endian)
+  pickled member 1
+  ...
+  pickled member n
+  pickled index
 """
+
+import cPickle
+import mmap
+import struct
+
+from pytype import metrics
 from pytype.pytd import pytd
 from pytype.pytd import utils
 from pytype.pytd.parse import builtins as pytd_builtins
 from pytype.pytd.parse import visitors
 
 
+# Change this whenever the format of the index changes.
+_MAGIC = "PYTD_INDEXED_AST_1\n"
+_OFFSET_FORMAT = ">Q"
+_OFFSET_SIZE = struct.calcsize(_OFFSET_FORMAT)
+
+# The fields of a TypeDeclUnit that are indexed, in the order of the fields.
+_MEMBER_FIELDS = ("constants", "classes", "functions", "aliases")
+
+
+_members_loaded = metrics.Counter("pickled_ast_members_loaded")
+_asts_materialized = metrics.Counter("pickled_asts_materialized")
+
+
 class UnrestorableDependencyError(Exception):
   """If a dependency can't be restored in the current state."""
 
@@ -120,16 +152,8 @@ class RenameModuleVisitor(visitors.Visitor):
   VisitNamedType = _ReplaceModuleName  # pylint: disable=invalid-name
 
 
-def StoreAst(ast, filename):
-  """Loads and stores an ast to disk.
-
-  Args:
-    ast: The pytd.TypeDeclUnit to save to disk.
-    filename: The filename for the pickled output
-
-  Returns:
-    True iff the save operation was successful.
-  """
+def _PrepareForStorage(ast):
+  """Rename a module's __init__ and clear its external references."""
   if ast.name.endswith(".__init__"):
     ast = ast.Visit(RenameModuleVisitor(
         ast.name, ast.name.rsplit(".__init__", 1)[0]))
@@ -140,15 +164,355 @@ def StoreAst(ast, filename):
 
   # Clean external references
   ast.Visit(visitors.ClearClassPointers())
+  return ast, dependencies
+
+
+def StoreAst(ast, filename):
+  """Loads and stores an ast to disk.
+
+  Args:
+    ast: The pytd.TypeDeclUnit to save to disk.
+    filename: The filename for the pickled output
+
+  Returns:
+    True iff the save operation was successful.
+  """
+  ast, dependencies = _PrepareForStorage(ast)
   indexer = FindClassTypesVisitor()
   ast.Visit(indexer)
-  serializable_ast = SerializableAst(
-      ast, dependencies, indexer.class_type_nodes)
-
-  utils.SavePickle(serializable_ast, filename)
+  prefix = ast.name + "."
+  external_types = sorted({node.name for node in indexer.class_type_nodes
+                           if not node.name.startswith(prefix)})
+
+  members = []
+  offset = len(_MAGIC) + _OFFSET_SIZE
+  with open(filename, "wb") as fi:
+    fi.write(_MAGIC)
+    fi.write("\0" * _OFFSET_SIZE)  # placeholder for the offset of the index
+    for field in _MEMBER_FIELDS:
+      for member in getattr(ast, field):
+        data = utils.DumpPickle(member)
+        fi.write(data)
+        members.append((field, member.name, offset, offset + len(data)))
+        offset += len(data)
+    index = {"name": ast.name,
+             "dependencies": dependencies,
+             "type_params": ast.type_params,
+             "members": members,
+             "external_types": external_types}
+    fi.write(utils.DumpPickle(index))
+    fi.seek(len(_MAGIC))
+    fi.write(struct.pack(_OFFSET_FORMAT, offset))
   return True
 
 
+def _RenameName(name, old_module_name, new_module_name):
+  if name.startswith(old_module_name):
+    return name.replace(old_module_name, new_module_name, 1)
+  else:
+    return name
+
+
+class LazyUnit(pytd.TypeDeclUnit):
+  """Base class for modules whose members are only loaded when looked up.
+
+  Only the name and the type parameters are stored in the tuple itself.
+  Accessing any of the other fields, iterating, visiting or comparing the unit
+  materializes it, i.e., creates a regular TypeDeclUnit from all of the members
+  and operates on that. Subclasses create instances with _CreateLazy, and
+  implement Lookup() and Materialize().
+  """
+
+  @classmethod
+  def _CreateLazy(cls, name, type_params, names):
+    """Create an instance, for the __new__ of a subclass.
+
+    Args:
+      name: The name of the module.
+      type_params: The type parameters of the module.
+      names: The full names of the members, in their original order.
+
+    Returns:
+      An instance of cls.
+    """
+    self = super(LazyUnit, cls).__new__(cls, name, (), type_params, (), (), ())
+    self._full = None  # the materialized unit
+    self._order = list(names)
+    self._names = set(names)
+    self._type_params = {t.full_name: t for t in type_params}
+    return self
+
+  def __init__(self, *args, **kwargs):
+    # Don't check the preconditions for the arguments of __new__.
+    pass
+
+  def __reduce__(self):
+    return pytd.TypeDeclUnit, tuple(self.Materialize())
+
+  def __repr__(self):
+    return "%s(%r)" % (type(self).__name__, self.name)
+
+  def __getitem__(self, i):
+    if i in (0, 2):  # name and type_params
+      return tuple.__getitem__(self, i)
+    return self.Materialize()[i]
+
+  def __iter__(self):
+    return iter(self.Materialize())
+
+  def HasMember(self, name):
+    return name in self._names or name in self._type_params
+
+  def GetNames(self):
+    """Return the full names of all members, including type parameters."""
+    return self._order + [t.full_name for t in self.type_params]
+
+  def GetMemberMap(self):
+    """Return a dictionary-like view of the members, by their short name."""
+    return LazyMemberMap(self)
+
+  def Lookup(self, name):
+    raise NotImplementedError()
+
+  def Materialize(self):
+    """Create a regular TypeDeclUnit from all the members."""
+    raise NotImplementedError()
+
+  def Replace(self, **kwargs):
+    return self.Materialize().Replace(**kwargs)
+
+  def VisitNode(self, visitor, *args, **kwargs):
+    return self.Materialize().VisitNode(visitor, *args, **kwargs)
+
+  def ASTeq(self, other):
+    return self.Materialize().ASTeq(other)
+
+
+class LazyTypeDeclUnit(LazyUnit):
+  """A module from a file written by StoreAst, loaded on demand.
+
+  Lookup() only unpickles (and resolves) the requested member. Everything else
+  that needs the members (e.g. accessing the "classes" field, or visiting the
+  unit) loads all of them first, and then operates on a regular TypeDeclUnit.
+
+  Attributes:
+    stored_name: The name of the module when it was stored.
+    dependencies: The modules this module depends on. Like
+      SerializableAst.dependencies, this might include stored_name.
+    external_types: The names of the classes in other modules this module
+      references.
+  """
+
+  def __new__(cls, filename, module_name=None):
+    with open(filename, "rb") as fi:
+      if fi.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError("%s isn't an indexed AST" % filename)
+      data = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+    index_offset, = struct.unpack(
+        _OFFSET_FORMAT, data[len(_MAGIC):len(_MAGIC) + _OFFSET_SIZE])
+    index = cPickle.loads(data[index_offset:])
+    stored_name = index["name"]
+    name = module_name or stored_name
+    type_params = index["type_params"]
+    rename = None
+    if name != stored_name:
+      rename = RenameModuleVisitor(stored_name, name)
+      type_params = tuple(t.Visit(rename) for t in type_params)
+    members = []  # (name, field, start, end), in the file's order
+    for field, member_name, start, end in index["members"]:
+      members.append((_RenameName(member_name, stored_name, name),
+                      field, start, end))
+    self = cls._CreateLazy(name, type_params, [m[0] for m in members])
+    self._data = data
+    self._rename = rename
+    self._module_map = None
+    self.stored_name = stored_name
+    self.dependencies = index["dependencies"]
+    self.external_types = index["external_types"]
+    # name -> (field, start, end)
+    self._members = {m[0]: m[1:] for m in members}
+    self._loaded = {}  # name -> member
+    return self
+
+  def SetModuleMap(self, module_map):
+    """Set the modules the references of members are resolved against."""
+    self._module_map = module_map
+    # Members might have been looked up already, by modules we depend on.
+    for name in list(self._loaded):
+      self._loaded[name] = self._Resolve(name, self._loaded[name])
+
+  def _LoadMember(self, name, resolve):
+    """Unpickle a member, and resolve its references to other classes."""
+    _, start, end = self._members[name]
+    member = cPickle.loads(self._data[start:end])
+    _members_loaded.inc()
+    if self._rename:
+      member = member.Visit(self._rename)
+    # Register the member before resolving it, so that references to it from
+    # the members it refers to can be resolved.
+    self._loaded[name] = member
+    if resolve:
+      try:
+        self._loaded[name] = self._Resolve(name, member)
+      except:
+        del self._loaded[name]
+        raise
+    return self._loaded[name]
+
+  def _Resolve(self, name, member):
+    class_lookup = visitors.LookupExternalTypes(
+        self._module_map, full_names=True, self_name=None)
+    try:
+      # This fills in the ClassType nodes in place, so references to the
+      # unresolved member are fine, too.
+      return member.Visit(class_lookup)
+    except KeyError as e:
+      raise UnrestorableDependencyError(
+          "Unresolved class in %s: %r." % (name, e.message))
+
+  def Lookup(self, name):
+    if self._full:
+      return self._full.Lookup(name)
+    if name in self._loaded:
+      return self._loaded[name]
+    if name in self._type_params:
+      return self._type_params[name]
+    if name not in self._members:
+      raise KeyError(name)
+    return self._LoadMember(name, resolve=self._module_map is not None)
+
+  def Materialize(self):
+    """Load all members, and create a regular TypeDeclUnit from them."""
+    if self._full is None:
+      _asts_materialized.inc()
+      resolve = self._module_map is not None
+      fields = {field: [] for field in _MEMBER_FIELDS}
+      for name in self._order:
+        member = self._loaded.get(name) or self._LoadMember(name, resolve)
+        fields[self._members[name][0]].append(member)
+      self._full = pytd.TypeDeclUnit(
+          self.name, tuple(fields["constants"]), self.type_params,
+          tuple(fields["classes"]), tuple(fields["functions"]),
+          tuple(fields["aliases"]))
+    return self._full
+
+
+class LazyMemberMap(object):
+  """The members of a lazily loaded unit, by their name without the module.
+
+  Like the member map that convert.py creates from a TypeDeclUnit, but only
+  loads the members that are accessed. The unit needs to provide GetNames()
+  and Lookup(), like LazyUnit.
+  """
+
+  def __init__(self, unit):
+    self._unit = unit
+    self._names = {name.rsplit(".")[-1]: name for name in unit.GetNames()}
+
+  def __contains__(self, name):
+    return name in self._names
+
+  def __getitem__(self, name):
+    return self._unit.Lookup(self._names[name])
+
+  def __iter__(self):
+    return iter(self._names)
+
+  def __len__(self):
+    return len(self._names)
+
+  def get(self, name, default=None):
+    return self[name] if name in self._names else default
+
+  def keys(self):
+    return self._names.keys()
+
+  def items(self):
+    return [(name, self[name]) for name in self._names]
+
+
+def IsIndexedAst(filename):
+  """Whether a file was written by StoreAst (as opposed to SavePickle)."""
+  with open(filename, "rb") as fi:
+    return fi.read(len(_MAGIC)) == _MAGIC
+
+
+def _CanLookup(module, name):
+  if isinstance(module, LazyTypeDeclUnit):
+    if module.HasMember(name):
+      return True
+  else:
+    try:
+      module.Lookup(name)
+      return True
+    except KeyError:
+      pass
+  # See visitors.LookupExternalTypes._ResolveUsingGetattr.
+  getattr_name = name.rpartition(".")[0] + ".__getattr__"
+  if isinstance(module, LazyTypeDeclUnit):
+    return module.HasMember(getattr_name)
+  try:
+    module.Lookup(getattr_name)
+    return True
+  except KeyError:
+    return False
+
+
+def ProcessLazyAst(lazy_ast, module_map):
+  """Prepare a LazyTypeDeclUnit for resolving the members it loads.
+
+  Like ProcessAst, this checks that all the classes the module references in
+  other modules exist. The members themselves are resolved when they're first
+  looked up.
+
+  Args:
+    lazy_ast: A LazyTypeDeclUnit.
+    module_map: Used to resolve ClassType.cls links to already loaded modules.
+      The loaded module will be added to the dict.
+
+  Raises:
+    UnrestorableDependencyError: If no concrete module exists in module_map for
+      one of the references from the pickled ast.
+  """
+  module_map[lazy_ast.name] = lazy_ast
+  for name in lazy_ast.external_types:
+    module_name, dot, _ = name.rpartition(".")
+    if not dot or name in module_map:
+      # Unqualified names, and references to modules, are handled (or
+      # reported) when the member is resolved.
+      continue
+    module = module_map.get(module_name)
+    if module is None or not _CanLookup(module, name):
+      raise UnrestorableDependencyError("Unresolved class: %r." % name)
+  class_lookup = visitors.LookupExternalTypes(
+      module_map, full_names=True, self_name=None)
+  type_params = tuple(t.Visit(class_lookup) for t in lazy_ast.type_params)
+  if type_params != lazy_ast.type_params:
+    raise UnrestorableDependencyError(
+        "Type parameters of %s can't be resolved in place." % lazy_ast.name)
+  lazy_ast.SetModuleMap(module_map)
+
+
+def LoadSerializableAst(filename):
+  """Load a file written by StoreAst (or SavePickle) as a SerializableAst.
+
+  Unlike LazyTypeDeclUnit, this loads all of the module at once.
+
+  Args:
+    filename: The file to load.
+
+  Returns:
+    A SerializableAst.
+  """
+  if not IsIndexedAst(filename):
+    return utils.LoadPickle(filename)
+  lazy_ast = LazyTypeDeclUnit(filename)
+  ast = lazy_ast.Materialize()
+  indexer = FindClassTypesVisitor()
+  ast.Visit(indexer)
+  return SerializableAst(ast, lazy_ast.dependencies, indexer.class_type_nodes)
+
+
 def EnsureAstName(ast, module_name):
   """Rename the serializable_ast if the name is different from module_name.
 
@@ -1,5 +1,4 @@
 import os
-import pickle
 
 from pytype import config
 from pytype import load_pytd
@@ -77,7 +76,7 @@ class SerializeAstTest(unittest.TestCase):
       pickled_ast_filename = os.path.join(d.path, "module1.pyi.pickled")
       module_map = self._StoreAst(d, module_name, pickled_ast_filename)
       del module_map[module_name]
-      serialized_ast = pytd_utils.LoadPickle(pickled_ast_filename)
+      serialized_ast = serialize_ast.LoadSerializableAst(pickled_ast_filename)
 
       # The sorted makes the testcase more deterministic.
       serialized_ast.class_type_nodes = sorted(
@@ -137,8 +136,7 @@ class SerializeAstTest(unittest.TestCase):
       result = serialize_ast.StoreAst(ast, pickled_ast_filename)
 
       self.assertTrue(result)
-      with open(pickled_ast_filename, "rb") as fi:
-        serialized_ast = pickle.load(fi)
+      serialized_ast = serialize_ast.LoadSerializableAst(pickled_ast_filename)
       self.assertTrue(serialized_ast.ast)
       self.assertEquals(serialized_ast.dependencies,
                         {"__builtin__", "module2", "foo.bar.module1"})
@@ -152,7 +150,7 @@ class SerializeAstTest(unittest.TestCase):
       original_ast = module_map[module_name]
       del module_map[module_name]
       loaded_ast = serialize_ast.ProcessAst(
-          pytd_utils.LoadPickle(pickled_ast_filename),
+          serialize_ast.LoadSerializableAst(pickled_ast_filename),
           module_map)
 
       self.assertTrue(loaded_ast)
@@ -175,7 +173,7 @@ class SerializeAstTest(unittest.TestCase):
       del module_map[module_name]
 
       loaded_ast = serialize_ast.ProcessAst(
-          pytd_utils.LoadPickle(pickled_ast_filename),
+          serialize_ast.LoadSerializableAst(pickled_ast_filename),
           module_map)
 
       self.assertTrue(loaded_ast)
@@ -193,7 +191,7 @@ class SerializeAstTest(unittest.TestCase):
 
       with self.assertRaises(serialize_ast.UnrestorableDependencyError):
         serialize_ast.ProcessAst(
-            pytd_utils.LoadPickle(pickled_ast_filename),
+            serialize_ast.LoadSerializableAst(pickled_ast_filename),
             module_map)
 
   def testUnrestorableDependencyErrorWithoutModuleIndex(self):
@@ -203,7 +201,7 @@ class SerializeAstTest(unittest.TestCase):
       module_map = self._StoreAst(d, module_name, pickled_ast_filename)
       module_map = {}  # Remove module2
 
-      loaded_ast = pytd_utils.LoadPickle(pickled_ast_filename)
+      loaded_ast = serialize_ast.LoadSerializableAst(pickled_ast_filename)
       loaded_ast.modified_class_types = None  # Remove the index
       with self.assertRaises(serialize_ast.UnrestorableDependencyError):
         serialize_ast.ProcessAst(loaded_ast, module_map)
@@ -217,7 +215,7 @@ class SerializeAstTest(unittest.TestCase):
       del module_map[original_module_name]
 
       new_module_name = "wurstbrot.module2"
-      serializable_ast = pytd_utils.LoadPickle(pickled_ast_filename)
+      serializable_ast = serialize_ast.LoadSerializableAst(pickled_ast_filename)
       serialize_ast.EnsureAstName(serializable_ast, new_module_name)
       loaded_ast = serialize_ast.ProcessAst(serializable_ast, module_map)
 
@@ -235,7 +233,7 @@ class SerializeAstTest(unittest.TestCase):
       pickled_ast_filename = os.path.join(d.path, "module1.pyi.pickled")
 
       module_map = self._StoreAst(d, original_module_name, pickled_ast_filename)
-      serializable_ast = pytd_utils.LoadPickle(pickled_ast_filename)
+      serializable_ast = serialize_ast.LoadSerializableAst(pickled_ast_filename)
 
       expected_name = "module1"
       # Check that the module had the expected name before.
@@ -246,5 +244,86 @@ class SerializeAstTest(unittest.TestCase):
       self.assertEquals(serializable_ast.ast.name, expected_name)
 
 
+  def testLazyLookup(self):
+    with utils.Tempdir() as d:
+      module_name = "module1"
+      pickled_ast_filename = os.path.join(d.path, "module1.pyi.pickled")
+      module_map = self._StoreAst(d, module_name, pickled_ast_filename)
+      original_ast = module_map.pop(module_name)
+      lazy_ast = serialize_ast.LazyTypeDeclUnit(pickled_ast_filename)
+      serialize_ast.ProcessLazyAst(lazy_ast, module_map)
+
+      cls = lazy_ast.Lookup("module1.SomeClass")
+      self.assertEquals(original_ast.Lookup("module1.SomeClass"), cls)
+      cls.Visit(visitors.VerifyLookup())
+      self.assertIs(cls, lazy_ast.Lookup("module1.SomeClass"))
+      self.assertItemsEqual(["module1.SomeClass"], lazy_ast._loaded)
+      with self.assertRaises(KeyError):
+        lazy_ast.Lookup("module1.DoesNotExist")
+
+  def testLazyMaterialize(self):
+    with utils.Tempdir() as d:
+      module_name = "module1"
+      pickled_ast_filename = os.path.join(d.path, "module1.pyi.pickled")
+      module_map = self._StoreAst(d, module_name, pickled_ast_filename)
+      original_ast = module_map.pop(module_name)
+      lazy_ast = serialize_ast.LazyTypeDeclUnit(pickled_ast_filename)
+      serialize_ast.ProcessLazyAst(lazy_ast, module_map)
+      cls = lazy_ast.Lookup("module1.SomeClass")
+
+      self.assertEquals(module_name, lazy_ast.name)
+      self.assertTrue(original_ast.ASTeq(lazy_ast))
+      self.assertIn(cls, lazy_ast.classes)
+      lazy_ast.Visit(visitors.VerifyLookup())
+
+  def testLazyMemberMap(self):
+    with utils.Tempdir() as d:
+      pickled_ast_filename = os.path.join(d.path, "module1.pyi.pickled")
+      self._StoreAst(d, "module1", pickled_ast_filename)
+      member_map = serialize_ast.LazyTypeDeclUnit(
+          pickled_ast_filename).GetMemberMap()
+      self.assertIn("SomeClass", member_map)
+      self.assertNotIn("DoesNotExist", member_map)
+      self.assertEquals("module1.constant", member_map["constant"].name)
+      self.assertItemsEqual(
+          ["constant", "x", "b", "SomeClass", "ModuleFunction"],
+          member_map.keys())
+
+  def testLazyLoadWithDifferentModuleName(self):
+    with utils.Tempdir() as d:
+      pickled_ast_filename = os.path.join(d.path, "module1.pyi.pickled")
+      module_map = self._StoreAst(d, "module1", pickled_ast_filename)
+      del module_map["module1"]
+      new_module_name = "wurstbrot.module2"
+      lazy_ast = serialize_ast.LazyTypeDeclUnit(pickled_ast_filename,
+                                                new_module_name)
+      serialize_ast.ProcessLazyAst(lazy_ast, module_map)
+
+      self.assertEquals(new_module_name, lazy_ast.name)
+      self.assertEquals("module1", lazy_ast.stored_name)
+      cls = lazy_ast.Lookup("wurstbrot.module2.SomeClass")
+      self.assertEquals("wurstbrot.module2.SomeClass", cls.name)
+      ast_new_module, _ = self._GetAst(temp_dir=d, module_name=new_module_name)
+      self.assertTrue(ast_new_module.ASTeq(lazy_ast))
+
+  def testLazyUnrestorableDependencyError(self):
+    with utils.Tempdir() as d:
+      pickled_ast_filename = os.path.join(d.path, "module1.pyi.pickled")
+      self._StoreAst(d, "module1", pickled_ast_filename)
+      lazy_ast = serialize_ast.LazyTypeDeclUnit(pickled_ast_filename)
+      with self.assertRaises(serialize_ast.UnrestorableDependencyError):
+        serialize_ast.ProcessLazyAst(lazy_ast, {})
+
+  def testLoadLegacyPickle(self):
+    with utils.Tempdir() as d:
+      ast, _ = self._GetAst(temp_dir=d, module_name="module1")
+      pickled_ast_filename = os.path.join(d.path, "module1.pyi.pickled")
+      pytd_utils.SavePickle(serialize_ast.SerializableAst(ast, {"module2"}, []),
+                            pickled_ast_filename)
+      self.assertFalse(serialize_ast.IsIndexedAst(pickled_ast_filename))
+      serializable_ast = serialize_ast.LoadSerializableAst(pickled_ast_filename)
+      self.assertTrue(ast.ASTeq(serializable_ast.ast))
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -29,7 +29,6 @@ signatures against new inference results.
 import logging
 
 
-from pytype.pytd import abc_hierarchy
 from pytype.pytd import booleq
 from pytype.pytd import pytd
 from pytype.pytd import utils
@@ -77,29 +76,6 @@ def unpack_name_of_partial(name):
   return name.lstrip("~").replace("~", ".")
 
 
-def get_all_subclasses(asts):
-  """Compute a class->subclasses mapping.
-
-  Args:
-    asts: A list of ASTs.
-
-  Returns:
-    A dictionary, mapping instances of pytd.TYPE (types) to lists of
-    pytd.Class (the derived classes).
-  """
-  hierarchy = {}
-  for ast in asts:
-    hierarchy.update(ast.Visit(visitors.ExtractSuperClasses()))
-  hierarchy = {cls: [superclass for superclass in superclasses
-                     if (hasattr(superclass, "name") and
-                         is_complete(superclass))]
-               for cls, superclasses in hierarchy.items()
-               if is_complete(cls)}
-  # typically this is a fairly short list, e.g.:
-  #  [ClassType(basestring), ClassType(int), ClassType(object)]
-  return abc_hierarchy.Invert(hierarchy)
-
-
 class StrictType(node.Node("name")):
   """A type that doesn't allow sub- or superclasses to match.
 
@@ -114,17 +90,20 @@ class StrictType(node.Node("name")):
 class TypeMatch(utils.TypeMatcher):
   """Class for matching types against other types."""
 
-  def __init__(self, direct_subclasses=None, any_also_is_bottom=True):
+  def __init__(self, hierarchy=None, any_also_is_bottom=True):
     """Construct.
 
     Args:
-      direct_subclasses: A dictionary, mapping pytd.TYPE to lists of pytd.TYPE.
+      hierarchy: Optionally, a class_hierarchy.ClassHierarchy, for looking up
+        the sub- and superclasses of the classes it contains. Without it,
+        classes have no known subclasses, and superclasses are found by walking
+        the parents of a class.
       any_also_is_bottom: Whether we should, (if True) consider
         pytd.AnythingType() to also be at the bottom of the type hierarchy,
         thus making it a subclass of everything, or (if False) to be only
         at the top.
     """
-    self.direct_subclasses = direct_subclasses or {}
+    self.hierarchy = hierarchy
     self.any_also_is_bottom = any_also_is_bottom
     self.solver = booleq.Solver()
     self._implications = {}
@@ -144,6 +123,9 @@ class TypeMatch(utils.TypeMatcher):
         A list of pytd.TYPE.
     """
     if isinstance(t, pytd.ClassType):
+      if self.hierarchy and t.cls.name in self.hierarchy:
+        return [t] + [self._class_type(name)
+                      for name in self.hierarchy.GetMRO(t.cls.name)[1:]]
       return sum((self.get_superclasses(c) for c in t.cls.parents), [t])
     elif isinstance(t, pytd.AnythingType):
       # All types, even "?", inherit from object.
@@ -163,12 +145,21 @@ class TypeMatch(utils.TypeMatcher):
         A list of pytd.TYPE.
     """
     if isinstance(t, pytd.ClassType):
-      subclasses = self.direct_subclasses.get(t, [])
-      return sum((self.get_subclasses(pytd.ClassType(c.name, c))
-                  for c in subclasses), [t])
+      if not self.hierarchy:
+        return [t]
+      return [t] + [self._class_type(name)
+                    for name in self.hierarchy.GetSubClassesInOrder(t.name)[1:]
+                    if is_complete(name)]
     else:
       raise NotImplementedError("Can't extract subclasses from %s", type(t))
 
+  def _class_type(self, name):
+    cls = self.hierarchy.GetClass(name)
+    if cls:
+      return pytd.ClassType(name, cls)
+    else:
+      return pytd.NamedType(name)
+
   def type_parameter(self, unknown, base_class, item):
     """This generates the type parameter when matching against a generic type.
 
@@ -20,6 +20,7 @@ import textwrap
 
 from pytype.pyi import parser
 from pytype.pytd import booleq
+from pytype.pytd import class_hierarchy
 from pytype.pytd import pytd
 from pytype.pytd import type_match
 from pytype.pytd import utils as pytd_utils
@@ -57,52 +58,52 @@ class TestTypeMatch(parser_test_base.ParserTest):
     self.assertEquals(eq, booleq.FALSE)
 
   def testAnything(self):
-    m = type_match.TypeMatch({})
+    m = type_match.TypeMatch()
     self.assertMatch(m, pytd.AnythingType(), pytd.AnythingType())
     self.assertMatch(m, pytd.AnythingType(), pytd.NamedType("x"))
     self.assertMatch(m, pytd.NamedType("x"), pytd.AnythingType())
 
   def testAnythingAsTop(self):
-    m = type_match.TypeMatch({}, any_also_is_bottom=False)
+    m = type_match.TypeMatch(any_also_is_bottom=False)
     self.assertMatch(m, pytd.AnythingType(), pytd.AnythingType())
     self.assertNoMatch(m, pytd.AnythingType(), pytd.NamedType("x"))
     self.assertMatch(m, pytd.NamedType("x"), pytd.AnythingType())
 
   def testNothingLeft(self):
-    m = type_match.TypeMatch({})
+    m = type_match.TypeMatch()
     eq = m.match_type_against_type(pytd.NothingType(),
                                    pytd.NamedType("A"), {})
     self.assertEquals(eq, booleq.TRUE)
 
   def testNothingRight(self):
-    m = type_match.TypeMatch({})
+    m = type_match.TypeMatch()
     eq = m.match_type_against_type(pytd.NamedType("A"), pytd.NothingType(), {})
     self.assertEquals(eq, booleq.FALSE)
 
   def testNothingNothing(self):
-    m = type_match.TypeMatch({})
+    m = type_match.TypeMatch()
     eq = m.match_type_against_type(pytd.NothingType(), pytd.NothingType(), {})
     self.assertEquals(eq, booleq.TRUE)
 
   def testNothingAnything(self):
-    m = type_match.TypeMatch({})
+    m = type_match.TypeMatch()
     eq = m.match_type_against_type(pytd.NothingType(), pytd.AnythingType(), {})
     self.assertEquals(eq, booleq.TRUE)
 
   def testAnythingNothing(self):
-    m = type_match.TypeMatch({})
+    m = type_match.TypeMatch()
     eq = m.match_type_against_type(pytd.AnythingType(), pytd.NothingType(), {})
     self.assertEquals(eq, booleq.TRUE)
 
   def testNamed(self):
-    m = type_match.TypeMatch({})
+    m = type_match.TypeMatch()
     eq = m.match_type_against_type(pytd.NamedType("A"), pytd.NamedType("A"), {})
     self.assertEquals(eq, booleq.TRUE)
     eq = m.match_type_against_type(pytd.NamedType("A"), pytd.NamedType("B"), {})
     self.assertNotEquals(eq, booleq.TRUE)
 
   def testNamedAgainstGeneric(self):
-    m = type_match.TypeMatch({})
+    m = type_match.TypeMatch()
     eq = m.match_type_against_type(pytd.GenericType(pytd.NamedType("A"), ()),
                                    pytd.NamedType("A"), {})
     self.assertEquals(eq, booleq.TRUE)
@@ -173,11 +174,31 @@ class TestTypeMatch(parser_test_base.ParserTest):
       def right(a: A) -> A
     """))
     ast = visitors.LookupClasses(ast, self.mini_builtins)
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     left, right = ast.Lookup("left"), ast.Lookup("right")
     self.assertEquals(m.match(left, right, {}), booleq.TRUE)
     self.assertNotEquals(m.match(right, left, {}), booleq.TRUE)
 
+  def testClassHierarchy(self):
+    ast = parser.parse_string(textwrap.dedent("""
+      class A():
+        pass
+      class B(A):
+        pass
+      class C(B):
+        pass
+    """))
+    ast = self.LinkAgainstSimpleBuiltins(ast)
+    hierarchy = class_hierarchy.ClassHierarchy.FromAsts([ast])
+    m = type_match.TypeMatch(hierarchy=hierarchy)
+    a, b, c = (pytd.ClassType(name, ast.Lookup(name)) for name in "ABC")
+    self.assertEquals(["B", "A", "__builtin__.classobj"],
+                      [t.name for t in m.get_superclasses(b)])
+    self.assertEquals(["A", "B", "C"], [t.name for t in m.get_subclasses(a)])
+    self.assertMatch(m, c, a)
+    self.assertNoMatch(m, a, c)
+
   def _TestTypeParameters(self, reverse=False):
     ast = parser.parse_string(textwrap.dedent("""
       import typing
@@ -223,7 +244,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
       def right() -> list[A]
     """))
     ast = self.LinkAgainstSimpleBuiltins(ast)
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     left, right = ast.Lookup("left"), ast.Lookup("right")
     self.assertEquals(m.match(left, right, {}),
                       booleq.And((booleq.Eq("~unknown0", "list"),
@@ -240,7 +262,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
         def f(self, x:Base) -> Base
     """))
     ast = self.LinkAgainstSimpleBuiltins(ast)
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     eq = m.match_Class_against_Class(ast.Lookup("Match"), ast.Lookup("Foo"), {})
     self.assertEquals(eq, booleq.TRUE)
 
@@ -250,7 +273,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
       x1 = ...  # type: Tuple[bool, ...]
       x2 = ...  # type: Tuple[int, ...]
     """)
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     x1 = ast.Lookup("x1").type
     x2 = ast.Lookup("x2").type
     self.assertEquals(m.match_Generic_against_Generic(x1, x1, {}), booleq.TRUE)
@@ -265,7 +289,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
       x2 = ...  # type: Tuple[bool, str]
       x3 = ...  # type: Tuple[int, str]
     """)
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     x1 = ast.Lookup("x1").type
     x2 = ast.Lookup("x2").type
     x3 = ast.Lookup("x3").type
@@ -286,7 +311,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
       x2 = ...  # type: Tuple[int, ...]
       y1 = ...  # type: Tuple[bool, int]
     """)
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     x1 = ast.Lookup("x1").type
     x2 = ast.Lookup("x2").type
     y1 = ast.Lookup("y1").type
@@ -306,7 +332,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
     """)
     unk = ast.Lookup("~unknown0")
     tup = ast.Lookup("x").type
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     match = m.match_Unknown_against_Generic(unk, tup, {})
     self.assertListEqual(sorted(match.extract_equalities()),
                          [("~unknown0", "__builtin__.tuple"),
@@ -321,7 +348,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
     """)
     a = ast.Lookup("A")
     f = ast.Lookup("f")
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     # Smoke test for the TupleType logic in match_Function_against_Class
     self.assertEquals(m.match_Function_against_Class(f, a, {}, {}),
                       booleq.FALSE)
@@ -334,7 +362,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
     """)
     v1 = ast.Lookup("v1").type
     v2 = ast.Lookup("v2").type
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     # Return type is covariant.
     self.assertEquals(m.match_Generic_against_Generic(v1, v2, {}), booleq.FALSE)
     self.assertEquals(m.match_Generic_against_Generic(v2, v1, {}), booleq.TRUE)
@@ -355,7 +384,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
     v4 = ast.Lookup("v4").type
     v5 = ast.Lookup("v5").type
     v6 = ast.Lookup("v6").type
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     # Argument types are contravariant.
     self.assertEquals(m.match_Generic_against_Generic(v1, v2, {}), booleq.TRUE)
     self.assertEquals(m.match_Generic_against_Generic(v2, v1, {}), booleq.FALSE)
@@ -386,7 +416,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
     v4 = ast.Lookup("v4").type
     v5 = ast.Lookup("v5").type
     v6 = ast.Lookup("v6").type
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     self.assertEquals(m.match_Generic_against_Generic(v1, v4, {}), booleq.FALSE)
     self.assertEquals(m.match_Generic_against_Generic(v4, v1, {}), booleq.TRUE)
     self.assertEquals(m.match_Generic_against_Generic(v2, v3, {}), booleq.TRUE)
@@ -412,7 +443,8 @@ class TestTypeMatch(parser_test_base.ParserTest):
     v4 = ast.Lookup("v4").type
     v5 = ast.Lookup("v5").type
     v6 = ast.Lookup("v6").type
-    m = type_match.TypeMatch(type_match.get_all_subclasses([ast]))
+    m = type_match.TypeMatch(
+        class_hierarchy.ClassHierarchy.FromAsts([ast]))
     self.assertEquals(m.match_Generic_against_Generic(v1, v6, {}), booleq.FALSE)
     self.assertEquals(m.match_Generic_against_Generic(v6, v1, {}), booleq.TRUE)
     self.assertEquals(m.match_Generic_against_Generic(v2, v5, {}), booleq.TRUE)
@@ -75,13 +75,7 @@ class Typeshed(object):
       IOError: if file not found
     """
     module_path = os.path.join(*module.split("."))
-    versions = ["%d.%d" % (version[0], minor)
-                for minor in range(version[1], -1, -1)]
-    # E.g. for Python 3.5, try 3.5/, 3.4/, 3.3/, ..., 3.0/, 3/, 2and3.
-    # E.g. for Python 2.7, try 2.7/, 2.6/, ..., 2/, 2and3.
-    # The order is the same as that of mypy. See default_lib_path in
-    # https://github.com/JukkaL/mypy/blob/master/mypy/build.py#L249
-    for v in versions + [str(version[0]), "2and3"]:
+    for v in self._get_version_dirs(version):
       path_rel = os.path.join(toplevel, v, module_path)
 
       # Give precedence to missing.txt
@@ -98,10 +92,70 @@ class Typeshed(object):
 
     raise IOError("Couldn't find %s" % module)
 
+  def _get_version_dirs(self, version):
+    versions = ["%d.%d" % (version[0], minor)
+                for minor in range(version[1], -1, -1)]
+    # E.g. for Python 3.5, try 3.5/, 3.4/, 3.3/, ..., 3.0/, 3/, 2and3.
+    # E.g. for Python 2.7, try 2.7/, 2.6/, ..., 2/, 2and3.
+    # The order is the same as that of mypy. See default_lib_path in
+    # https://github.com/JukkaL/mypy/blob/master/mypy/build.py#L249
+    return versions + [str(version[0]), "2and3"]
+
+  def get_module_files(self, toplevel, version):
+    """Get the paths of all the typeshed files for a Python version.
+
+    Arguments:
+      toplevel: the top-level directory within typeshed/, typically "stdlib"
+        or "third_party".
+      version: The Python version. (major, minor)
+
+    Returns:
+      A sorted list of (module name, path) tuples. The path is relative to
+      typeshed_path, and can be passed to load_file(). A module can appear more
+      than once, get_module_file() decides which file is used.
+    Raises:
+      IOError: if the typeshed directory doesn't exist.
+    """
+    if not os.path.isdir(self._typeshed_path):
+      raise IOError("No typeshed directory %s" % self._typeshed_path)
+    files = []
+    for v in self._get_version_dirs(version):
+      base = os.path.join(toplevel, v)
+      for root, _, filenames in os.walk(os.path.join(self._typeshed_path,
+                                                     base)):
+        for filename in filenames:
+          if not filename.endswith(".pyi"):
+            continue
+          path = os.path.relpath(os.path.join(root, filename),
+                                 self._typeshed_path)
+          parts = os.path.relpath(path, base)[:-len(".pyi")].split(os.sep)
+          if parts[-1] == "__init__":
+            parts.pop()
+          files.append((".".join(parts), path))
+    return sorted(files)
+
+  def load_file(self, path):
+    """Load a file, given its path relative to typeshed_path.
+
+    Returns:
+      A tuple with the filename and contents of the file
+    Raises:
+      IOError: if file not found
+    """
+    return self._load_file(path)
+
 
 _typeshed = None
 
 
+def get_typeshed():
+  """Return the Typeshed installation used by parse_type_definition."""
+  global _typeshed
+  if _typeshed is None:
+    _typeshed = Typeshed()
+  return _typeshed
+
+
 def parse_type_definition(pyi_subdir, module, python_version):
   """Load and parse a *.pyi from typeshed.
 
@@ -113,14 +167,10 @@ def parse_type_definition(pyi_subdir, module, python_version):
   Returns:
     The AST of the module; None if the module doesn't have a definition.
   """
-  global _typeshed
-  if _typeshed is None:
-    _typeshed = Typeshed()
-
   try:
-    filename, src = _typeshed.get_module_file(pyi_subdir,
-                                              module,
-                                              python_version)
+    filename, src = get_typeshed().get_module_file(pyi_subdir,
+                                                   module,
+                                                   python_version)
   except IOError:
     return None
   return builtins.ParsePyTD(src, filename=filename, module=module,
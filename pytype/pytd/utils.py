@@ -514,6 +514,25 @@ def GetPredefinedFile(pytd_subdir, module, extension=".pytd"):
   return pytype.utils.load_pytype_file(path)
 
 
+def GetPredefinedModules(pytd_subdir):
+  """Get the names of the predefined PyTDs in a directory.
+
+  Arguments:
+    pytd_subdir: the directory, typically "builtins" or "stdlib"
+  Returns:
+    A sorted list of module names.
+  """
+  base = os.path.join(os.path.dirname(pytype.utils.__file__), "pytd",
+                      pytd_subdir)
+  modules = []
+  for root, _, filenames in os.walk(base):
+    for filename in filenames:
+      if filename.endswith(".pytd"):
+        path = os.path.relpath(os.path.join(root, filename), base)
+        modules.append(".".join(path[:-len(".pytd")].split(os.sep)))
+  return sorted(modules)
+
+
 def LoadPickle(filename):
   with open(filename, "rb") as fi:
     return cPickle.load(fi)
@@ -527,3 +546,13 @@ def SavePickle(data, filename):
       cPickle.dump(data, fi, _PICKLE_PROTOCOL)
     finally:
       sys.setrecursionlimit(recursion_limit)
+
+
+def DumpPickle(data):
+  """Pickle data (e.g. an AST) to a string."""
+  recursion_limit = sys.getrecursionlimit()
+  sys.setrecursionlimit(_PICKLE_RECURSION_LIMIT_AST)
+  try:
+    return cPickle.dumps(data, _PICKLE_PROTOCOL)
+  finally:
+    sys.setrecursionlimit(recursion_limit)
@@ -0,0 +1,282 @@
+"""A shared, read-only cache of the resolved ASTs of the standard library.
+
+Every pytype process parses the typeshed and pytd stubs of the modules it
+imports, and resolves their dependencies. The result only depends on the Python
+version and the contents of the stubs, so --generate-stdlib-cache loads all of
+them once, and stores them with serialize_ast.StoreAst in a subdirectory of the
+cache directory that's named after a hash of those. With --stdlib-cache,
+load_pytd.Loader loads the modules from there instead.
+
+Hashing the contents of all stubs takes a while, so the cache directory also has
+manifests, which map a hash of the paths, modification times and sizes of the
+stubs to the name of the subdirectory. The contents are only hashed again when
+one of those changes.
+
+A subdirectory is written under a temporary name and renamed once it's
+complete, and never modified afterwards, so it can be read by any number of
+concurrent pytype processes, e.g. on a shared build machine.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from pytype import metrics
+from pytype import utils
+from pytype.pytd import serialize_ast
+from pytype.pytd import typeshed
+from pytype.pytd import utils as pytd_utils
+
+log = logging.getLogger(__name__)
+
+
+# Change this whenever the layout of the cache changes.
+_FORMAT_VERSION = 1
+
+# The directories Loader._load_builtin looks in, in the order it tries them.
+_SUBDIRS = ("builtins", "stdlib", "third_party")
+
+# Always loaded by the Loader. See --precompiled-builtins.
+_PRELOADED = ("__builtin__", "typing")
+
+# The subdirectory of the cache directory that holds the manifests.
+_MANIFESTS = "manifests"
+
+
+_hits = metrics.Counter("stdlib_cache_hits")
+_misses = metrics.Counter("stdlib_cache_misses")
+_stubs_hashed = metrics.Counter("stdlib_cache_stubs_hashed")
+
+_keys = {}  # Map from stat hash (see _get_stat_hash) to key.
+
+
+def _hash_stub_contents(python_version):
+  """Compute the name of the cache subdirectory, from the contents of the stubs.
+
+  Args:
+    python_version: The Python version, (major, minor).
+
+  Returns:
+    A string containing the version and a hash of all the stubs.
+
+  Raises:
+    IOError: If the typeshed directory doesn't exist.
+  """
+  _stubs_hashed.inc()
+  h = hashlib.sha1()
+  h.update("%d\0%r\0" % (_FORMAT_VERSION, python_version))
+  for subdir in _SUBDIRS[:2]:
+    for module in pytd_utils.GetPredefinedModules(subdir):
+      h.update("%s/%s\0" % (subdir, module))
+      h.update(pytd_utils.GetPredefinedFile(subdir, module))
+      h.update("\0")
+  ts = typeshed.get_typeshed()
+  for subdir in _SUBDIRS[1:]:
+    for _, path in ts.get_module_files(subdir, python_version):
+      _, data = ts.load_file(path)
+      h.update("%s\0%s\0" % (path, data))
+  return "%d.%d-%s" % (python_version[0], python_version[1], h.hexdigest())
+
+
+def _get_stat_hash(python_version):
+  """Hash the paths, modification times and sizes of the stubs.
+
+  Args:
+    python_version: The Python version, (major, minor).
+
+  Returns:
+    A hex string.
+
+  Raises:
+    IOError: If the typeshed directory doesn't exist.
+  """
+  filenames = []
+  pytd_dir = os.path.join(os.path.dirname(utils.__file__), "pytd")
+  for subdir in _SUBDIRS[:2]:
+    for module in pytd_utils.GetPredefinedModules(subdir):
+      filenames.append(os.path.join(
+          pytd_dir, subdir, *module.split(".")) + ".pytd")
+  ts = typeshed.get_typeshed()
+  for subdir in _SUBDIRS[1:]:
+    for _, path in ts.get_module_files(subdir, python_version):
+      filenames.append(os.path.join(ts.typeshed_path, path))
+  h = hashlib.sha1()
+  h.update("%d\0%r\0" % (_FORMAT_VERSION, python_version))
+  for filename in filenames:
+    st = os.stat(filename)
+    h.update("%s\0%r\0%d\0" % (filename, st.st_mtime, st.st_size))
+  return h.hexdigest()
+
+
+def _get_manifest_filename(directory, stat_hash):
+  return os.path.join(directory, _MANIFESTS, stat_hash)
+
+
+def _store_manifest(directory, stat_hash, key):
+  """Record which subdirectory belongs to the stubs with the given stat hash."""
+  manifest_dir = os.path.join(directory, _MANIFESTS)
+  if not os.path.isdir(manifest_dir):
+    try:
+      os.makedirs(manifest_dir)
+    except OSError:
+      if not os.path.isdir(manifest_dir):
+        raise
+  with tempfile.NamedTemporaryFile(dir=manifest_dir, delete=False) as fi:
+    fi.write(key)
+  os.chmod(fi.name, 0o644)  # NamedTemporaryFile is only accessible to us
+  os.rename(fi.name, _get_manifest_filename(directory, stat_hash))
+
+
+def _get_key(directory, python_version):
+  """Compute the name of the cache subdirectory for a Python version.
+
+  If the cache directory has a manifest for the current paths, modification
+  times and sizes of the stubs, the name is read from there. Otherwise, the
+  contents of all stubs are hashed.
+
+  Args:
+    directory: The cache directory.
+    python_version: The Python version, (major, minor).
+
+  Returns:
+    A tuple of the stat hash, for _store_manifest, and a string containing the
+    version and a hash of all the stubs.
+
+  Raises:
+    IOError: If the typeshed directory doesn't exist.
+  """
+  stat_hash = _get_stat_hash(python_version)
+  if stat_hash not in _keys:
+    try:
+      with open(_get_manifest_filename(directory, stat_hash), "r") as fi:
+        _keys[stat_hash] = fi.read()
+    except IOError:
+      _keys[stat_hash] = _hash_stub_contents(python_version)
+  return stat_hash, _keys[stat_hash]
+
+
+def _get_filename(path, subdir, module_name):
+  return os.path.join(path, subdir, module_name + ".pickled")
+
+
+class StdlibCache(object):
+  """A cache directory, as written by generate().
+
+  Attributes:
+    path: The subdirectory for the current stubs, or None if it doesn't exist.
+  """
+
+  def __init__(self, directory, python_version):
+    try:
+      stat_hash, key = _get_key(directory, python_version)
+    except (IOError, OSError) as e:
+      log.warning("Not using the stdlib cache: %s", e)
+      self.path = None
+      return
+    path = os.path.join(directory, key)
+    if not os.path.isdir(path):
+      log.warning("No stdlib cache for the current stubs in %s. Create it with "
+                  "--generate-stdlib-cache.", directory)
+      path = None
+    elif not os.path.exists(_get_manifest_filename(directory, stat_hash)):
+      # E.g. the stubs were copied, which changes their modification times.
+      try:
+        _store_manifest(directory, stat_hash, key)
+      except (IOError, OSError) as e:
+        log.info("Couldn't store the stdlib cache manifest: %s", e)
+    self.path = path
+
+  def get_filename(self, subdir, module_name):
+    """Get the file containing a module, or None if it isn't in the cache.
+
+    Args:
+      subdir: The directory the module would be loaded from, e.g. "stdlib".
+      module_name: The name of the module. May contain dots.
+
+    Returns:
+      A file written by serialize_ast.StoreAst, or None.
+    """
+    if self.path is None:
+      return None
+    filename = _get_filename(self.path, subdir, module_name)
+    if os.path.exists(filename):
+      _hits.inc()
+      return filename
+    _misses.inc()
+    return None
+
+
+def _get_module_names(subdir, python_version):
+  """Get the names of all modules Loader._load_builtin might find in subdir."""
+  names = set()
+  if subdir != "third_party":
+    names.update(pytd_utils.GetPredefinedModules(subdir))
+  if subdir != "builtins":
+    names.update(name for name, _ in typeshed.get_typeshed().get_module_files(
+        subdir, python_version))
+  return sorted(names)
+
+
+def generate(directory, loader):
+  """Load all stubs, and store them in a new subdirectory of directory.
+
+  Args:
+    directory: The cache directory. Created if it doesn't exist.
+    loader: A load_pytd.Loader with an empty pythonpath, which isn't used for
+      anything else. Storing the modules modifies them.
+
+  Returns:
+    The path of the subdirectory.
+  """
+  python_version = loader.options.python_version
+  stat_hash, key = _get_key(directory, python_version)
+  path = os.path.join(directory, key)
+  if os.path.isdir(path):
+    log.info("Stdlib cache %s already exists", path)
+    _store_manifest(directory, stat_hash, key)
+    return path
+  asts = {}  # module name -> (subdir, ast)
+  failed = set()
+  for subdir in _SUBDIRS:
+    for module_name in _get_module_names(subdir, python_version):
+      if (module_name in _PRELOADED or module_name in asts or
+          module_name in failed):
+        # The Loader would never get to this one.
+        continue
+      try:
+        # pylint: disable=protected-access
+        ast = loader._load_builtin(subdir, module_name,
+                                   typeshed_only=subdir == "third_party")
+      except Exception as e:  # pylint: disable=broad-except
+        # Modules that aren't in the cache are loaded the normal way, which
+        # will report the error.
+        log.warning("Not caching %s: %s", module_name, e)
+        failed.add(module_name)
+        continue
+      if ast is not None:
+        asts[module_name] = subdir, ast
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+  tmp_path = tempfile.mkdtemp(dir=directory)
+  try:
+    for subdir in _SUBDIRS:
+      os.mkdir(os.path.join(tmp_path, subdir))
+    # Only store modules once all of them are loaded, since storing one clears
+    # its class pointers.
+    for module_name, (subdir, ast) in sorted(asts.items()):
+      serialize_ast.StoreAst(ast, _get_filename(tmp_path, subdir, module_name))
+    os.chmod(tmp_path, 0o755)  # mkdtemp only makes it accessible to us
+    os.rename(tmp_path, path)
+  except OSError:
+    shutil.rmtree(tmp_path)
+    if not os.path.isdir(path):
+      raise
+    # Another process created the same cache in the meantime.
+  except:
+    shutil.rmtree(tmp_path)
+    raise
+  _store_manifest(directory, stat_hash, key)
+  log.info("Stored %d modules in %s", len(asts), path)
+  return path
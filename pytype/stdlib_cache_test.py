@@ -0,0 +1,134 @@
+"""Tests for stdlib_cache.py."""
+
+import os
+
+
+from pytype import config
+from pytype import load_pytd
+from pytype import stdlib_cache
+from pytype import utils
+from pytype.pytd import serialize_ast
+from pytype.pytd import typeshed
+
+import unittest
+
+
+class StdlibCacheTest(unittest.TestCase):
+  """Tests for generate() and StdlibCache."""
+
+  PYTHON_VERSION = (2, 7)
+
+  def setUp(self):
+    self.typeshed_dir = utils.Tempdir()
+    self.typeshed_dir.__enter__()
+    self.typeshed_dir.create_file("stdlib/2.7/foo.pyi", "class Foo: ...")
+    self.typeshed_dir.create_file("stdlib/2and3/bar/__init__.pyi",
+                                  "def f() -> foo.Foo")
+    self.typeshed_dir.create_file("third_party/2/baz.pyi",
+                                  "x = ...  # type: int")
+    self.typeshed_dir.create_file("stdlib/3/qux.pyi", "y = ...  # type: int")
+    self._typeshed_home = os.environ.get("TYPESHED_HOME")
+    os.environ["TYPESHED_HOME"] = self.typeshed_dir.path
+    self._ResetTypeshed()
+    self.options = config.Options.create(python_version=self.PYTHON_VERSION,
+                                         pythonpath=[])
+
+  def tearDown(self):
+    if self._typeshed_home is None:
+      del os.environ["TYPESHED_HOME"]
+    else:
+      os.environ["TYPESHED_HOME"] = self._typeshed_home
+    self._ResetTypeshed()
+    self.typeshed_dir.__exit__(None, None, None)
+
+  def _ResetTypeshed(self):
+    typeshed._typeshed = None  # pylint: disable=protected-access
+    stdlib_cache._keys.clear()  # pylint: disable=protected-access
+
+  def testGenerate(self):
+    with utils.Tempdir() as d:
+      path = stdlib_cache.generate(
+          d.path, load_pytd.Loader(base_module=None, options=self.options))
+      self.assertItemsEqual([os.path.basename(path), "manifests"],
+                            os.listdir(d.path))
+      stdlib = os.listdir(os.path.join(path, "stdlib"))
+      # Typeshed, and pytype's own pytd files.
+      self.assertIn("foo.pickled", stdlib)
+      self.assertIn("bar.pickled", stdlib)
+      self.assertIn("os.pickled", stdlib)
+      self.assertNotIn("qux.pickled", stdlib)
+      self.assertItemsEqual(["baz.pickled"],
+                            os.listdir(os.path.join(path, "third_party")))
+      # The cache is only written once.
+      self.assertEquals(path, stdlib_cache.generate(
+          d.path, load_pytd.Loader(base_module=None, options=self.options)))
+      self.assertItemsEqual([os.path.basename(path), "manifests"],
+                            os.listdir(d.path))
+
+  def testLoad(self):
+    with utils.Tempdir() as d:
+      stdlib_cache.generate(
+          d.path, load_pytd.Loader(base_module=None, options=self.options))
+      self.options.tweak(stdlib_cache=d.path)
+      loader = load_pytd.Loader("base", self.options)
+      bar = loader.import_name("bar")
+      self.assertIsInstance(bar, serialize_ast.LazyTypeDeclUnit)
+      f, = bar.Lookup("bar.f").signatures
+      self.assertIs(loader.import_name("foo").Lookup("foo.Foo"),
+                    f.return_type.cls)
+      self.assertEquals("baz", loader.import_name("baz").name)
+      self.assertIsNone(loader.import_name("qux"))
+
+  def testStubsChanged(self):
+    with utils.Tempdir() as d:
+      stdlib_cache.generate(
+          d.path, load_pytd.Loader(base_module=None, options=self.options))
+      self.typeshed_dir.create_file("stdlib/2.7/foo.pyi", "class Foo2: ...")
+      self._ResetTypeshed()
+      cache = stdlib_cache.StdlibCache(d.path, self.PYTHON_VERSION)
+      self.assertIsNone(cache.path)
+      self.assertIsNone(cache.get_filename("stdlib", "foo"))
+      # Without a matching cache, stubs are parsed as usual.
+      self.options.tweak(stdlib_cache=d.path)
+      loader = load_pytd.Loader("base", self.options)
+      self.assertTrue(loader.import_name("foo").Lookup("foo.Foo2"))
+
+  def testManifest(self):
+    # pylint: disable=protected-access
+    hashed = []
+    hash_stub_contents = stdlib_cache._hash_stub_contents
+    def CountHashing(python_version):
+      hashed.append(python_version)
+      return hash_stub_contents(python_version)
+    stdlib_cache._hash_stub_contents = CountHashing
+    try:
+      with utils.Tempdir() as d:
+        path = stdlib_cache.generate(
+            d.path, load_pytd.Loader(base_module=None, options=self.options))
+        self.assertEquals(1, len(hashed))
+        # The manifest tells us the subdirectory without reading the stubs.
+        self._ResetTypeshed()
+        cache = stdlib_cache.StdlibCache(d.path, self.PYTHON_VERSION)
+        self.assertEquals(path, cache.path)
+        self.assertEquals(1, len(hashed))
+        # Touching a stub makes us hash the contents again, which are the same.
+        foo = os.path.join(self.typeshed_dir.path, "stdlib/2.7/foo.pyi")
+        st = os.stat(foo)
+        os.utime(foo, (st.st_atime, st.st_mtime + 10))
+        self._ResetTypeshed()
+        cache = stdlib_cache.StdlibCache(d.path, self.PYTHON_VERSION)
+        self.assertEquals(path, cache.path)
+        self.assertEquals(2, len(hashed))
+    finally:
+      stdlib_cache._hash_stub_contents = hash_stub_contents
+
+  def testPythonVersion(self):
+    with utils.Tempdir() as d:
+      stdlib_cache.generate(
+          d.path, load_pytd.Loader(base_module=None, options=self.options))
+      cache = stdlib_cache.StdlibCache(d.path, (3, 6))
+      self.assertIsNone(cache.path)
+
+
+if __name__ == "__main__":
+  unittest.main()
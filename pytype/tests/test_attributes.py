@@ -283,5 +283,29 @@ class TestAttributes(test_inference.InferenceTest):
     """)
     self.assertErrorLogIs(errors, [(3, "none-attr")])
 
+  def testAttributeAddedToBaseClass(self):
+    # The first lookup of C.x caches that A, B and C don't have x.
+    ty, errors = self.InferAndCheck("""\
+      class A(object):
+        pass
+      class B(A):
+        pass
+      class C(B):
+        pass
+      v1 = C.x
+      A.x = 42
+      v2 = C.x
+    """)
+    self.assertTypesMatchPytd(ty, """
+      from typing import Any
+      class A(object):
+        x = ...  # type: int
+      class B(A): ...
+      class C(B): ...
+      v1 = ...  # type: Any
+      v2 = ...  # type: int
+    """)
+    self.assertErrorLogIs(errors, [(7, "attribute-error", r"x.*C")])
+
 if __name__ == "__main__":
   test_inference.main()
@@ -0,0 +1,132 @@
+"""Tests for the --function-budget-* and --module-budget-* options."""
+
+from pytype.tests import test_inference
+
+
+class BudgetTest(test_inference.InferenceTest):
+  """Tests for analysis budgets."""
+
+  def testFunctionOpcodes(self):
+    self.options.tweak(function_budget_opcodes=20)
+    ty, errors = self.InferAndCheck("""\
+      def f(x):
+        return x
+      def g():
+        y = [1, 2, 3]
+        y = [y, y, y]
+        y = [y, y, y]
+        y = [y, y, y]
+        return y
+    """)
+    self.assertTypesMatchPytd(ty, """
+      from typing import Any, TypeVar
+      _T0 = TypeVar("_T0")
+      def f(x: _T0) -> _T0
+      def g() -> Any
+    """)
+    self.assertErrorLogIs(errors, [
+        (4, "analysis-budget-exceeded", r"function g.*20 opcodes")])
+
+  def testFunctionNodes(self):
+    self.options.tweak(function_budget_nodes=5)
+    _, errors = self.InferAndCheck("""\
+      def f(x):
+        if x:
+          x = 1
+        if x:
+          x = 2
+        if x:
+          x = 3
+        return x
+    """)
+    self.assertErrorLogIs(errors, [
+        (2, "analysis-budget-exceeded", r"function f.*5 CFG nodes")])
+
+  def testFunctionSeconds(self):
+    self.options.tweak(function_budget_seconds=0)
+    _, errors = self.InferAndCheck("""\
+      class Foo(object):
+        def f(self):
+          return 42
+    """)
+    self.assertErrorLogIs(errors, [
+        (3, "analysis-budget-exceeded", r"function f.*0 seconds")])
+
+  def testCallsCountTowardsBudget(self):
+    self.options.tweak(function_budget_opcodes=15)
+    _, errors = self.InferAndCheck("""\
+      def f():
+        x = [1, 2, 3]
+        x = [x, x, x]
+        x = [x, x, x]
+        x = [x, x, x]
+        return x
+      def g():
+        return f()
+    """)
+    self.assertErrorLogIs(errors, [
+        (2, "analysis-budget-exceeded", r"function f"),
+        (8, "analysis-budget-exceeded", r"function g")])
+
+  def testWithinBudget(self):
+    self.options.tweak(function_budget_opcodes=1000,
+                       function_budget_nodes=1000,
+                       function_budget_seconds=1000,
+                       module_budget_opcodes=10000)
+    ty, errors = self.InferAndCheck("""\
+      def f(x):
+        return [x]
+    """)
+    self.assertTypesMatchPytd(ty, """
+      from typing import List, TypeVar
+      _T0 = TypeVar("_T0")
+      def f(x: _T0) -> List[_T0]
+    """)
+    self.assertErrorLogIs(errors, [])
+
+  def testModuleOpcodes(self):
+    self.options.tweak(module_budget_opcodes=20)
+    ty, errors = self.InferAndCheck("""\
+      def f():
+        x = [1, 2, 3]
+        x = [x, x, x]
+        x = [x, x, x]
+        x = [x, x, x]
+        return x
+      def g():
+        return 42
+    """)
+    self.assertTypesMatchPytd(ty, """
+      from typing import Any
+      def f() -> Any
+      def g() -> Any
+    """)
+    self.assertErrorLogIs(errors, [
+        (6, "analysis-budget-exceeded", r"module.*20 opcodes")])
+
+
+  def testAbandonedInit(self):
+    self.options.tweak(function_budget_opcodes=20)
+    _, errors = self.InferAndCheck("""\
+      class Foo(object):
+        def __init__(self):
+          x = [1, 2, 3]
+          x = [x, x, x]
+          x = [x, x, x]
+          x = [x, x, x]
+          self.x = x
+        def f(self):
+          return self.y
+      def g(foo):
+        # type: (Foo) -> None
+        return foo.z
+    """)
+    # Foo isn't treated as partially initialized, so attribute errors on it
+    # are still reported.
+    self.assertErrorLogIs(errors, [
+        (3, "analysis-budget-exceeded", r"function __init__"),
+        (9, "attribute-error", r"y.*Foo"),
+        (12, "attribute-error", r"z.*Foo")])
+
+if __name__ == "__main__":
+  test_inference.main()
@@ -0,0 +1,88 @@
+"""Tests for the --function-summaries option."""
+
+from pytype.tests import test_inference
+
+
+class FunctionSummariesTest(test_inference.InferenceTest):
+  """Tests for reusing the results of calls with the same argument types."""
+
+  def testSameTypes(self):
+    self.options.tweak(function_summaries=2)
+    ty = self.Infer("""\
+      class Foo(object):
+        pass
+      def f(x):
+        return [x]
+      a = f(Foo())
+      b = f(Foo())
+    """, deep=False)
+    # The second call reuses the summary of the first one, so f only has one
+    # call record.
+    self.assertTypesMatchPytd(ty, """
+      from typing import List
+      class Foo(object):
+        pass
+      def f(x: Foo) -> List[Foo]
+      a = ...  # type: List[Foo]
+      b = ...  # type: List[Foo]
+    """)
+
+  def testFunctionsAreDistinguished(self):
+    self.options.tweak(function_summaries=2)
+    ty = self.Infer("""\
+      def call(f):
+        return f()
+      a = call(int)
+      b = call(str)
+    """, deep=False)
+    self.assertTypesMatchPytd(ty, """
+      from typing import Type
+      def call(f: Type[int]) -> int
+      def call(f: Type[str]) -> str
+      a = ...  # type: int
+      b = ...  # type: str
+    """)
+
+  def testWiden(self):
+    self.options.tweak(function_summaries=2)
+    ty = self.Infer("""\
+      def f(x):
+        return x
+      a = f(1)
+      b = f("")
+      c = f(1.0)
+    """, deep=False)
+    self.assertTypesMatchPytd(ty, """
+      from typing import Union
+      def f(x: int) -> int
+      def f(x: str) -> str
+      a = ...  # type: int
+      b = ...  # type: str
+      c = ...  # type: Union[int, str]
+    """)
+
+  def testSideEffects(self):
+    self.options.tweak(function_summaries=2)
+    ty = self.Infer("""\
+      class Foo(object):
+        pass
+      def f(x):
+        x.y = 42
+      a = Foo()
+      b = Foo()
+      f(a)
+      f(b)
+      v = b.y
+    """, deep=False)
+    self.assertTypesMatchPytd(ty, """
+      class Foo(object):
+        y = ...  # type: int
+      def f(x: Foo) -> None
+      a = ...  # type: Foo
+      b = ...  # type: Foo
+      v = ...  # type: int
+    """)
+
+
+if __name__ == "__main__":
+  test_inference.main()
@@ -7,6 +7,7 @@ import itertools
 import logging
 import os
 import re
+import resource
 import shutil
 import StringIO
 import tempfile
@@ -114,26 +115,52 @@ def deep_variable_product(variables, limit=DEEP_VARIABLE_LIMIT):
   Raises:
     TooComplexError: If we expanded too many values.
   """
-  return _deep_values_list_product((v.bindings for v in variables), set(),
-                                   ComplexityLimit(limit))
+  return list(iter_deep_variable_product(variables, limit))
 
 
-def _deep_values_list_product(values_list, seen, complexity_limit):
+def iter_deep_variable_product(variables, limit=DEEP_VARIABLE_LIMIT,
+                               keep=None):
+  """Lazily take the deep Cartesian product of a list of Variables.
+
+  Like deep_variable_product, except that rows are generated one at a time, so
+  that callers can stop early, and that values can be filtered while the
+  product is generated.
+
+  Args:
+    variables: A sequence of Variables.
+    limit: How many results we allow before aborting.
+    keep: Optionally, a function that takes a Value, and returns whether rows
+      containing it should be generated. Values are only checked once they're
+      needed, and rows are never generated for rejected ones.
+
+  Yields:
+    Tuples of Values, like the lists returned by deep_variable_product.
+
+  Raises:
+    TooComplexError: While iterating, if we expanded too many values.
+  """
+  return _deep_values_list_product([v.bindings for v in variables], set(),
+                                   ComplexityLimit(limit), keep)
+
+
+def _deep_values_list_product(values_list, seen, complexity_limit, keep):
   """Take the deep Cartesian product of a list of list of Values."""
-  result = []
-  for row in itertools.product(*(values for values in values_list if values)):
+  values_list = [values for values in values_list if values]
+  if keep:
+    values_list = [[value for value in values if keep(value)]
+                   for values in values_list]
+    if not all(values_list):
+      return
+  for row in itertools.product(*values_list):
     extra_params = sum([entry.data.unique_parameter_values()
                         for entry in row if entry not in seen], [])
-    extra_values = (extra_params and
-                    _deep_values_list_product(extra_params, seen.union(row),
-                                              complexity_limit))
-    if extra_values:
-      for new_row in extra_values:
-        result.append(row + new_row)
+    if extra_params:
+      for new_row in _deep_values_list_product(
+          extra_params, seen.union(row), complexity_limit, keep):
+        yield row + new_row
     else:
       complexity_limit.inc()
-      result.append(row)
-  return result
+      yield row
 
 
 def variable_product_dict(variabledict, limit=DEEP_VARIABLE_LIMIT):
@@ -438,6 +465,19 @@ def cd(path):
     os.chdir(curdir)
 
 
+def get_memory_usage():
+  """Get the resident set size of this process, in bytes.
+
+  Returns:
+    The number of bytes, or None if it can't be determined on this platform.
+  """
+  try:
+    with open("/proc/self/statm") as fi:
+      return int(fi.read().split()[1]) * resource.getpagesize()
+  except (IOError, ValueError, IndexError):
+    return None
+
+
 def load_pytype_file(filename):
   """Get the contents of a data file from the pytype installation.
 
@@ -174,6 +174,40 @@ class UtilsTest(unittest.TestCase):
         {x2, x6},
     ])
 
+  def testIterDeepVariableProduct(self):
+    x1, x2, x3, x4, x5, x6 = [DummyValue(i + 1) for i in range(6)]
+    v1 = self.prog.NewVariable([x1, x2], [], self.current_location)
+    v2 = self.prog.NewVariable([x3], [], self.current_location)
+    v3 = self.prog.NewVariable([x4, x5], [], self.current_location)
+    v4 = self.prog.NewVariable([x6], [], self.current_location)
+    x1.set_parameters([v2, v3])
+    product = utils.iter_deep_variable_product([v1, v4])
+    self.assertItemsEqual([{a.data for a in row} for row in product], [
+        {x1, x3, x4, x6},
+        {x1, x3, x5, x6},
+        {x2, x6},
+    ])
+    product = utils.iter_deep_variable_product(
+        [v1, v4], keep=lambda value: value.data not in (x2, x4))
+    self.assertItemsEqual([{a.data for a in row} for row in product], [
+        {x1, x3, x5, x6},
+    ])
+    product = utils.iter_deep_variable_product(
+        [v1, v4], keep=lambda value: value.data is not x3)
+    self.assertItemsEqual([{a.data for a in row} for row in product], [
+        {x2, x6},
+    ])
+
+  def testIterDeepVariableProductStopsEarly(self):
+    values = [DummyValue(i + 1) for i in range(4)]
+    variables = [self.prog.NewVariable(values, [], self.current_location)
+                 for _ in range(8)]
+    product = utils.iter_deep_variable_product(variables, 16)
+    # Only the rows we ask for are generated, and count towards the limit.
+    for _ in range(15):
+      next(product)
+    self.assertRaises(utils.TooComplexError, next, product)
+
   def testVariableProductDict(self):
     u1 = self.prog.NewVariable([1, 2], [], self.current_location)
     u2 = self.prog.NewVariable([3, 4], [], self.current_location)
@@ -19,6 +19,7 @@ import os
 import re
 import repr as reprlib
 import sys
+import time
 
 
 from pytype import abc_overlay
@@ -26,9 +27,11 @@ from pytype import abstract
 from pytype import annotations_util
 from pytype import attribute
 from pytype import blocks
+from pytype import bytecode_cache
 from pytype import collections_overlay
 from pytype import compare
 from pytype import convert
+from pytype import cost_report
 from pytype import directors
 from pytype import exceptions
 from pytype import function
@@ -65,6 +68,8 @@ repper = repr_obj.repr
 Block = collections.namedtuple("Block", ["type", "op", "handler", "level"])
 
 _opcode_counter = metrics.MapCounter("vm_opcode")
+_budget_exceeded_counter = metrics.MapCounter("vm_budget_exceeded")
+_cache_entries_counter = metrics.MapCounter("vm_analysis_cache_entries")
 
 # Collection of module overlays, used in _import_module to fetch an overlay
 # instead of the module itself. Memoized in the vm itself.
@@ -79,6 +84,105 @@ class RecursionException(Exception):
   pass
 
 
+class BudgetExceededError(Exception):
+  """Raised to abandon an analysis that exceeded its AnalysisBudget.
+
+  Attributes:
+    budget: The AnalysisBudget.
+    reason: A string describing the exceeded limit.
+    stack: The frames that were active when the analysis was abandoned.
+  """
+
+  def __init__(self, budget, reason, stack):
+    super(BudgetExceededError, self).__init__(reason)
+    self.budget = budget
+    self.reason = reason
+    self.stack = stack
+
+
+class AnalysisBudget(object):
+  """Limits on the work spent on analyzing a function or a module.
+
+  Every limit is optional. The work is counted from the call of
+  VirtualMachine.run_with_budget, and includes the work done for the analysis
+  of any other functions that are called.
+
+  Attributes:
+    kind: What this budget applies to, e.g. "function" or "module".
+    seconds: The maximum wall time, in seconds.
+    opcodes: The maximum number of opcodes to run.
+    nodes: The maximum number of CFG nodes to create.
+  """
+
+  def __init__(self, kind, seconds=None, opcodes=None, nodes=None):
+    self.kind = kind
+    self.seconds = seconds
+    self.opcodes = opcodes
+    self.nodes = nodes
+    self._start = None
+
+  def is_unlimited(self):
+    return self.seconds is None and self.opcodes is None and self.nodes is None
+
+  def start(self, vm):
+    self._start = (time.time(), vm.opcode_count, len(vm.program.cfg_nodes),
+                   len(vm.frames))
+
+  @property
+  def frame_depth(self):
+    """The number of frames that were on the stack when the budget started."""
+    return self._start[3]
+
+  def check(self, vm):
+    """Check whether the budget is exceeded.
+
+    Args:
+      vm: The VirtualMachine running the analysis.
+
+    Returns:
+      None if the analysis can continue, or else a string describing the
+      exceeded limit.
+    """
+    start_time, start_opcodes, start_nodes, _ = self._start
+    if (self.opcodes is not None and
+        vm.opcode_count - start_opcodes > self.opcodes):
+      return "running %d opcodes" % self.opcodes
+    if (self.nodes is not None and
+        len(vm.program.cfg_nodes) - start_nodes > self.nodes):
+      return "creating %d CFG nodes" % self.nodes
+    if self.seconds is not None and time.time() - start_time > self.seconds:
+      return "%g seconds" % self.seconds
+    return None
+
+
+class AnalysisCaches(object):
+  """The caches of a single analysis.
+
+  Caches of abstract values have to be owned by the VirtualMachine that
+  created the values. A class attribute or module global would keep the
+  typegraphs of all earlier analyses in the process alive. Each such cache is
+  a dictionary registered here by name, so that they can be sized and cleared
+  together.
+  """
+
+  def __init__(self):
+    self._caches = collections.OrderedDict()
+
+  def get(self, name):
+    """Get the cache with the given name, creating an empty one if needed."""
+    return self._caches.setdefault(name, {})
+
+  def sizes(self):
+    """Get the number of entries of each cache, as a dictionary."""
+    return {name: len(cache) for name, cache in self._caches.items()}
+
+  def reset(self):
+    """Clear all caches, counting their entries in the metrics."""
+    for name, cache in self._caches.items():
+      _cache_entries_counter.inc(name, len(cache))
+      cache.clear()
+
+
 class VirtualMachineError(Exception):
   """For raising errors in the operation of the VM."""
   pass
@@ -183,19 +287,32 @@ class VirtualMachine(object):
     self.frames = []  # The call stack of frames.
     self.functions_with_late_annotations = []
     self.frame = None  # The current frame.
-    self.program = typegraph.Program()
+    self.opcode_count = 0  # The number of opcodes run so far.
+    self._budgets = []  # The AnalysisBudgets being enforced, innermost last.
+    self.caches = AnalysisCaches()
+    self.program = typegraph.Program(
+        solver_cache_size=options.solver_cache_size,
+        weak_node_bindings=bool(options.typegraph_gc_interval))
     self.root_cfg_node = self.program.NewCFGNode("root")
     self.program.entrypoint = self.root_cfg_node
     self.annotations_util = annotations_util.AnnotationsUtil(self)
     self.attribute_handler = attribute.AbstractAttributeHandler(self)
     self.convert = convert.Converter(self)
     self.program.default_data = self.convert.unsolvable
+    self.cost_report = (
+        cost_report.CostReport(self) if options.cost_report else None)
     self.matcher = matcher.AbstractMatcher()
     self.has_unknown_wildcard_imports = False
     self.callself_stack = []
     self.filename = None
     self.director = None
     self.reading_builtins = False
+    # The state after running the builtins, see load_builtins().
+    self._builtins_state = None
+    if options.bytecode_cache:
+      self.bytecode_cache = bytecode_cache.BytecodeCache(options.bytecode_cache)
+    else:
+      self.bytecode_cache = None
 
     # Map from builtin names to canonical objects.
     self.special_builtins = {
@@ -241,7 +358,10 @@ class VirtualMachine(object):
       subsequent instruction.
     """
     _opcode_counter.inc(op.name)
+    self.opcode_count += 1
     self.frame.current_opcode = op
+    if self._budgets:
+      self._check_budgets()
     if log.isEnabledFor(logging.INFO):
       self.log_opcode(op, state)
     try:
@@ -265,6 +385,49 @@ class VirtualMachine(object):
     del self.frame.current_opcode
     return state
 
+  def _check_budgets(self):
+    for budget in self._budgets:
+      reason = budget.check(self)
+      if reason:
+        raise BudgetExceededError(budget, reason, list(self.frames))
+
+  def run_with_budget(self, budget, default, f, *args):
+    """Call f(*args), abandoning it if it exceeds the given budget.
+
+    Budgets can be nested. An abandoned analysis leaves the frame stack the
+    way it was when this method was called.
+
+    Args:
+      budget: An AnalysisBudget.
+      default: What to return if the budget is exceeded.
+      f: The function to call.
+      *args: The arguments to pass to f.
+
+    Returns:
+      A tuple of (1) the BudgetExceededError, or None if the budget was
+      respected and (2) the return value of f or the default.
+    """
+    if budget.is_unlimited():
+      return None, f(*args)
+    budget.start(self)
+    self._budgets.append(budget)
+    try:
+      return None, f(*args)
+    except BudgetExceededError as e:
+      if e.budget is not budget:
+        raise
+      log.warning("Abandoning the analysis of a %s after %s",
+                  budget.kind, e.reason)
+      _budget_exceeded_counter.inc(budget.kind)
+      if self.cost_report:
+        self.cost_report.flush()
+      del self.frames[budget.frame_depth:]
+      self.frame = self.frames[-1] if self.frames else None
+      return e, default
+    finally:
+      popped_budget = self._budgets.pop()
+      assert popped_budget is budget
+
   def join_cfg_nodes(self, nodes):
     assert nodes
     if len(nodes) == 1:
@@ -359,10 +522,14 @@ class VirtualMachine(object):
     return state.push_block(Block(t, op, handler, level))
 
   def push_frame(self, frame):
+    if self.cost_report:
+      self.cost_report.enter_frame(frame)
     self.frames.append(frame)
     self.frame = frame
 
   def pop_frame(self, frame):
+    if self.cost_report:
+      self.cost_report.flush()
     popped_frame = self.frames.pop()
     assert popped_frame == frame
     if self.frames:
@@ -658,6 +825,11 @@ class VirtualMachine(object):
     return node, val
 
   def compile_src(self, src, filename=None, mode="exec"):
+    if self.bytecode_cache:
+      return self.bytecode_cache.compile_src(
+          src, python_version=self.python_version,
+          python_exe=self.options.python_exe,
+          filename=filename, mode=mode)
     code = pyc.compile_src(
         src, python_version=self.python_version,
         python_exe=self.options.python_exe,
@@ -693,6 +865,27 @@ class VirtualMachine(object):
       self.trace_module_member(None, name, definition)
     return node, f_globals, f_locals
 
+  def load_builtins(self, maximum_depth, run_builtins):
+    """Run the builtins, ahead of the program.
+
+    run_program() calls this if it hasn't been called yet. Calling it
+    explicitly allows creating a virtual machine that has done all the work
+    that doesn't depend on the program, e.g. to fork a process per module
+    from it.
+
+    Args:
+      maximum_depth: Maximum depth to follow call chains.
+      run_builtins: Whether to preload the native Python builtins.
+    """
+    assert self._builtins_state is None, "Builtins loaded twice"
+    self.maximum_depth = sys.maxint if maximum_depth is None else maximum_depth
+    node = self.root_cfg_node.ConnectNew("builtins")
+    if run_builtins:
+      node, f_globals, f_locals = self.preload_builtins(node)
+    else:
+      f_globals, f_locals = None, None
+    self._builtins_state = (run_builtins, node, f_globals, f_locals)
+
   def run_program(self, src, filename, maximum_depth, run_builtins):
     """Run the code and return the CFG nodes.
 
@@ -716,12 +909,13 @@ class VirtualMachine(object):
     self.director = director
     self.filename = filename
 
-    self.maximum_depth = sys.maxint if maximum_depth is None else maximum_depth
-    node = self.root_cfg_node.ConnectNew("builtins")
-    if run_builtins:
-      node, f_globals, f_locals = self.preload_builtins(node)
+    if self._builtins_state is None:
+      self.load_builtins(maximum_depth, run_builtins)
     else:
-      node, f_globals, f_locals = node, None, None
+      self.maximum_depth = (
+          sys.maxint if maximum_depth is None else maximum_depth)
+    loaded_run_builtins, node, f_globals, f_locals = self._builtins_state
+    assert loaded_run_builtins == run_builtins, "Builtins loaded differently"
 
     code = self.compile_src(src, filename=filename)
     visitor = _FindIgnoredTypeComments(self.director.type_comments)